@@ -1,9 +1,34 @@
+import sys
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from matplotlib.colors import LinearSegmentedColormap
 from scipy import stats
+from scipy.stats import qmc
+
+from surrogate import PARAMETERS, Surrogate, varied_parameters
+
+# Parameters with more distinct values (space-filling designs) are grouped into this many quantile bins
+MAX_LEVELS = 5
+# Base samples of the emulator-based Sobol index estimates
+SENSITIVITY_SAMPLES = 4096
+
+def parameter_levels(df, param):
+    """Values of a parameter for grouping: the values themselves on a grid, else quantile-bin medians."""
+    if df[param].nunique() <= MAX_LEVELS:
+        return df[param]
+    bins = pd.qcut(df[param], MAX_LEVELS, labels=False, duplicates='drop')
+    return df[param].groupby(bins).transform('median')
+
+def with_parameter_levels(df):
+    """Copy of the results with every parameter replaced by its grouping levels."""
+    grouped = df.copy()
+    for param in PARAMETERS:
+        if param in df.columns:
+            grouped[param] = parameter_levels(df, param)
+    return grouped
 
 def load_and_analyze_results(filename='simulation_results.csv'):
     """
@@ -45,15 +70,19 @@ def load_and_analyze_results(filename='simulation_results.csv'):
         else:
             print("No statistically significant difference overall.")
         
-        # Analyze the influence of each parameter
+        # Analyze the influence of each parameter (binned if the design is not a grid)
+        grouped = with_parameter_levels(df)
         print("\n=== Parameter Influence Analysis ===")
-        analyze_parameter_influence(df)
+        analyze_parameter_influence(grouped)
+        
+        # Global sensitivity analysis
+        analyze_sensitivity(df, grouped)
         
         # Create visualizations
-        create_visualizations(df)
+        create_visualizations(grouped)
         
         # Create detailed parameter interaction analysis
-        analyze_parameter_interactions(df)
+        analyze_parameter_interactions(df, grouped)
         
         # Final conclusion
         print("\n=== Conclusion ===")
@@ -70,9 +99,7 @@ def load_and_analyze_results(filename='simulation_results.csv'):
 
 def analyze_parameter_influence(df):
     """Analyze how each parameter influences the quantum yield difference."""
-    parameters = ['NUM_O2', 'DENSITY_STEEPNESS', 'O2_MOVE_PROB_MIN', 'EXCITED_LIFETIME']
-    
-    for param in parameters:
+    for param in PARAMETERS:
         if param in df.columns:
             print(f"\nAnalyzing influence of {param}:")
             param_values = df[param].unique()
@@ -109,7 +136,7 @@ def create_visualizations(df):
     
     # 2. Heatmap showing QY difference vs two most influential parameters
     # Find two most influential parameters
-    parameters = ['NUM_O2', 'DENSITY_STEEPNESS', 'O2_MOVE_PROB_MIN', 'EXCITED_LIFETIME']
+    parameters = [param for param in PARAMETERS if param in df.columns]
     param_influences = {}
     
     for param in parameters:
@@ -183,8 +210,8 @@ def create_visualizations(df):
     plt.savefig('qy_analysis_results.png', dpi=300, bbox_inches='tight')
     print("\nCreated visualizations and saved to 'qy_analysis_results.png'")
 
-def analyze_parameter_interactions(df):
-    """Analyze how parameters interact to influence QY difference."""
+def analyze_parameter_interactions(df, grouped):
+    """Analyze how parameters interact to influence QY difference (grouped: binned parameter levels)."""
     print("\n=== Parameter Interaction Analysis ===")
     
     # Create a column to identify optimal conditions for each complex
@@ -199,9 +226,9 @@ def analyze_parameter_interactions(df):
         optimal_subset = df[df['Optimal_For'] == complex_type]
         if len(optimal_subset) > 0:
             print(f"\nOptimal conditions for {complex_type} (higher QY):")
-            for param in ['NUM_O2', 'DENSITY_STEEPNESS', 'O2_MOVE_PROB_MIN', 'EXCITED_LIFETIME']:
+            for param in PARAMETERS:
                 if param in df.columns:
-                    values = optimal_subset[param].value_counts().sort_index()
+                    values = grouped.loc[optimal_subset.index, param].value_counts().sort_index()
                     most_common = values.idxmax() if not values.empty else "N/A"
                     print(f"  {param}: Most common value {most_common}")
                     
@@ -214,10 +241,62 @@ def analyze_parameter_interactions(df):
                 qy_diff = -best_case['QY_Difference']
                 
             print(f"  Best case scenario (QY diff: {qy_diff:.4f}):")
-            for param in ['NUM_O2', 'DENSITY_STEEPNESS', 'O2_MOVE_PROB_MIN', 'EXCITED_LIFETIME']:
+            for param in PARAMETERS:
                 if param in df.columns:
                     print(f"    {param}: {best_case[param]}")
 
+def main_effect_index(df, grouped, param, target):
+    """First-order Sobol index estimated from the runs: Var(E[target | param level]) / Var(target)."""
+    level_means = df[target].groupby(grouped[param]).transform('mean')
+    total_var = df[target].var(ddof=0)
+    return level_means.var(ddof=0) / total_var if total_var > 0 else 0.0
+
+def sobol_indices(function, lower, upper, samples=SENSITIVITY_SAMPLES, seed=0):
+    """First-order (Saltelli 2010) and total (Jansen) Sobol indices of a vectorized function on a box."""
+    d = len(lower)
+    base = qmc.Sobol(2 * d, seed=seed).random(samples)
+    a = qmc.scale(base[:, :d], lower, upper)
+    b = qmc.scale(base[:, d:], lower, upper)
+    f_a, f_b = function(a), function(b)
+    variance = np.var(np.concatenate([f_a, f_b]))
+    first, total = np.zeros(d), np.zeros(d)
+    for i in range(d):
+        ab = a.copy()
+        ab[:, i] = b[:, i]
+        f_ab = function(ab)
+        first[i] = np.mean(f_b * (f_ab - f_a)) / variance
+        total[i] = 0.5 * np.mean((f_a - f_ab) ** 2) / variance
+    return first, total
+
+def analyze_sensitivity(df, grouped, samples=SENSITIVITY_SAMPLES):
+    """Global sensitivity analysis: Sobol indices of each QY with respect to the sweep parameters.
+    
+    First-order indices are estimated directly from the runs (binned main
+    effects; noisy and biased upwards with few runs per bin). First-order
+    and total indices are also computed on a Gaussian process emulator of
+    the results (surrogate.py), which needs no special sampling design;
+    total minus first order measures interactions.
+    """
+    print("\n=== Global Sensitivity Analysis (Sobol Indices) ===")
+    parameters = varied_parameters(df)
+    if len(parameters) < 2 or len(df) < 10:
+        print("Not enough varied parameters or runs for a sensitivity analysis.")
+        return None
+    
+    surrogate = Surrogate(parameters).fit(df)
+    results = {}
+    for target in ('Simulated_QY_Ru1', 'Simulated_QY_Ru2'):
+        first, total = sobol_indices(lambda x: surrogate.predict(x)[target][0],
+                                     surrogate.lower, surrogate.upper, samples)
+        print(f"\n{target}:")
+        print(f"  {'Parameter':<18} {'S1 (runs)':<10} {'S1 (GP)':<10} {'ST (GP)':<10}")
+        print(f"  {'-'*18} {'-'*10} {'-'*10} {'-'*10}")
+        for i, param in enumerate(parameters):
+            s1_runs = main_effect_index(df, grouped, param, target)
+            print(f"  {param:<18} {s1_runs:<10.3f} {first[i]:<10.3f} {total[i]:<10.3f}")
+            results[(target, param)] = (s1_runs, first[i], total[i])
+    return results
+
 def provide_conclusion(df):
     """Provide a concise conclusion based on the analysis."""
     # Overall statistics
@@ -275,7 +354,7 @@ def provide_conclusion(df):
 # Run the analysis
 if __name__ == "__main__":
     print("=== Ruthenium Complex Quantum Yield Analysis ===")
-    df = load_and_analyze_results()
+    df = load_and_analyze_results(*sys.argv[1:2])
     
     # Additional command to show interactive plots if needed
     plt.show()
\ No newline at end of file
@@ -0,0 +1,166 @@
+import argparse
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from checkpoint import decode_json, encode_json
+
+# Frames rendered per worker task (amortizes inter-process overhead)
+DEFAULT_CHUNK_FRAMES = 8
+
+# --- Frame Snapshots ---
+class FrameSnapshots:
+    """ Compact per-frame state of a simulation, for rendering after the run.
+
+        Complex positions and types are stored once; each frame stores the
+        O2 positions (float32), the excited flag of every complex and the
+        running emission / quench counts of both populations.
+    """
+    def __init__(self, ru_x, ru_y, ru_type, params):
+        self.ru_x = np.asarray(ru_x, dtype=np.float32)
+        self.ru_y = np.asarray(ru_y, dtype=np.float32)
+        self.ru_type = np.asarray(ru_type)
+        self.params = params
+        self.steps = []
+        self.o2_x = []
+        self.o2_y = []
+        self.ru_excited = []
+        self.counts = []
+
+    def add(self, step, o2_x, o2_y, ru_excited, counts):
+        """ Adds one frame; counts = (ru1_emissions, ru1_quenched, ru2_emissions, ru2_quenched). """
+        self.steps.append(step)
+        self.o2_x.append(np.asarray(o2_x, dtype=np.float32))
+        self.o2_y.append(np.asarray(o2_y, dtype=np.float32))
+        self.ru_excited.append(np.asarray(ru_excited, dtype=bool))
+        self.counts.append(counts)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def save(self, path):
+        """ Writes all frames to one .npz file. """
+        np.savez(path, ru_x=self.ru_x, ru_y=self.ru_y, ru_type=self.ru_type,
+                 params=encode_json(self.params), step=np.array(self.steps, dtype=np.int64),
+                 o2_x=np.stack(self.o2_x), o2_y=np.stack(self.o2_y),
+                 ru_excited=np.stack(self.ru_excited), counts=np.array(self.counts, dtype=np.int64))
+
+def load_snapshots(path):
+    """ Loads a snapshot file written by FrameSnapshots.save into a dict of arrays. """
+    with np.load(path, allow_pickle=False) as data:
+        snapshots = {name: data[name] for name in data.files}
+    snapshots['params'] = decode_json(snapshots['params'])
+    return snapshots
+
+def frame_from_snapshots(snapshots, index):
+    """ Returns frame `index` in the format drawn by simulation02.draw_frame. """
+    is_ru1 = snapshots['ru_type'] == 'Ru1'
+    ru_pos = np.column_stack([snapshots['ru_x'], snapshots['ru_y']])
+    o2_pos = np.column_stack([snapshots['o2_x'][index], snapshots['o2_y'][index]])
+    excited = snapshots['ru_excited'][index]
+    ru1_emissions, ru1_quenched, ru2_emissions, ru2_quenched = snapshots['counts'][index].tolist()
+    return {
+        'step': int(snapshots['step'][index]),
+        'ru1_pos': ru_pos[is_ru1], 'ru1_excited': excited[is_ru1].tolist(),
+        'ru2_pos': ru_pos[~is_ru1], 'ru2_excited': excited[~is_ru1].tolist(),
+        'o2_pos': o2_pos,
+        'ru1_emissions': ru1_emissions, 'ru1_quenched': ru1_quenched,
+        'ru2_emissions': ru2_emissions, 'ru2_quenched': ru2_quenched
+    }
+
+# --- Rendering Workers ---
+_worker = {}
+
+def _init_worker(snapshot_path, dpi):
+    """ Loads the snapshots and builds the (static) figure once per worker process. """
+    import matplotlib
+    matplotlib.use('Agg')
+    import simulation02
+
+    snapshots = load_snapshots(snapshot_path)
+    params = snapshots['params']
+    grid_size = params['grid_size']
+    fig, axes, scatters, texts = simulation02.setup_visualization(
+        grid_size, (grid_size / 2, grid_size / 2), params['core_radius'], params['surface_thickness'],
+        params['density_steepness'], params['high_res']
+    )
+    fig.set_dpi(dpi)
+    _worker.update(snapshots=snapshots, fig=fig, axes=axes, scatters=scatters, texts=texts,
+                   draw_frame=simulation02.draw_frame, total_steps=params['steps'])
+
+def _render_chunk(indices):
+    """ Rasterizes the given frames; returns (width, height, list of RGB byte strings). """
+    fig = _worker['fig']
+    images = []
+    for index in indices:
+        frame_data = frame_from_snapshots(_worker['snapshots'], index)
+        _worker['draw_frame'](_worker['axes'], _worker['scatters'], _worker['texts'],
+                              frame_data, _worker['total_steps'])
+        fig.canvas.draw()
+        rgba = np.asarray(fig.canvas.buffer_rgba())
+        images.append(np.ascontiguousarray(rgba[:, :, :3]).tobytes())
+    width, height = fig.canvas.get_width_height()
+    return width, height, images
+
+# --- Encoding ---
+def encoder_command(output_path, width, height, fps):
+    """ ffmpeg command reading raw RGB frames from stdin. """
+    return ['ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+            '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-c:v', 'libx264', '-pix_fmt', 'yuv420p', output_path]
+
+def render_video(snapshot_path, output_path, fps=20, dpi=150, workers=None, chunk_frames=DEFAULT_CHUNK_FRAMES):
+    """ Renders a snapshot file to a video.
+
+        Frames are rasterized in chunks on a process pool (one figure per
+        worker) and piped, in order, into ffmpeg as raw RGB. Nothing is
+        re-simulated, so a video can be re-rendered from the same snapshots.
+    """
+    if shutil.which('ffmpeg') is None:
+        raise SystemExit("Error: ffmpeg not found; it is needed to encode the animation.")
+    with np.load(snapshot_path) as data:
+        n_frames = len(data['step'])
+    chunks = [list(range(start, min(start + chunk_frames, n_frames)))
+              for start in range(0, n_frames, chunk_frames)]
+    workers = workers or os.cpu_count() or 1
+
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(snapshot_path, dpi))
+        results = executor.map(_render_chunk, chunks)
+    else:
+        executor = None
+        _init_worker(snapshot_path, dpi)
+        results = map(_render_chunk, chunks)
+
+    encoder = None
+    try:
+        for width, height, images in results:
+            if encoder is None:
+                encoder = subprocess.Popen(encoder_command(output_path, width, height, fps), stdin=subprocess.PIPE)
+            for image in images:
+                encoder.stdin.write(image)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if encoder is not None:
+            encoder.stdin.close()
+            encoder.wait()
+    if encoder is not None and encoder.returncode != 0:
+        raise SystemExit(f"Error: ffmpeg exited with status {encoder.returncode}.")
+    print(f"Rendered {n_frames} frames to: {output_path}")
+    return output_path
+
+# --- Main Entry Point ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Render saved simulation frame snapshots to a video')
+    parser.add_argument('snapshots', type=str, help='Snapshot .npz file written by simulation02.py')
+    parser.add_argument('output', type=str, help='Output video file (e.g. simulation.mp4)')
+    parser.add_argument('--fps', type=float, default=20, help='Frames per second')
+    parser.add_argument('--dpi', type=int, default=150, help='Figure resolution')
+    parser.add_argument('--workers', type=int, default=None, help='Render processes (default: all cores)')
+    args = parser.parse_args()
+    render_video(args.snapshots, args.output, args.fps, args.dpi, args.workers)
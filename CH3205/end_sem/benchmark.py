@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import platform
+import sys
+from dataclasses import fields
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+
+from result_cache import model_version, source_version
+from simulation_core import ENGINES, Simulation, SimulationConfig
+
+# --- Reference Configurations ---
+# Fixed seed and model size of each reference case; 'medium' is the
+# default run of simulation02.py and its siblings
+BENCHMARK_SEED = 20240501
+REFERENCE_CONFIGS = {
+    'small': {'grid_size': 50, 'core_radius': 7.5, 'surface_thickness': 2.5,
+              'num_ru1': 15, 'num_ru2': 15, 'num_o2': 90, 'steps': 300},
+    'medium': {'grid_size': 100, 'core_radius': 15, 'surface_thickness': 5,
+               'num_ru1': 30, 'num_ru2': 30, 'num_o2': 180, 'steps': 600},
+    'large': {'grid_size': 200, 'core_radius': 30, 'surface_thickness': 10,
+              'num_ru1': 120, 'num_ru2': 120, 'num_o2': 720, 'steps': 600},
+}
+DEFAULT_HISTORY = os.path.join('benchmark_results', 'history.jsonl')
+DEFAULT_BASELINE = os.path.join('benchmark_results', 'baseline.json')
+MIN_PHASE_FRACTION = 0.05  # Phases below this share of the step are too noisy to flag
+
+# --- Command Line Arguments ---
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark of the Ru/O2 quenching step loop')
+    parser.add_argument('--configs', nargs='+', choices=list(REFERENCE_CONFIGS), default=['small', 'medium'],
+                        help='Reference configurations to run')
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES), help='Step engines to compare')
+    parser.add_argument('--vary', type=str, default=None,
+                        help='Scale one parameter over the given values, e.g. num_o2=90,180,360 or quenching_radius=1,2,4')
+    parser.add_argument('--steps', type=int, default=None, help='Override the number of steps of every configuration')
+    parser.add_argument('--tiles', type=int, default=1, help='Worker processes of the decomposed engine')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed runs per case (the fastest one is reported)')
+    parser.add_argument('--history', type=str, default=DEFAULT_HISTORY, help='JSON-lines file the results are appended to')
+    parser.add_argument('--no-history', action='store_true', help='Do not append the results to the history file')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help='Stored baseline to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Relative slowdown against the baseline that counts as a regression')
+    return parser.parse_args()
+
+# --- Helper Functions ---
+def parse_vary(vary):
+    """ Parses 'name=v1,v2,...' into (name, values) typed like the SimulationConfig field. """
+    if vary is None:
+        return None, [None]
+    name, _, values = vary.partition('=')
+    name = name.strip().replace('-', '_')
+    defaults = {f.name: f.default for f in fields(SimulationConfig)}
+    if name not in defaults or not values:
+        raise ValueError(f"--vary expects <SimulationConfig field>=v1,v2,... (got '{vary}')")
+    kind = type(defaults[name])
+    return name, [kind(float(v)) if kind is int else kind(v) for v in values.split(',')]
+
+def make_cases(config_names, engines, vary, steps=None):
+    """ Returns the list of benchmark cases: (case name, engine, config parameters, steps). """
+    vary_name, vary_values = parse_vary(vary)
+    cases = []
+    for config_name in config_names:
+        for value in vary_values:
+            params = dict(REFERENCE_CONFIGS[config_name])
+            case_steps = steps or params.pop('steps')
+            params.pop('steps', None)
+            case_name = config_name
+            if vary_name is not None:
+                params[vary_name] = value
+                case_name = f"{config_name}[{vary_name}={value}]"
+            for engine in engines:
+                cases.append((case_name, engine, params, case_steps))
+    return cases
+
+def run_case(engine, params, steps, tiles=1):
+    """ Runs one seeded simulation; returns its setup / step timings, phase times and QYs. """
+    config = SimulationConfig(engine=engine, tiles=tiles, seed=BENCHMARK_SEED, **params)
+    setup_start = perf_counter()
+    sim = Simulation(config)
+    run_start = perf_counter()
+    sim.run(steps)
+    run_time = perf_counter() - run_start
+    num_molecules = len(sim.o2_molecules) + len(sim.all_complexes)
+    return {
+        'setup_s': run_start - setup_start,
+        'run_s': run_time,
+        'steps_per_s': steps / run_time if run_time > 0 else None,
+        'molecule_updates_per_s': steps * num_molecules / run_time if run_time > 0 else None,
+        'phase_s': dict(sim.phase_times),
+        'ru1_qy': sim.get_simulated_qy('Ru1'),
+        'ru2_qy': sim.get_simulated_qy('Ru2'),
+    }
+
+def benchmark_case(engine, params, steps, repeats, tiles=1):
+    """ Best (fastest) of `repeats` identical runs; the spread of run times is kept. """
+    runs = [run_case(engine, params, steps, tiles) for _ in range(max(1, repeats))]
+    best = min(runs, key=lambda run: run['run_s'])
+    run_times = [run['run_s'] for run in runs]
+    best['run_s_median'] = float(np.median(run_times))
+    best['run_s_max'] = max(run_times)
+    best['repeats'] = len(runs)
+    return best
+
+def environment_info():
+    """ Machine and code version the results were measured with. """
+    version = source_version(__file__) + model_version()
+    return {'code_version': version, 'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'node': platform.node(), 'processor': platform.processor()}
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_baseline(path, records, environment):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    baseline = {'timestamp': datetime.now().isoformat(), 'environment': environment,
+                'cases': {record['case_id']: record for record in records}}
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+
+def append_history(path, records):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+
+def compare_to_baseline(record, reference, tolerance):
+    """ Returns the regressions of one case against its baseline record (empty list if none).
+
+        A case regresses when its step rate dropped by more than tolerance,
+        or when a phase taking at least MIN_PHASE_FRACTION of the step time
+        got slower by more than tolerance. Changed QYs are reported too:
+        with the fixed seed they mean the model's behaviour changed, which
+        makes the timings incomparable.
+    """
+    problems = []
+    if reference['steps_per_s'] and record['steps_per_s'] < reference['steps_per_s'] * (1 - tolerance):
+        problems.append(f"steps/s {reference['steps_per_s']:.0f} -> {record['steps_per_s']:.0f} "
+                        f"({record['steps_per_s'] / reference['steps_per_s'] - 1:+.0%})")
+    total = sum(record['phase_s'].values())
+    for phase, seconds in record['phase_s'].items():
+        before = reference['phase_s'].get(phase)
+        if not before or not total or seconds / total < MIN_PHASE_FRACTION:
+            continue
+        if seconds > before * (1 + tolerance):
+            problems.append(f"phase '{phase}' {before * 1000:.1f} -> {seconds * 1000:.1f} ms ({seconds / before - 1:+.0%})")
+    for metric in ('ru1_qy', 'ru2_qy'):
+        if not np.isclose(record[metric], reference[metric]):
+            problems.append(f"{metric} changed {reference[metric]:.4f} -> {record[metric]:.4f} (model output differs)")
+    return problems
+
+def print_case(record):
+    phase_total = sum(record['phase_s'].values())
+    shares = ', '.join(f"{phase} {seconds / phase_total:.0%}"
+                       for phase, seconds in sorted(record['phase_s'].items(), key=lambda item: -item[1])
+                       if phase_total)
+    print(f"{record['case']:<32} {record['engine']:<10} {record['steps_per_s']:>9.0f} steps/s "
+          f"{record['molecule_updates_per_s']:>11.0f} updates/s  setup {record['setup_s'] * 1000:6.1f} ms  [{shares}]")
+
+def print_engine_comparison(records):
+    """ Speed-up of every engine relative to the object engine, per case. """
+    by_case = {}
+    for record in records:
+        by_case.setdefault(record['case'], {})[record['engine']] = record
+    print("\nSpeed-up over the object engine")
+    for case, engines in by_case.items():
+        reference = engines.get('object')
+        if reference is None:
+            continue
+        ratios = ', '.join(f"{engine} x{record['steps_per_s'] / reference['steps_per_s']:.1f}"
+                           for engine, record in engines.items() if engine != 'object')
+        print(f"  {case:<32} {ratios}")
+
+# --- Main Entry Point ---
+def main():
+    args = parse_arguments()
+    cases = make_cases(args.configs, args.engines, args.vary, args.steps)
+    environment = environment_info()
+    timestamp = datetime.now().isoformat()
+    print(f"Benchmark: {len(cases)} cases, {args.repeats} repeats each, seed {BENCHMARK_SEED}, "
+          f"code version {environment['code_version']}")
+    print("=" * 50)
+
+    records = []
+    for case, engine, params, steps in cases:
+        result = benchmark_case(engine, params, steps, args.repeats, args.tiles)
+        record = {'case_id': f"{case}/{engine}", 'case': case, 'engine': engine, 'params': params,
+                  'steps': steps, 'timestamp': timestamp, **environment, **result}
+        records.append(record)
+        print_case(record)
+    if 'object' in args.engines and len(args.engines) > 1:
+        print_engine_comparison(records)
+
+    # Compare with the stored baseline
+    baseline = load_baseline(args.baseline)
+    regressions = 0
+    if baseline is not None and not args.save_baseline:
+        print(f"\nComparison with baseline of {baseline['timestamp']} (tolerance {args.tolerance:.0%})")
+        if baseline['environment'].get('node') != environment['node']:
+            print(f"  Note: baseline was measured on {baseline['environment'].get('node')}, timings may not be comparable")
+        for record in records:
+            reference = baseline['cases'].get(record['case_id'])
+            if reference is None or reference['steps'] != record['steps']:
+                print(f"  {record['case_id']}: not in baseline (or run for a different number of steps)")
+                continue
+            problems = compare_to_baseline(record, reference, args.tolerance)
+            record['regression'] = bool(problems)
+            regressions += bool(problems)
+            change = record['steps_per_s'] / reference['steps_per_s'] - 1
+            status = 'REGRESSION' if problems else 'ok'
+            print(f"  {record['case_id']:<42} {change:+6.0%} steps/s  {status}")
+            for problem in problems:
+                print(f"      {problem}")
+
+    if not args.no_history:
+        append_history(args.history, records)
+        print(f"\nResults appended to {args.history}")
+    if args.save_baseline:
+        save_baseline(args.baseline, records, environment)
+        print(f"Baseline saved to {args.baseline}")
+    if regressions:
+        print(f"\n{regressions} case(s) regressed")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import numpy as np
+
+# --- Boundary Conditions ---
+# What happens to an O2 molecule that steps off the lattice [0, grid_size - 1]:
+# 'clamp': it stays on the wall it hit (the original model),
+# 'reflect': it is mirrored back at the wall,
+# 'periodic': it re-enters on the opposite side (period grid_size; quenching
+#             then uses minimum-image distances),
+# 'absorbing': it leaves into a reservoir, and a molecule from the reservoir
+#              is injected at a random point of the lattice surface, which
+#              keeps the number of molecules constant
+BOUNDARIES = ('clamp', 'reflect', 'periodic', 'absorbing')
+
+def apply_boundary(coordinates, grid_size, boundary, rng=None):
+    """ Applies a boundary condition to arrays of moved coordinates (modified in place).
+
+        coordinates is a list with one array per axis; rng (a NumPy
+        Generator) is needed for 'absorbing'. Returns the mask of absorbed
+        (reinjected) molecules, or None for the other boundaries.
+    """
+    upper = grid_size - 1
+    if boundary == 'clamp':
+        for c in coordinates:
+            np.clip(c, 0, upper, out=c)
+    elif boundary == 'reflect':
+        for c in coordinates:
+            np.abs(c, out=c)
+            np.subtract(2 * upper, c, out=c, where=c > upper)
+    elif boundary == 'periodic':
+        for c in coordinates:
+            np.mod(c, grid_size, out=c)
+    elif boundary == 'absorbing':
+        absorbed = np.logical_or.reduce([(c < 0) | (c > upper) for c in coordinates])
+        n = np.count_nonzero(absorbed)
+        if n:
+            for c, values in zip(coordinates, reservoir_positions(rng, n, len(coordinates), grid_size)):
+                c[absorbed] = values
+        return absorbed
+    else:
+        raise ValueError(f"boundary must be one of {BOUNDARIES}, got '{boundary}'")
+    return None
+
+def reservoir_positions(rng, n, dimensions, grid_size):
+    """ n points uniform on the surface of the lattice (one array per axis), where reservoir molecules enter. """
+    upper = grid_size - 1
+    coordinates = [rng.uniform(0, upper, n) for _ in range(dimensions)]
+    axis = rng.integers(0, dimensions, n)
+    wall = rng.integers(0, 2, n) * upper
+    for k, c in enumerate(coordinates):
+        c[axis == k] = wall[axis == k]
+    return coordinates
+
+def boundary_position(position, grid_size, boundary, rng):
+    """ Scalar apply_boundary for one molecule (rng is a random.Random); returns (new position, absorbed). """
+    upper = grid_size - 1
+    if boundary == 'clamp':
+        return tuple(max(0, min(upper, c)) for c in position), False
+    if boundary == 'reflect':
+        return tuple(2 * upper - abs(c) if abs(c) > upper else abs(c) for c in position), False
+    if boundary == 'periodic':
+        return tuple(c % grid_size for c in position), False
+    if all(0 <= c <= upper for c in position):
+        return tuple(position), False
+    new_position = [rng.uniform(0, upper) for _ in position]
+    new_position[rng.randrange(len(position))] = rng.randrange(2) * upper
+    return tuple(new_position), True
+
+def minimum_image(delta, grid_size):
+    """ Shortest periodic separation (array or scalar) for a period of grid_size. """
+    return delta - grid_size * np.round(delta / grid_size)
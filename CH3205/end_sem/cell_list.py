@@ -0,0 +1,193 @@
+import itertools
+
+import numpy as np
+
+# Share of molecules crossing a cell boundary above which the index is re-sorted instead of merged
+FULL_SORT_FRACTION = 0.1
+
+# --- Cell List ---
+class CellList:
+    """ Uniform-grid cell list for quenching-radius neighbor searches.
+
+        The grid is binned into square (cubic with z coordinates) cells of
+        side cell_size. As long as cell_size >= quenching radius, every O2
+        within the quenching radius of a point lies in the 3x3 (3x3x3)
+        block of cells around that point, so only those cells have to be
+        scanned. Only per-molecule cell ids are stored, so memory does not
+        grow with the number of cells.
+
+        Molecules are tracked by their index in the O2 list, in an index
+        sorted by (cell id, molecule index). Moving a molecule only updates its cell id and
+        flags it if it crossed a cell boundary; before the next query the
+        flagged molecules are taken out of the sorted index, sorted among
+        themselves and merged back in (O(k log k) for k crossers plus O(N)
+        memory moves). When more than FULL_SORT_FRACTION of the molecules
+        crossed (typical for freely diffusing O2, where a quarter or more
+        change cell every step) re-sorting the unique keys from scratch is
+        cheaper, and is done instead.
+
+        With periodic=True coordinates must lie in [0, grid_size) and the
+        neighbouring cells wrap around (period grid_size); cells are then
+        stretched so that a whole number of them tiles the period.
+    """
+    def __init__(self, grid_size, cell_size, x, y, z=None, periodic=False):
+        self.periodic = periodic
+        if periodic:
+            self.n_cells = max(1, int(grid_size // cell_size))
+            self.cell_size = grid_size / self.n_cells
+        else:
+            self.cell_size = float(cell_size)
+            self.n_cells = max(1, int(np.ceil(grid_size / self.cell_size)) + 1)
+        self.dimensions = 2 if z is None else 3
+        coords = [np.asarray(c, dtype=np.float64) for c in (x, y, z) if c is not None]
+        self.cell_id = self._cell_ids(*coords)
+        self._crossed = np.zeros(len(self.cell_id), dtype=bool)
+        self._dirty = True
+        self._order = None
+        self._sorted_keys = None
+
+    def _cell_ids(self, x, y, z=None):
+        """ Flat cell ids (row-major over (cx, cy[, cz]): id = cx * n_cells + cy in 2D) for arrays of coordinates. """
+        cell_id = 0
+        for c in (x, y, z):
+            if c is not None:
+                index = np.floor_divide(c, self.cell_size).astype(np.int64)
+                if self.periodic:
+                    index %= self.n_cells  # Guards against rounding at the upper edge
+                cell_id = cell_id * self.n_cells + index
+        return cell_id
+
+    def _rebuild(self):
+        """ Brings the sorted index up to date with the molecules that crossed a cell boundary. """
+        # Keys are unique, so a fast unstable sort keeps each cell in molecule order
+        n = len(self.cell_id)
+        crossed = np.flatnonzero(self._crossed)
+        if self._order is None or len(crossed) > FULL_SORT_FRACTION * n:
+            keys = self.cell_id * n + np.arange(n)
+            self._order = np.argsort(keys)
+            self._sorted_keys = keys[self._order]
+        else:
+            keep = ~self._crossed[self._order]
+            order, sorted_keys = self._order[keep], self._sorted_keys[keep]
+            crossed_keys = np.sort(self.cell_id[crossed] * n + crossed)
+            positions = sorted_keys.searchsorted(crossed_keys)
+            self._order = np.insert(order, positions, crossed_keys % n)
+            self._sorted_keys = np.insert(sorted_keys, positions, crossed_keys)
+        self._crossed[crossed] = False
+        self._dirty = False
+
+    def move(self, index, x, y, z=None):
+        """ Updates the cell of one molecule after it moved to (x, y[, z]). """
+        if self.periodic:
+            new_id = int(self._cell_ids(x, y, z))
+        else:
+            new_id = int(x // self.cell_size) * self.n_cells + int(y // self.cell_size)
+            if z is not None:
+                new_id = new_id * self.n_cells + int(z // self.cell_size)
+        if new_id != self.cell_id[index]:
+            self.cell_id[index] = new_id
+            self._crossed[index] = True
+            self._dirty = True
+
+    def move_many(self, indices, x, y, z=None):
+        """ Updates the cells of several molecules after they moved. """
+        new_ids = self._cell_ids(x, y, z)
+        changed = new_ids != self.cell_id[indices]
+        if changed.any():
+            crossed = indices[changed]
+            self.cell_id[crossed] = new_ids[changed]
+            self._crossed[crossed] = True
+            self._dirty = True
+
+    def candidates(self, x, y, z=None):
+        """ Returns the sorted indices of molecules in the 3x3 (3x3x3) cells around (x, y[, z]). """
+        if self._dirty:
+            self._rebuild()
+        n = self.n_cells
+        cells = [int(c // self.cell_size) % n if self.periodic else int(c // self.cell_size)
+                 for c in (x, y, z) if c is not None]
+
+        # The three cells along the last axis are contiguous in id space
+        # (unless they wrap around a periodic boundary)
+        last = cells.pop()
+        if self.periodic:
+            neighbours = [sorted({(c + k) % n for k in (-1, 0, 1)}) for c in cells]
+            last_ranges = [(i, i) for i in sorted({(last + k) % n for k in (-1, 0, 1)})]
+        else:
+            neighbours = [[i for i in (c - 1, c, c + 1) if 0 <= i < n] for c in cells]
+            last_ranges = [(max(last - 1, 0), min(last + 1, n - 1))]
+        bounds = []
+        for outer in itertools.product(*neighbours):
+            base = 0
+            for i in outer:
+                base = base * n + i
+            for lo_last, hi_last in last_ranges:
+                bounds.append(base * n + lo_last)
+                bounds.append(base * n + hi_last + 1)
+        n_molecules = len(self.cell_id)
+        edges = self._sorted_keys.searchsorted([bound * n_molecules for bound in bounds]).tolist()
+        found = []
+        for start, stop in zip(edges[::2], edges[1::2]):
+            found.extend(self._order[start:stop].tolist())
+        found.sort()
+        return found
+
+    def candidate_pairs(self, x, y, z=None):
+        """ Batched candidates for arrays of query points.
+
+            Returns (query, molecule) index arrays holding, for every query
+            point, the molecules of its 3x3 (3x3x3) cells, grouped by query
+            in ascending order (molecules within a group are not sorted).
+        """
+        if self._dirty:
+            self._rebuild()
+        n = self.n_cells
+        cells = [np.floor_divide(np.asarray(c, dtype=np.float64), self.cell_size).astype(np.int64)
+                 for c in (x, y, z) if c is not None]
+        if self.periodic:
+            cells = [c % n for c in cells]
+        n_queries = len(cells[0])
+
+        # One key range per query and block of neighbouring cells: the three
+        # cells along the last axis are contiguous in id space, unless they
+        # wrap around a periodic boundary, where every cell is its own range
+        last = cells.pop()
+        offsets = [(-1, 0, 1)] * len(cells)
+        last_ranges = [(k, k) for k in (-1, 0, 1)] if self.periodic else [(-1, 1)]
+        lo_bounds, hi_bounds = [], []
+        for outer in itertools.product(*offsets):
+            base = np.zeros(n_queries, dtype=np.int64)
+            valid = np.ones(n_queries, dtype=bool)
+            for c, k in zip(cells, outer):
+                i = c + k
+                if self.periodic:
+                    i %= n
+                else:
+                    valid &= (i >= 0) & (i < n)
+                base = base * n + i
+            for lo_k, hi_k in last_ranges:
+                if self.periodic:
+                    lo_last = hi_last = (last + lo_k) % n
+                else:
+                    lo_last, hi_last = np.maximum(last + lo_k, 0), np.minimum(last + hi_k, n - 1)
+                lo = base * n + lo_last
+                lo_bounds.append(lo)
+                hi_bounds.append(np.where(valid, base * n + hi_last + 1, lo))
+        n_molecules = len(self.cell_id)
+        starts = self._sorted_keys.searchsorted(np.stack(lo_bounds, axis=1).ravel() * n_molecules)
+        stops = self._sorted_keys.searchsorted(np.stack(hi_bounds, axis=1).ravel() * n_molecules)
+        if self.periodic and n < 3:
+            # Fewer than three cells per axis: the wrapped neighbours repeat cells
+            ranges = np.stack([np.repeat(np.arange(n_queries), len(lo_bounds)), starts, stops], axis=1)
+            ranges = np.unique(ranges, axis=0)
+            range_query, starts, stops = ranges[:, 0], ranges[:, 1], ranges[:, 2]
+        else:
+            range_query = np.repeat(np.arange(n_queries), len(lo_bounds))
+
+        # Expand the ranges into (query, molecule) pairs
+        counts = np.maximum(stops - starts, 0)
+        total = int(counts.sum())
+        query = np.repeat(range_query, counts)
+        first = np.cumsum(counts) - counts
+        positions = np.arange(total) - np.repeat(first - starts, counts)
+        return query, self._order[positions]
@@ -0,0 +1,61 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# --- JSON Helpers ---
+def encode_json(obj):
+    """ Stores a JSON-serializable object (e.g. RNG state) as a 0-d string array. """
+    return np.array(json.dumps(obj))
+
+def decode_json(array):
+    return json.loads(str(array))
+
+# --- Checkpoint I/O ---
+class CheckpointWriter:
+    """ Writes simulation checkpoints atomically on a background thread.
+
+        save() only hands an already-copied dict of arrays to a writer
+        thread, so the step loop is not blocked by disk I/O. Each checkpoint
+        is written to a temporary file, flushed to disk and then renamed over
+        the previous one, so a kill at any point leaves a complete checkpoint.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._thread = None
+        self._error = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _write(self, arrays):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self._error = e
+
+    def save(self, arrays):
+        """ Starts writing a checkpoint (waits only if the previous write is still running). """
+        self.wait()
+        self._thread = threading.Thread(target=self._write, args=(arrays,), daemon=True)
+        self._thread.start()
+
+    def wait(self):
+        """ Blocks until the pending write (if any) has finished. """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            print(f"Warning: Failed to write checkpoint {self.path}: {error}")
+
+def load_checkpoint(path):
+    """ Loads a checkpoint written by CheckpointWriter into a dict of arrays. """
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
@@ -0,0 +1,556 @@
+import argparse
+import multiprocessing as mp
+import weakref
+from collections import defaultdict
+from multiprocessing.connection import wait
+from multiprocessing.shared_memory import SharedMemory
+from time import perf_counter
+
+import numpy as np
+
+from cell_list import CellList
+from move_table import MoveProbabilityTable, get_move_table
+from running_stats import DISTANCE_BINS, RunningStatsArray
+from vectorized_engine import EXCITED, GROUND
+
+# --- Counter-Based Random Numbers ---
+# Every draw is a hash of (key, step, stream, molecule / complex index), so
+# it does not depend on which process makes it or in which order
+EXCITE_STREAM, MOVE_STREAM, DX_STREAM, DY_STREAM = range(4)
+_MASK = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+
+def _mix_int(z):
+    """ SplitMix64 finalizer of a Python int. """
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK
+    return z ^ (z >> 31)
+
+def _mix(z):
+    """ SplitMix64 finalizer of a uint64 array (wraps modulo 2**64). """
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+def counter_uniform(key, step, stream, indices):
+    """ Uniform [0, 1) draws for the given indices at one step of one stream. """
+    base = np.uint64(_mix_int(key ^ _mix_int((step << 2) | stream)))
+    bits = _mix(base + np.asarray(indices, dtype=np.uint64) * np.uint64(_GOLDEN))
+    return (bits >> np.uint64(11)) * (1.0 / (1 << 53))
+
+def counter_key(seed):
+    """ 64-bit key of the counter-based draws (fresh entropy if seed is None). """
+    return int(np.random.SeedSequence(seed).generate_state(1, dtype=np.uint64)[0])
+
+def max_tiles(grid_size, quenching_radius):
+    """ Most strips the grid can be split into.
+
+        A strip must be at least quenching_radius + 1 wide, so an O2 hop
+        (at most one cell) only reaches the next strip and every O2 within
+        the quenching radius of a complex is owned by its strip or a direct
+        neighbour.
+    """
+    return max(1, int(grid_size // (quenching_radius + 1)))
+
+# --- Shared Arrays ---
+LEFT, RIGHT = 0, 1
+
+def _attach(specs):
+    """ Maps the shared arrays described by {name: (shm name, shape, dtype)}; returns (arrays, segments). """
+    arrays, segments = {}, []
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = SharedMemory(name=shm_name)
+        segments.append(shm)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return arrays, segments
+
+# --- Tile Worker ---
+class _Tile:
+    """ One strip of the grid, stepped in its own process.
+
+        Owns the complexes and O2 molecules whose x lies in [x0, x1). A
+        step has three parts separated by barriers:
+          A. excite own complexes, move own O2, publish to each neighbour
+             the O2 that left towards it or lie within its halo
+             (quenching radius of the boundary);
+          B. take in the published O2 (arrivals become owned, the rest is
+             halo), quench own excited complexes against owned + halo O2,
+             evolve own complexes, post quench credits for neighbour-owned
+             quenchers;
+          C. add the credits posted for own O2.
+        All writes go to the writer's own complexes / molecules or its own
+        mailboxes, so the shared arrays need no locks.
+    """
+    def __init__(self, tile, tiles, bounds, arrays, params):
+        self.tile = tile
+        self.tiles = tiles
+        self.x0 = bounds[tile] if tile > 0 else -np.inf
+        self.x1 = bounds[tile + 1] if tile < tiles - 1 else np.inf
+        self.a = arrays
+        self.key = params['key']
+        self.grid_size = params['grid_size']
+        self.excited_lifetime = params['excited_lifetime']
+        self.excitation_prob = params['excitation_prob']
+        self.quenching_radius = params['quenching_radius']
+        self.quenching_radius_sq = params['quenching_radius'] ** 2
+        self.move_table = MoveProbabilityTable.from_probs(params['grid_size'], arrays['move_probs'],
+                                                          params['resolution'])
+        self.ru = np.flatnonzero(self._inside(arrays['ru_x']))
+        n_ru = len(arrays['ru_x'])
+        self.lifetime_stats = RunningStatsArray(n_ru, 0, self.excited_lifetime + 1, self.excited_lifetime + 1)
+        self.quencher_distance_stats = RunningStatsArray(n_ru, 0, self.quenching_radius, DISTANCE_BINS)
+        self.load()
+
+    def _inside(self, x):
+        return (x >= self.x0) & (x < self.x1)
+
+    def load(self, lifetime_state=None, distance_state=None, key=None):
+        """ (Re)builds the owned O2 list from the shared positions, optionally restoring statistics and key. """
+        if key is not None:
+            self.key = key
+        self.owned = np.flatnonzero(self._inside(self.a['o2_x']))
+        self.halo = np.empty(0, dtype=np.int64)
+        if lifetime_state is not None:
+            self.lifetime_stats = RunningStatsArray.from_state(lifetime_state)
+            self.quencher_distance_stats = RunningStatsArray.from_state(distance_state)
+
+    # --- Part A ---
+    def excite(self, step):
+        a, ru = self.a, self.ru
+        draws = counter_uniform(self.key, step, EXCITE_STREAM, ru)
+        newly = ru[(a['state'][ru] == GROUND) & (draws < self.excitation_prob)]
+        a['state'][newly] = EXCITED
+        a['excited_timer'][newly] = self.excited_lifetime
+        a['total_excitations'][newly] += 1
+
+    def move(self, step):
+        a, ids = self.a, self.owned
+        o2_x, o2_y = a['o2_x'], a['o2_y']
+        move_prob = self.move_table.lookup_array(o2_x[ids], o2_y[ids])
+        moving = ids[counter_uniform(self.key, step, MOVE_STREAM, ids) < move_prob]
+        if len(moving) > 0:
+            dx = np.floor(counter_uniform(self.key, step, DX_STREAM, moving) * 3) - 1
+            dy = np.floor(counter_uniform(self.key, step, DY_STREAM, moving) * 3) - 1
+
+            # Apply boundary conditions (stay within grid)
+            old_x, old_y = o2_x[moving], o2_y[moving]
+            new_x = np.clip(old_x + dx, 0, self.grid_size - 1)
+            new_y = np.clip(old_y + dy, 0, self.grid_size - 1)
+            o2_x[moving] = new_x
+            o2_y[moving] = new_y
+            a['o2_path_length'][moving] += np.hypot(new_x - old_x, new_y - old_y)
+
+    def publish(self):
+        """ Hands emigrants and halo molecules to the neighbours; keeps the molecules still inside.
+
+            Emigrants stay in this tile's halo: they are at most one cell
+            past the boundary, so they can still quench complexes here.
+        """
+        x = self.a['o2_x'][self.owned]
+        if self.tile > 0:
+            self._post('pub', LEFT, self.owned[x < self.x0 + self.quenching_radius])
+        if self.tile < self.tiles - 1:
+            self._post('pub', RIGHT, self.owned[x >= self.x1 - self.quenching_radius])
+        inside = self._inside(x)
+        self.halo = self.owned[~inside]
+        self.owned = self.owned[inside]
+
+    def _post(self, box, direction, ids):
+        self.a[f'{box}_ids'][self.tile, direction, :len(ids)] = ids
+        self.a[f'{box}_count'][self.tile, direction] = len(ids)
+
+    def _received(self, box):
+        """ Ids the neighbours posted to this tile's mailbox (copied). """
+        a, parts = self.a, []
+        if self.tile > 0:
+            parts.append(a[f'{box}_ids'][self.tile - 1, RIGHT, :a[f'{box}_count'][self.tile - 1, RIGHT]])
+        if self.tile < self.tiles - 1:
+            parts.append(a[f'{box}_ids'][self.tile + 1, LEFT, :a[f'{box}_count'][self.tile + 1, LEFT]])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    # --- Part B ---
+    def gather(self):
+        received = self._received('pub')
+        arrived = self._inside(self.a['o2_x'][received])
+        self.owned = np.concatenate([self.owned, received[arrived]])
+        self.halo = np.concatenate([self.halo, received[~arrived]])
+
+    def quench(self):
+        """ Quenches own excited complexes with an O2 (owned or halo) within the quenching radius.
+
+            The quencher is the O2 with the lowest index inside the radius,
+            the same rule as the single-process engines.
+        """
+        a = self.a
+        a['credit_count'][self.tile] = 0
+        excited = self.ru[a['state'][self.ru] == EXCITED]
+        candidates = np.concatenate([self.owned, self.halo])
+        if len(excited) == 0 or len(candidates) == 0:
+            return
+        cand_x, cand_y = a['o2_x'][candidates], a['o2_y'][candidates]
+        cells = CellList(self.grid_size, self.quenching_radius, cand_x, cand_y)
+        ru_x, ru_y = a['ru_x'], a['ru_y']
+        quencher = np.full(len(excited), -1, dtype=np.int64)
+        quencher_dist_sq = np.zeros(len(excited))
+        for k, ru in enumerate(excited.tolist()):
+            local = cells.candidates(ru_x[ru], ru_y[ru])
+            if not local:
+                continue
+            local = np.array(local)
+            dist_sq = (ru_x[ru] - cand_x[local]) ** 2 + (ru_y[ru] - cand_y[local]) ** 2
+            within = np.flatnonzero(dist_sq < self.quenching_radius_sq)
+            if len(within) > 0:
+                first = within[np.argmin(candidates[local[within]])]
+                quencher[k] = candidates[local[first]]
+                quencher_dist_sq[k] = dist_sq[first]
+
+        hit = quencher >= 0
+        quenched = excited[hit]
+        self.lifetime_stats.add(quenched, a['excited_timer'][quenched])
+        self.quencher_distance_stats.add(quenched, np.sqrt(quencher_dist_sq[hit]))
+        a['state'][quenched] = GROUND
+        a['excited_timer'][quenched] = 0
+        a['quenched_count'][quenched] += 1
+
+        # Credit the quenchers: own ones directly, halo ones through their owner's mailbox
+        quenchers = quencher[hit]
+        quencher_x = a['o2_x'][quenchers]
+        np.add.at(a['o2_quench_count'], quenchers[self._inside(quencher_x)], 1)
+        if self.tile > 0:
+            self._post('credit', LEFT, quenchers[quencher_x < self.x0])
+        if self.tile < self.tiles - 1:
+            self._post('credit', RIGHT, quenchers[quencher_x >= self.x1])
+
+    def evolve(self):
+        a = self.a
+        excited = self.ru[a['state'][self.ru] == EXCITED]
+        a['excited_timer'][excited] -= 1
+        emitting = excited[a['excited_timer'][excited] <= 0]
+        self.lifetime_stats.add(emitting, a['excited_timer'][emitting])
+        a['state'][emitting] = GROUND
+        a['excited_timer'][emitting] = 0
+        a['emission_count'][emitting] += 1
+
+    # --- Part C ---
+    def apply_credits(self):
+        np.add.at(self.a['o2_quench_count'], self._received('credit'), 1)
+
+    def run(self, start_step, steps, barrier):
+        """ Runs `steps` steps in lockstep with the other tiles; returns this call's phase times. """
+        phase_times = defaultdict(float)
+        for step in range(start_step, start_step + steps):
+            t0 = perf_counter()
+            self.excite(step)
+            t1 = perf_counter()
+            self.move(step)
+            t2 = perf_counter()
+            self.publish()
+            t3 = perf_counter()
+            barrier.wait()
+            t4 = perf_counter()
+            self.gather()
+            t5 = perf_counter()
+            self.quench()
+            t6 = perf_counter()
+            self.evolve()
+            t7 = perf_counter()
+            barrier.wait()
+            t8 = perf_counter()
+            self.apply_credits()
+            t9 = perf_counter()
+            phase_times['excite'] += t1 - t0
+            phase_times['move'] += t2 - t1
+            phase_times['exchange'] += (t3 - t2) + (t5 - t4) + (t9 - t8)
+            phase_times['quench'] += t6 - t5
+            phase_times['evolve'] += t7 - t6
+            phase_times['wait'] += (t4 - t3) + (t8 - t7)
+        return dict(phase_times)
+
+def _tile_main(tile, tiles, bounds, specs, params, conn, barrier):
+    """ Worker process: serves commands from the DecomposedSimulation until 'close'. """
+    arrays, segments = _attach(specs)
+    worker = None
+    try:
+        worker = _Tile(tile, tiles, bounds, arrays, params)
+        conn.send(None)  # Ready: no tile may step before all have taken their molecules
+        while True:
+            command, *payload = conn.recv()
+            if command == 'run':
+                conn.send(worker.run(*payload, barrier))
+            elif command == 'stats':
+                conn.send((worker.ru, worker.lifetime_stats.get_state(), worker.quencher_distance_stats.get_state()))
+            elif command == 'load':
+                worker.load(*payload)
+                conn.send(None)
+            else:
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        worker = arrays = None
+        for shm in segments:
+            try:
+                shm.close()
+            except BufferError:
+                pass
+
+def _shutdown(processes, connections, segments):
+    """ Stops the tile processes and frees the shared memory (also run at exit). """
+    for conn in connections:
+        try:
+            conn.send(('close',))
+        except OSError:
+            pass
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    for shm in segments:
+        try:
+            shm.close()
+        except BufferError:
+            pass  # Arrays still referenced elsewhere; the mapping goes away with them
+        shm.unlink()
+
+# --- Decomposed Engine ---
+class DecomposedSimulation:
+    """ Multi-process version of the vectorized Ru/O2 quenching model for very large grids.
+
+        The grid is split along x into `tiles` strips, each stepped by its
+        own process (see _Tile). Positions, states, counters and the move
+        table live in shared memory; O2 molecules that cross a strip
+        boundary and those within the quenching radius of it are handed to
+        the neighbouring strip every step (halo exchange), so complexes
+        near an edge see the same O2 as in a single process.
+
+        Random draws are counter-based - a hash of (seed, step, molecule or
+        complex index) - and the quencher is the lowest-index O2 in range,
+        so the results are identical for any number of tiles, including a
+        single one, and resumed runs continue bit-identically. The
+        statistics match the vectorized engine, but not its random stream.
+        Mailboxes are sized for the worst case but only the pages actually
+        written are committed. Events are not streamed to a recorder.
+    """
+    def __init__(self, ru_x, ru_y, ru_type, o2_x, o2_y, grid_size, core_center, core_radius,
+                 density_steepness, prob_min, prob_max, excited_lifetime, quenching_radius,
+                 excitation_prob=1.0, seed=None, tiles=1, recorder=None, move_table=None):
+        if recorder is not None:
+            raise ValueError("The decomposed engine does not stream events; record with another engine.")
+        self.phase_times = defaultdict(float)  # Seconds spent per step phase (mean over tiles)
+        self.ru_type = np.asarray(ru_type)
+        self.excited_lifetime = excited_lifetime
+        self.quenching_radius = quenching_radius
+        self.key = counter_key(seed)
+        self.steps_done = 0
+
+        # Strips of (nearly) equal width
+        limit = max_tiles(grid_size, quenching_radius)
+        if tiles > limit:
+            print(f"Warning: Grid of size {grid_size} fits at most {limit} tiles, using {limit}.")
+        self.tiles = max(1, min(tiles, limit))
+        bounds = np.linspace(0, grid_size, self.tiles + 1).tolist()
+
+        # Shared arrays (and mailboxes for the exchange between neighbouring strips)
+        n_ru, n_o2 = len(ru_x), len(o2_x)
+        self._segments = []
+        self._specs = {}
+        self._share('ru_x', ru_x, np.float64)
+        self._share('ru_y', ru_y, np.float64)
+        self._share('state', np.full(n_ru, GROUND), np.int8)
+        for name in ('excited_timer', 'emission_count', 'quenched_count', 'total_excitations'):
+            self._share(name, np.zeros(n_ru), np.int64)
+        self._share('o2_x', o2_x, np.float64)
+        self._share('o2_y', o2_y, np.float64)
+        self._share('o2_path_length', np.zeros(n_o2), np.float64)
+        self._share('o2_quench_count', np.zeros(n_o2), np.int64)
+        self._share('pub_ids', None, np.int64, (self.tiles, 2, n_o2))
+        self._share('pub_count', None, np.int64, (self.tiles, 2))
+        self._share('credit_ids', None, np.int64, (self.tiles, 2, n_ru))
+        self._share('credit_count', None, np.int64, (self.tiles, 2))
+
+        # The move table is shared too, so the strips do not each build a copy of it
+        if move_table is None:
+            move_table = get_move_table(grid_size, core_center, core_radius, density_steepness, prob_min, prob_max)
+        self._share('move_probs', move_table.probs, np.float64, move_table.probs.shape)
+
+        # One process per strip
+        params = {'key': self.key, 'grid_size': grid_size, 'resolution': move_table.resolution,
+                  'excited_lifetime': excited_lifetime, 'quenching_radius': quenching_radius,
+                  'excitation_prob': excitation_prob}
+        barrier = mp.Barrier(self.tiles)
+        self._processes, self._connections = [], []
+        for tile in range(self.tiles):
+            conn, child_conn = mp.Pipe()
+            process = mp.Process(target=_tile_main, daemon=True,
+                                 args=(tile, self.tiles, bounds, self._specs, params, child_conn, barrier))
+            process.start()
+            child_conn.close()
+            self._processes.append(process)
+            self._connections.append(conn)
+        self._finalizer = weakref.finalize(self, _shutdown, self._processes, self._connections, self._segments)
+        self._replies()
+
+    def _share(self, name, values, dtype, shape=None):
+        """ Allocates a shared array (zero-filled, or a copy of values) and exposes it as an attribute. """
+        shape = shape if shape is not None else (len(values),)
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        shm = SharedMemory(create=True, size=max(1, nbytes))
+        array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        if values is not None:
+            array[...] = values
+        self._segments.append(shm)
+        self._specs[name] = (shm.name, shape, np.dtype(dtype).str)
+        setattr(self, name, array)
+
+    @classmethod
+    def from_objects(cls, complexes, o2_molecules, **params):
+        """ Builds the engine from lists of RutheniumComplex / OxygenMolecule objects. """
+        return cls(
+            [c.x for c in complexes], [c.y for c in complexes], [c.type for c in complexes],
+            [o.x for o in o2_molecules], [o.y for o in o2_molecules],
+            **params
+        )
+
+    # --- Tile Commands ---
+    def _command(self, *message):
+        """ Sends a command to every tile and returns their replies (in tile order). """
+        for conn in self._connections:
+            conn.send(message)
+        return self._replies()
+
+    def _replies(self):
+        """ Waits for one reply from every tile; fails if a tile process died. """
+        replies = {}
+        pending = dict(zip(self._connections, range(self.tiles)))
+        sentinels = {process.sentinel: tile for tile, process in enumerate(self._processes)}
+        while pending:
+            for ready in wait(list(pending) + list(sentinels)):
+                if ready in sentinels:
+                    self.close()
+                    raise RuntimeError(f"Tile process {sentinels[ready]} of the decomposed engine exited")
+                if ready in pending:
+                    replies[pending.pop(ready)] = ready.recv()
+        return [replies[tile] for tile in range(self.tiles)]
+
+    def close(self):
+        """ Stops the tile processes; the arrays are kept (as private copies) for reading results. """
+        if not self._finalizer.alive:
+            return
+        for name in self._specs:
+            setattr(self, name, getattr(self, name).copy())
+        self._finalizer()
+
+    # --- Stepping ---
+    def step(self):
+        """ Advances the simulation by one time step. """
+        self.run(1)
+
+    def run(self, steps):
+        """ Advances the simulation by the given number of time steps (in one round trip to the tiles). """
+        for phase_times in self._command('run', self.steps_done, steps):
+            for phase, seconds in phase_times.items():
+                self.phase_times[phase] += seconds / self.tiles
+        self.steps_done += steps
+
+    # --- Statistics ---
+    def _gather_stats(self):
+        """ Returns the per-complex (lifetime, quencher distance) RunningStatsArrays of all tiles. """
+        lifetime_state = distance_state = None
+        for ru, lifetimes, distances in self._command('stats'):
+            if lifetime_state is None:
+                lifetime_state, distance_state = lifetimes, distances
+            lifetime_state[ru] = lifetimes[ru]
+            distance_state[ru] = distances[ru]
+        return RunningStatsArray.from_state(lifetime_state), RunningStatsArray.from_state(distance_state)
+
+    # --- Checkpointing ---
+    def get_state(self):
+        """ Returns a copy of the full engine state (arrays, aggregates and counter key). """
+        lifetime_stats, quencher_distance_stats = self._gather_stats()
+        return {
+            'ru_x': self.ru_x.copy(), 'ru_y': self.ru_y.copy(), 'ru_type': self.ru_type.copy(),
+            'state': self.state.copy(), 'excited_timer': self.excited_timer.copy(),
+            'emission_count': self.emission_count.copy(), 'quenched_count': self.quenched_count.copy(),
+            'total_excitations': self.total_excitations.copy(),
+            'o2_x': self.o2_x.copy(), 'o2_y': self.o2_y.copy(),
+            'o2_quench_count': self.o2_quench_count.copy(), 'o2_path_length': self.o2_path_length.copy(),
+            'lifetime_stats': lifetime_stats.get_state(),
+            'distance_stats': quencher_distance_stats.get_state(),
+            'steps_done': np.array(self.steps_done),
+            'counter_key': np.array(str(self.key))
+        }
+
+    def set_state(self, state):
+        """ Restores a state returned by get_state (continues bit-identically). """
+        for name in ('state', 'excited_timer', 'emission_count', 'quenched_count', 'total_excitations',
+                     'o2_x', 'o2_y', 'o2_quench_count', 'o2_path_length'):
+            getattr(self, name)[...] = state[name]
+        self.steps_done = int(state['steps_done'])
+        self.key = int(str(state['counter_key']))
+        self._command('load', state['lifetime_stats'], state['distance_stats'], self.key)
+
+    # --- Results ---
+    def get_type_counts(self, type):
+        """ Returns (emissions, quenched) summed over complexes of one type. """
+        mask = self.ru_type == type
+        return int(self.emission_count[mask].sum()), int(self.quenched_count[mask].sum())
+
+    def get_simulated_qy(self, type):
+        """ Calculates the quantum yield of one complex type. """
+        emissions, quenched = self.get_type_counts(type)
+        total_events = emissions + quenched
+        return emissions / total_events if total_events > 0 else 0
+
+    def write_back(self, complexes, o2_molecules):
+        """ Copies the shared state back onto the objects the engine was built from. """
+        lifetime_stats, quencher_distance_stats = self._gather_stats()
+        for i, c in enumerate(complexes):
+            c.state = 'excited' if self.state[i] == EXCITED else 'ground'
+            c.excited_timer = int(self.excited_timer[i])
+            c.emission_count = int(self.emission_count[i])
+            c.quenched_count = int(self.quenched_count[i])
+            if hasattr(c, 'total_excitations'):
+                c.total_excitations = int(self.total_excitations[i])
+            if hasattr(c, 'lifetime_stats'):
+                c.lifetime_stats = lifetime_stats[i]
+                c.quencher_distance_stats = quencher_distance_stats[i]
+
+        for i, o2 in enumerate(o2_molecules):
+            o2.x = float(self.o2_x[i])
+            o2.y = float(self.o2_y[i])
+            if hasattr(o2, 'quench_count'):
+                o2.quench_count = int(self.o2_quench_count[i])
+            if hasattr(o2, 'path_length'):
+                o2.path_length = float(self.o2_path_length[i])
+
+# --- Main Entry Point ---
+if __name__ == "__main__":
+    from dataclasses import replace
+
+    from kmc_engine import compare_engines, standard_error
+    from simulation_core import Simulation, SimulationConfig
+
+    parser = argparse.ArgumentParser(description='Validate the domain-decomposed engine')
+    parser.add_argument('--grid-size', type=int, default=100, help='Size of the simulation grid')
+    parser.add_argument('--num-o2', type=int, default=180, help='Number of oxygen molecules')
+    parser.add_argument('--steps', type=int, default=600, help='Number of simulation time steps')
+    parser.add_argument('--tiles', type=int, default=4, help='Number of strips (worker processes)')
+    parser.add_argument('--seeds', type=int, default=8, help='Number of seeds per engine')
+    args = parser.parse_args()
+
+    # 1. Same seed, 1 tile vs --tiles: the results must be identical
+    config = SimulationConfig(grid_size=args.grid_size, num_o2=args.num_o2, engine='decomposed', seed=0)
+    serial, split = (Simulation(replace(config, tiles=tiles)).run(args.steps) for tiles in (1, args.tiles))
+    identical = all(np.array_equal(a, b) for a, b in zip(
+        (serial.engine.emission_count, serial.engine.quenched_count, serial.engine.o2_quench_count,
+         serial.engine.o2_x, serial.engine.o2_path_length),
+        (split.engine.emission_count, split.engine.quenched_count, split.engine.o2_quench_count,
+         split.engine.o2_x, split.engine.o2_path_length)))
+    print(f"1 tile vs {split.engine.tiles} tiles: {'identical' if identical else 'DIFFERENT'} results")
+
+    # 2. Statistics against the vectorized engine over several seeds
+    results = compare_engines(replace(config, tiles=args.tiles), args.steps, range(args.seeds),
+                              engines=('vectorized', 'decomposed'))
+    for engine, (ru1_qy, ru2_qy, seconds) in results.items():
+        print(f"{engine:>10}: Ru1 QY {ru1_qy.mean():.4f} ± {standard_error(ru1_qy):.4f}, "
+              f"Ru2 QY {ru2_qy.mean():.4f} ± {standard_error(ru2_qy):.4f} ({seconds:.2f} s)")
@@ -0,0 +1,195 @@
+import math
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+from scipy import stats
+
+# --- Defaults ---
+DEFAULT_CONFIDENCE = 0.95
+BOOTSTRAP_RESAMPLES = 2000
+CI_METHODS = ('se', 'bootstrap')
+
+# --- Helper Functions ---
+def replicate_seed(seed, replicate):
+    """ Seed of replicate r of a point; replicate 0 runs on the point's own seed.
+
+        Later replicates are spawned from the point seed, so each replicate's
+        result depends only on (point seed, replicate index) and can be cached
+        and reproduced independently of how many replicates end up being run.
+    """
+    if replicate == 0:
+        return seed
+    return int(np.random.SeedSequence(seed, spawn_key=(replicate,)).generate_state(1)[0])
+
+def confidence_interval(values, confidence=DEFAULT_CONFIDENCE, method='se', rng=None):
+    """ Returns (mean, standard error, ci_low, ci_high) of the mean of values.
+
+        'se' uses the Student-t interval mean +/- t * s / sqrt(n); 'bootstrap'
+        uses the percentile interval of BOOTSTRAP_RESAMPLES resampled means.
+        With fewer than two values the interval is unbounded.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    mean = float(values.mean()) if n else math.nan
+    if n < 2:
+        return mean, math.inf, -math.inf, math.inf
+    sem = float(values.std(ddof=1) / math.sqrt(n))
+    if method == 'bootstrap':
+        rng = rng if rng is not None else np.random.default_rng()
+        means = values[rng.integers(0, n, size=(BOOTSTRAP_RESAMPLES, n))].mean(axis=1)
+        alpha = (1 - confidence) / 2
+        low, high = np.quantile(means, [alpha, 1 - alpha])
+        return mean, sem, float(low), float(high)
+    half_width = float(stats.t.ppf((1 + confidence) / 2, n - 1)) * sem
+    return mean, sem, mean - half_width, mean + half_width
+
+def add_ensemble_arguments(parser):
+    """ Adds the shared replicate / stopping options to an argparse parser. """
+    parser.add_argument('--replicates', type=int, default=1, help='Replicates run per point before checking the CI')
+    parser.add_argument('--max-replicates', type=int, default=None,
+                        help='Upper limit of replicates per point (default: --replicates)')
+    parser.add_argument('--target-ci', type=float, default=None,
+                        help='Add replicates until every QY CI half-width is below this')
+    parser.add_argument('--confidence', type=float, default=DEFAULT_CONFIDENCE, help='Confidence level of the CIs')
+    parser.add_argument('--ci-method', choices=CI_METHODS, default='se',
+                        help='CI of the mean: Student-t standard error or bootstrap percentile')
+
+def ensemble_settings(args):
+    """ Replicate settings from parsed ensemble options (they enter cache keys). """
+    min_replicates = max(1, args.replicates)
+    max_replicates = max(min_replicates, args.max_replicates or min_replicates)
+    return {'min_replicates': min_replicates, 'max_replicates': max_replicates, 'target_ci': args.target_ci,
+            'confidence': args.confidence, 'ci_method': args.ci_method}
+
+# --- Ensemble ---
+class Ensemble:
+    """ Replicate results of one point and the confidence intervals of their means. """
+    def __init__(self, key, seed, metrics):
+        self.key = key
+        self.seed = seed
+        self.metrics = metrics
+        self.results = {}  # replicate index -> result dict
+        self.failed = False
+        self.outstanding = 0
+        self.submitted = 0
+
+    def __len__(self):
+        return len(self.results)
+
+    def values(self, metric):
+        """ Metric values in replicate order (independent of completion order). """
+        return [self.results[r][metric] for r in sorted(self.results)]
+
+    def summary(self, confidence=DEFAULT_CONFIDENCE, method='se'):
+        """ Returns {metric: {'mean', 'sem', 'ci_low', 'ci_high', 'half_width'}, 'replicates': n}. """
+        summary = {'replicates': len(self)}
+        for metric in self.metrics:
+            rng = np.random.default_rng(self.seed)  # Reproducible bootstrap per point
+            mean, sem, low, high = confidence_interval(self.values(metric), confidence, method, rng)
+            summary[metric] = {'mean': mean, 'sem': sem, 'ci_low': low, 'ci_high': high,
+                               'half_width': (high - low) / 2}
+        return summary
+
+class EnsembleRunner:
+    """ Runs independent replicates of many points, adding replicates until the CIs are tight.
+
+        function(*point_args, seed) runs one replicate and returns a dict that
+        contains every metric (or None if the run failed). Each point first
+        runs min_replicates; while the CI half-width of any metric is above
+        target_half_width, another batch is added, sized from the current
+        standard error to reach the target, up to max_replicates. Points
+        whose replicates agree stop early, so the compute goes to the noisy
+        ones. Stopping decisions are taken on whole batches in replicate
+        order, so the outcome does not depend on the executor or the number
+        of workers. Without an executor, replicates run in this process.
+    """
+    def __init__(self, function, metrics, min_replicates=1, max_replicates=None, target_half_width=None,
+                 confidence=DEFAULT_CONFIDENCE, method='se', executor=None):
+        self.function = function
+        self.metrics = tuple(metrics)
+        self.min_replicates = max(1, min_replicates)
+        self.max_replicates = max(self.min_replicates, max_replicates or self.min_replicates)
+        self.target_half_width = target_half_width
+        self.confidence = confidence
+        self.method = method
+        self.executor = executor
+        self.replicates_run = 0
+
+    def _next_batch(self, ensemble):
+        """ Number of replicates to add to a point (0 once it is done). """
+        n = len(ensemble)
+        if ensemble.failed or n >= self.max_replicates:
+            return 0
+        if n < self.min_replicates:
+            return self.min_replicates - n
+        if self.target_half_width is None:
+            return 0
+        summary = self.summary(ensemble)
+        widest = max(summary[metric]['half_width'] for metric in self.metrics)
+        if widest <= self.target_half_width:
+            return 0
+        # The half-width shrinks as 1/sqrt(n)
+        needed = n * (widest / self.target_half_width) ** 2 if math.isfinite(widest) else n + 1
+        return min(self.max_replicates, max(n + 1, math.ceil(needed))) - n
+
+    def summary(self, ensemble):
+        return ensemble.summary(self.confidence, self.method)
+
+    def run(self, points):
+        """ Runs the given (key, args, seed) points; yields finished Ensembles in completion order. """
+        ensembles = {}
+        jobs = []
+        for key, args, seed in points:
+            ensembles[key] = Ensemble(key, seed, self.metrics)
+            jobs.append((key, args))
+
+        if self.executor is None:
+            for key, args in jobs:
+                ensemble = ensembles[key]
+                batch = self._next_batch(ensemble)
+                while batch:
+                    for _ in range(batch):
+                        replicate = ensemble.submitted
+                        ensemble.submitted += 1
+                        self._add_result(ensemble, replicate, self.function(*args, replicate_seed(ensemble.seed, replicate)))
+                    batch = self._next_batch(ensemble)
+                yield ensemble
+            return
+
+        futures = {}
+        def submit(key, args, count):
+            ensemble = ensembles[key]
+            for _ in range(count):
+                replicate = ensemble.submitted
+                ensemble.submitted += 1
+                ensemble.outstanding += 1
+                future = self.executor.submit(self.function, *args, replicate_seed(ensemble.seed, replicate))
+                futures[future] = (key, args, replicate)
+
+        for key, args in jobs:
+            submit(key, args, self._next_batch(ensembles[key]))
+        try:
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, args, replicate = futures.pop(future)
+                    ensemble = ensembles[key]
+                    ensemble.outstanding -= 1
+                    self._add_result(ensemble, replicate, future.result())
+                    if ensemble.outstanding:
+                        continue
+                    batch = self._next_batch(ensemble)
+                    if batch:
+                        submit(key, args, batch)
+                    else:
+                        yield ensemble
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _add_result(self, ensemble, replicate, result):
+        self.replicates_run += 1
+        if result is None:
+            ensemble.failed = True
+        else:
+            ensemble.results[replicate] = result
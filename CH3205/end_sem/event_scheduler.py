@@ -0,0 +1,94 @@
+import heapq
+import math
+
+import numpy as np
+
+# --- Event Scheduler ---
+class EventScheduler:
+    """ Next-event bookkeeping for excitation and emission of N complexes.
+
+        A ground-state complex is excited on each step with probability p,
+        so its next excitation is drawn once as a geometric waiting time
+        instead of polling it every step. An excited complex emits exactly
+        lifetime - 1 steps after its excitation step unless it is quenched
+        first, so its emission is pushed onto a heap when it is excited.
+        Emission entries of complexes that were quenched in the meantime
+        are dropped lazily when they come up.
+
+        Complexes are identified by index; times are step numbers.
+    """
+    def __init__(self, n, excitation_prob, lifetime, rng):
+        self.excitation_prob = excitation_prob
+        self.lifetime = lifetime
+        self.rng = rng
+        self.excited_at = [-1] * n  # Excitation step of excited complexes, -1 if ground
+        self.next_excitation = [-1] * n  # Scheduled excitation step of ground complexes, -1 if none
+        self.excited = set()
+        self._excite_heap = []
+        self._emit_heap = []
+        self._log_ground = math.log1p(-excitation_prob) if 0 < excitation_prob < 1 else None
+
+    def waiting_time(self):
+        """ Draws the number of steps (>= 1) until the next excitation of a ground complex. """
+        if self._log_ground is None:
+            return 1
+        return 1 + int(math.log(1.0 - self.rng.random()) / self._log_ground)
+
+    def start(self, step, indices):
+        """ Schedules the first excitation of ground complexes (possibly at `step` itself). """
+        for i in indices:
+            self.schedule_excitation(i, step - 1)
+
+    def schedule_excitation(self, i, decay_step):
+        """ Marks complex i as ground after decaying at decay_step and draws its next excitation. """
+        self.excited_at[i] = -1
+        self.excited.discard(i)
+        if self.excitation_prob <= 0:
+            return
+        time = decay_step + self.waiting_time()
+        self.next_excitation[i] = time
+        heapq.heappush(self._excite_heap, (time, i))
+
+    def pop_excitations(self, step):
+        """ Returns the complexes excited at this step and schedules their emissions. """
+        due = []
+        heap = self._excite_heap
+        while heap and heap[0][0] <= step:
+            _, i = heapq.heappop(heap)
+            self.next_excitation[i] = -1
+            self.excited_at[i] = step
+            self.excited.add(i)
+            heapq.heappush(self._emit_heap, (step + self.lifetime - 1, i))
+            due.append(i)
+        return due
+
+    def pop_emissions(self, step):
+        """ Returns the complexes (still excited) whose lifetime runs out at this step. """
+        due = []
+        heap = self._emit_heap
+        while heap and heap[0][0] <= step:
+            time, i = heapq.heappop(heap)
+            if self.excited_at[i] >= 0 and self.excited_at[i] + self.lifetime - 1 == time:
+                due.append(i)
+        return due
+
+    def remaining(self, i, step):
+        """ Excited-state timer of complex i during `step` (before the timer counts down). """
+        return self.lifetime - (step - self.excited_at[i])
+
+    # --- Checkpointing ---
+    def get_state(self):
+        return {
+            'excited_at': np.array(self.excited_at, dtype=np.int64),
+            'next_excitation': np.array(self.next_excitation, dtype=np.int64)
+        }
+
+    def set_state(self, state):
+        """ Restores a state returned by get_state and rebuilds both heaps. """
+        self.excited_at = state['excited_at'].tolist()
+        self.next_excitation = state['next_excitation'].tolist()
+        self.excited = {i for i, t in enumerate(self.excited_at) if t >= 0}
+        self._excite_heap = [(t, i) for i, t in enumerate(self.next_excitation) if t >= 0]
+        self._emit_heap = [(self.excited_at[i] + self.lifetime - 1, i) for i in self.excited]
+        heapq.heapify(self._excite_heap)
+        heapq.heapify(self._emit_heap)
@@ -0,0 +1,463 @@
+import argparse
+import heapq
+import math
+import random
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from cell_list import CellList
+from checkpoint import decode_json, encode_json
+from move_table import get_move_table
+from running_stats import RunningStats, distance_stats, lifetime_stats
+from stream_recorder import EMITTED_EVENT, EXCITED_EVENT, QUENCHED_EVENT
+from vectorized_engine import EXCITED, GROUND
+
+# The lattice walk moves to one of 9 offsets, one of which is (0, 0), so
+# only 8/9 of its move attempts are hops
+HOP_FRACTION = 8 / 9
+NEIGHBOURS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)]
+
+# Scheduled event kinds (emissions sort before excitations at equal times)
+_EMIT = 0
+_EXCITE = 1
+
+# Hop-rate updates are applied to the RateTree one leaf at a time; every
+# REBUILD_INTERVAL time steps it is rebuilt to drop the accumulated rounding error
+REBUILD_INTERVAL = 256
+
+# --- Rate Tree ---
+class RateTree:
+    """ Fenwick (binary indexed) tree over per-molecule rates.
+
+        Updating one rate and picking a molecule with probability
+        proportional to its rate are both O(log n).
+    """
+    def __init__(self, rates):
+        self.rates = list(rates)
+        self.rebuild()
+
+    def rebuild(self):
+        """ Rebuilds the partial sums from the rates (drops accumulated rounding error). """
+        n = len(self.rates)
+        tree = [0.0] + self.rates
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self._tree = tree
+        self.total = math.fsum(self.rates)
+        self._top_bit = 1 << (n.bit_length() - 1) if n else 0
+
+    def get_state(self):
+        """ Partial sums and total (saved with checkpoints, which may fall between rebuilds). """
+        return np.array(self._tree), np.array(self.total)
+
+    def set_state(self, tree, total):
+        self._tree = tree.tolist()
+        self.total = float(total)
+
+    def update(self, i, rate):
+        delta = rate - self.rates[i]
+        if delta == 0:
+            return
+        self.rates[i] = rate
+        self.total += delta
+        tree = self._tree
+        n = len(self.rates)
+        j = i + 1
+        while j <= n:
+            tree[j] += delta
+            j += j & -j
+
+    def find(self, u):
+        """ Index of the molecule whose cumulative-rate interval contains u (0 <= u < total). """
+        tree = self._tree
+        n = len(self.rates)
+        pos = 0
+        bit = self._top_bit
+        while bit:
+            nxt = pos + bit
+            if nxt <= n and tree[nxt] <= u:
+                pos = nxt
+                u -= tree[nxt]
+            bit >>= 1
+        return min(pos, n - 1)
+
+# --- Kinetic Monte Carlo Engine ---
+class KineticMonteCarloSimulation:
+    """ Rejection-free continuous-time version of the Ru/O2 quenching model.
+
+        Each O2 hops to one of its 8 lattice neighbours with rate
+        move_prob * 8/9 (the lattice walk's rate of actual displacements),
+        with move_prob from the same density profile. The next hop is drawn
+        Gillespie-style from the total rate and the molecule is picked from
+        a RateTree, so molecules that sit still in the dense core cost
+        nothing. Excitations and emissions are scheduled events on a heap,
+        on the same integer time grid as the stepper: a complex is excited
+        on each time step with probability excitation_prob. Quenching is
+        checked whenever a complex is excited or an O2 hops, so an excited
+        complex is quenched the moment an O2 comes within the quenching
+        radius; quenches thus happen (and record their remaining lifetime)
+        at continuous times.
+
+        Time t here corresponds to the stepper's state after the O2 move of
+        step t. The stepper checks an excited complex after the moves of
+        excited_lifetime steps, the first one in the step it is excited in,
+        so a complex excited at t is checked against the positions at t
+        and watched until it emits at t + excited_lifetime - 1, and is
+        excited again from the following step on. (Emitting at
+        t + excited_lifetime instead watches one step of O2 motion too
+        many, which lowers the QY by about one step's worth of quenching,
+        e.g. 0.16 instead of 0.18 for Ru1 with 40 O2 molecules.) What
+        remains different from the stepper is that O2 can make several hops
+        within one time unit, and each position visited is checked.
+
+        step() advances the clock by one time unit (one stepper step), so
+        the engine can be driven like the other engines; the number of
+        processed events is kept in events_done.
+    """
+    def __init__(self, ru_x, ru_y, ru_type, o2_x, o2_y, grid_size, core_center, core_radius,
+                 density_steepness, prob_min, prob_max, excited_lifetime, quenching_radius,
+                 excitation_prob=1.0, rng=None, recorder=None, move_table=None):
+        self.rng = rng if rng is not None else random.Random()
+        self.recorder = recorder
+        self.phase_times = defaultdict(float)  # Seconds spent per step phase
+
+        # Ru complexes
+        self.ru_x = np.asarray(ru_x, dtype=np.float64)
+        self.ru_y = np.asarray(ru_y, dtype=np.float64)
+        self.ru_type = np.asarray(ru_type)
+        n_ru = len(self.ru_x)
+        self._ru_x = self.ru_x.tolist()
+        self._ru_y = self.ru_y.tolist()
+        self._state = [GROUND] * n_ru
+        self.excited_at = [0.0] * n_ru
+        self.emission_count = [0] * n_ru
+        self.quenched_count = [0] * n_ru
+        self.total_excitations = [0] * n_ru
+        self.lifetime_stats = [lifetime_stats(excited_lifetime) for _ in range(n_ru)]
+        self.quencher_distance_stats = [distance_stats(quenching_radius) for _ in range(n_ru)]
+
+        # O2 molecules
+        self._x = [float(x) for x in o2_x]
+        self._y = [float(y) for y in o2_y]
+        n_o2 = len(self._x)
+        self.o2_quench_count = [0] * n_o2
+        self.o2_path_length = [0.0] * n_o2
+
+        # Model parameters
+        self.grid_size = grid_size
+        self.excited_lifetime = excited_lifetime
+        self.quenching_radius_sq = quenching_radius ** 2
+        self.excitation_prob = excitation_prob
+        self._log_ground = math.log1p(-excitation_prob) if 0 < excitation_prob < 1 else None
+        self.move_table = move_table if move_table is not None else get_move_table(
+            grid_size, core_center, core_radius, density_steepness, prob_min, prob_max)
+
+        # Spatial indexes: O2 molecules per cell (updated one hop at a time),
+        # and for every cell the (fixed) complexes in its 3x3 block, to find
+        # who an O2 hop can quench
+        self.cell_size = float(quenching_radius)
+        self._build_o2_cells()
+        ru_cells = CellList(grid_size, quenching_radius, self.ru_x, self.ru_y)
+        self._ru_near = {}
+        for x, y in zip(self._ru_x, self._ru_y):
+            cx, cy = int(x // self.cell_size), int(y // self.cell_size)
+            for key in ((cx + dx, cy + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)):
+                if key not in self._ru_near:
+                    self._ru_near[key] = ru_cells.candidates((key[0] + 0.5) * self.cell_size,
+                                                             (key[1] + 0.5) * self.cell_size)
+        self.rates = RateTree([self._hop_rate(x, y) for x, y in zip(self._x, self._y)])
+
+        self.time = 0.0
+        self.steps_done = 0
+        self.events_done = 0
+        self._heap = []
+        self.next_excitation = [-1.0] * n_ru
+        for i in range(n_ru):
+            self._schedule_excitation(i, self._waiting_time() - 1)
+
+    @classmethod
+    def from_objects(cls, complexes, o2_molecules, **params):
+        """ Builds the engine from lists of RutheniumComplex / OxygenMolecule objects. """
+        return cls(
+            [c.x for c in complexes], [c.y for c in complexes], [c.type for c in complexes],
+            [o.x for o in o2_molecules], [o.y for o in o2_molecules],
+            **params
+        )
+
+    # --- Array Views ---
+    @property
+    def state(self):
+        return np.array(self._state, dtype=np.int8)
+
+    @property
+    def o2_x(self):
+        return np.array(self._x)
+
+    @property
+    def o2_y(self):
+        return np.array(self._y)
+
+    # --- Events ---
+    def _cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def _build_o2_cells(self):
+        self._o2_cells = {}
+        for j, (x, y) in enumerate(zip(self._x, self._y)):
+            self._o2_cells.setdefault(self._cell(x, y), set()).add(j)
+
+    def _hop_rate(self, x, y):
+        return self.move_table.lookup(x, y) * HOP_FRACTION
+
+    def _waiting_time(self):
+        """ Number of time steps (>= 1) until a ground complex is next excited. """
+        if self._log_ground is None:
+            return 1
+        return 1 + int(math.log(1.0 - self.rng.random()) / self._log_ground)
+
+    def _schedule_excitation(self, i, when):
+        if self.excitation_prob <= 0:
+            self.next_excitation[i] = -1.0
+            return
+        self.next_excitation[i] = when
+        heapq.heappush(self._heap, (when, _EXCITE, i, 0))
+
+    def _record(self, i, kind, lifetime=0, distance=np.nan):
+        if self.recorder is not None:
+            self.recorder.set_step(int(self.time))
+            self.recorder.record_event(i, kind, lifetime, distance)
+
+    def _excite(self, i):
+        self.next_excitation[i] = -1.0
+        self._state[i] = EXCITED
+        self.excited_at[i] = self.time
+        self.total_excitations[i] += 1
+        self._record(i, EXCITED_EVENT)
+        heapq.heappush(self._heap, (self.time + self.excited_lifetime - 1, _EMIT, i, self.total_excitations[i]))
+
+        # An O2 already inside the radius quenches at once (first in molecule order)
+        x, y = self._ru_x[i], self._ru_y[i]
+        cx, cy = self._cell(x, y)
+        candidates = []
+        for key in ((cx + dx, cy + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)):
+            candidates.extend(self._o2_cells.get(key, ()))
+        for j in sorted(candidates):
+            dist_sq = (x - self._x[j])**2 + (y - self._y[j])**2
+            if dist_sq < self.quenching_radius_sq:
+                self._quench(i, j, math.sqrt(dist_sq))
+                break
+
+    def _emit(self, i):
+        self._state[i] = GROUND
+        self.lifetime_stats[i].add(0)
+        self.emission_count[i] += 1
+        self._record(i, EMITTED_EVENT, 0)
+        self._schedule_excitation(i, self.time + self._waiting_time())
+
+    def _quench(self, i, j, distance):
+        lifetime = self.excited_lifetime - (self.time - self.excited_at[i])
+        self._state[i] = GROUND
+        self.lifetime_stats[i].add(lifetime)
+        self.quencher_distance_stats[i].add(distance)
+        self.quenched_count[i] += 1
+        self.o2_quench_count[j] += 1
+        self._record(i, QUENCHED_EVENT, lifetime, distance)
+        self._schedule_excitation(i, math.ceil(self.time) + self._waiting_time())
+
+    def _hop(self):
+        """ Moves one O2, picked with probability proportional to its hop rate. """
+        rng = self.rng
+        j = self.rates.find(rng.random() * self.rates.total)
+        dx, dy = NEIGHBOURS[rng.randrange(8)]
+        old_x, old_y = self._x[j], self._y[j]
+        x = max(0, min(self.grid_size - 1, old_x + dx))
+        y = max(0, min(self.grid_size - 1, old_y + dy))
+        if x == old_x and y == old_y:
+            return
+        self._x[j], self._y[j] = x, y
+        self.o2_path_length[j] += math.sqrt((x - old_x)**2 + (y - old_y)**2)
+        old_cell, new_cell = self._cell(old_x, old_y), self._cell(x, y)
+        if new_cell != old_cell:
+            self._o2_cells[old_cell].discard(j)
+            self._o2_cells.setdefault(new_cell, set()).add(j)
+        self.rates.update(j, self._hop_rate(x, y))
+
+        # Quench every excited complex the molecule has come within range of
+        for i in self._ru_near.get(new_cell, ()):
+            if self._state[i] == EXCITED:
+                dist_sq = (self._ru_x[i] - x)**2 + (self._ru_y[i] - y)**2
+                if dist_sq < self.quenching_radius_sq:
+                    self._quench(i, j, math.sqrt(dist_sq))
+
+    def step(self):
+        """ Processes all events up to the end of the current time step. """
+        rng = self.rng
+        heap = self._heap
+        t_end = self.steps_done + 1
+        t_hop = None
+        start_time = time.perf_counter()
+        while True:
+            # Scheduled events do not change hop rates, so a drawn hop time
+            # stays valid until that hop happens
+            if t_hop is None:
+                total = self.rates.total
+                t_hop = self.time + rng.expovariate(total) if total > 0 else math.inf
+            t_event = heap[0][0] if heap else math.inf
+            if min(t_hop, t_event) >= t_end:
+                break
+            if t_hop < t_event:
+                self.time = t_hop
+                t_hop = None
+                self._hop()
+                self.events_done += 1
+                continue
+            self.time, kind, i, token = heapq.heappop(heap)
+            if kind == _EXCITE:
+                self._excite(i)
+                self.events_done += 1
+            elif self._state[i] == EXCITED and token == self.total_excitations[i]:
+                self._emit(i)
+                self.events_done += 1
+        self.time = float(t_end)
+        events_time = time.perf_counter()
+        if t_end % REBUILD_INTERVAL == 0:
+            self.rates.rebuild()
+        rebuild_time = time.perf_counter()
+        self.phase_times['events'] += events_time - start_time
+        self.phase_times['rebuild'] += rebuild_time - events_time
+        if self.recorder is not None and self.recorder.wants_positions(self.steps_done):
+            self.recorder.record_positions(self.steps_done, self._x, self._y)
+            self.phase_times['record'] += time.perf_counter() - rebuild_time
+        self.steps_done = t_end
+
+    def run(self, steps):
+        """ Advances the simulation by the given number of time steps. """
+        for _ in range(steps):
+            self.step()
+
+    # --- Checkpointing ---
+    def get_state(self):
+        """ Returns a copy of the full engine state (arrays, aggregates and RNG state). """
+        rate_tree, rate_total = self.rates.get_state()
+        return {
+            'ru_x': self.ru_x.copy(), 'ru_y': self.ru_y.copy(), 'ru_type': self.ru_type.copy(),
+            'state': self.state, 'excited_at': np.array(self.excited_at),
+            'next_excitation': np.array(self.next_excitation),
+            'emission_count': np.array(self.emission_count, dtype=np.int64),
+            'quenched_count': np.array(self.quenched_count, dtype=np.int64),
+            'total_excitations': np.array(self.total_excitations, dtype=np.int64),
+            'o2_x': self.o2_x, 'o2_y': self.o2_y,
+            'o2_quench_count': np.array(self.o2_quench_count, dtype=np.int64),
+            'o2_path_length': np.array(self.o2_path_length),
+            'lifetime_stats': np.array([s.get_state() for s in self.lifetime_stats]),
+            'distance_stats': np.array([s.get_state() for s in self.quencher_distance_stats]),
+            'rate_tree': rate_tree, 'rate_total': rate_total,
+            'steps_done': np.array(self.steps_done), 'events_done': np.array(self.events_done),
+            'rng_state': encode_json(self.rng.getstate())
+        }
+
+    def set_state(self, state):
+        """ Restores a state returned by get_state (continues bit-identically). """
+        self._state = state['state'].tolist()
+        self.excited_at = state['excited_at'].tolist()
+        self.next_excitation = state['next_excitation'].tolist()
+        self.emission_count = state['emission_count'].tolist()
+        self.quenched_count = state['quenched_count'].tolist()
+        self.total_excitations = state['total_excitations'].tolist()
+        self._x = state['o2_x'].tolist()
+        self._y = state['o2_y'].tolist()
+        self.o2_quench_count = state['o2_quench_count'].tolist()
+        self.o2_path_length = state['o2_path_length'].tolist()
+        self.lifetime_stats = [RunningStats.from_state(s) for s in state['lifetime_stats']]
+        self.quencher_distance_stats = [RunningStats.from_state(s) for s in state['distance_stats']]
+        self._build_o2_cells()
+        self.rates = RateTree([self._hop_rate(x, y) for x, y in zip(self._x, self._y)])
+        if 'rate_tree' in state:  # Older checkpoints were taken right after a rebuild
+            self.rates.set_state(state['rate_tree'], state['rate_total'])
+        self.steps_done = int(state['steps_done'])
+        self.events_done = int(state['events_done'])
+        self.time = float(self.steps_done)
+
+        # Pending events: next excitations of ground complexes, emissions of excited ones
+        self._heap = [(t, _EXCITE, i, 0) for i, t in enumerate(self.next_excitation) if t >= 0]
+        self._heap += [(self.excited_at[i] + self.excited_lifetime - 1, _EMIT, i, self.total_excitations[i])
+                       for i, s in enumerate(self._state) if s == EXCITED]
+        heapq.heapify(self._heap)
+        version, internal_state, gauss_next = decode_json(state['rng_state'])
+        self.rng.setstate((version, tuple(internal_state), gauss_next))
+
+    # --- Results ---
+    def get_type_counts(self, type):
+        """ Returns (emissions, quenched) summed over complexes of one type. """
+        mask = self.ru_type == type
+        return (int(np.array(self.emission_count)[mask].sum()),
+                int(np.array(self.quenched_count)[mask].sum()))
+
+    def get_simulated_qy(self, type):
+        """ Calculates the quantum yield of one complex type. """
+        emissions, quenched = self.get_type_counts(type)
+        total_events = emissions + quenched
+        return emissions / total_events if total_events > 0 else 0
+
+    def write_back(self, complexes, o2_molecules):
+        """ Copies the engine state back onto the objects the engine was built from. """
+        for i, c in enumerate(complexes):
+            excited = self._state[i] == EXCITED
+            c.state = 'excited' if excited else 'ground'
+            c.excited_timer = math.ceil(self.excited_lifetime - (self.time - self.excited_at[i])) if excited else 0
+            c.emission_count = self.emission_count[i]
+            c.quenched_count = self.quenched_count[i]
+            if hasattr(c, 'total_excitations'):
+                c.total_excitations = self.total_excitations[i]
+            if hasattr(c, 'lifetime_stats'):
+                c.lifetime_stats = self.lifetime_stats[i]
+                c.quencher_distance_stats = self.quencher_distance_stats[i]
+
+        for i, o2 in enumerate(o2_molecules):
+            o2.x = self._x[i]
+            o2.y = self._y[i]
+            if hasattr(o2, 'quench_count'):
+                o2.quench_count = self.o2_quench_count[i]
+            if hasattr(o2, 'path_length'):
+                o2.path_length = self.o2_path_length[i]
+
+# --- Validation ---
+def compare_engines(config, steps, seeds, engines=('object', 'kmc')):
+    """ Runs each engine on the same seeds; returns {engine: (ru1 QYs, ru2 QYs, seconds)}. """
+    from dataclasses import replace
+    from simulation_core import Simulation
+
+    results = {}
+    for engine in engines:
+        ru1_qy, ru2_qy = [], []
+        start = time.time()
+        for seed in seeds:
+            sim = Simulation(replace(config, engine=engine, seed=seed)).run(steps)
+            ru1_qy.append(sim.get_simulated_qy('Ru1'))
+            ru2_qy.append(sim.get_simulated_qy('Ru2'))
+        results[engine] = (np.array(ru1_qy), np.array(ru2_qy), time.time() - start)
+    return results
+
+def standard_error(values):
+    return values.std(ddof=1) / np.sqrt(len(values)) if len(values) > 1 else 0.0
+
+# --- Main Entry Point ---
+if __name__ == "__main__":
+    from simulation_core import SimulationConfig
+
+    parser = argparse.ArgumentParser(description='Validate the kinetic Monte Carlo engine against the stepper')
+    parser.add_argument('--steps', type=int, default=600, help='Number of simulation time steps')
+    parser.add_argument('--seeds', type=int, default=8, help='Number of seeds per engine')
+    parser.add_argument('--num-o2', type=int, default=180, help='Number of oxygen molecules')
+    parser.add_argument('--excitation-prob', type=float, default=1.0, help='Probability of excitation per time step')
+    args = parser.parse_args()
+
+    config = SimulationConfig(num_o2=args.num_o2, excitation_prob=args.excitation_prob)
+    results = compare_engines(config, args.steps, range(args.seeds))
+    for engine, (ru1_qy, ru2_qy, seconds) in results.items():
+        print(f"{engine:>8}: Ru1 QY {ru1_qy.mean():.4f} ± {standard_error(ru1_qy):.4f}, "
+              f"Ru2 QY {ru2_qy.mean():.4f} ± {standard_error(ru2_qy):.4f} ({seconds:.2f} s)")
@@ -0,0 +1,103 @@
+import functools
+
+import numpy as np
+
+# --- Defaults ---
+# Table cells per unit length. O2 positions are continuous (random start
+# offsets plus integer steps), so the table is sampled finer than the
+# unit lattice and looked up at the nearest sample point.
+DEFAULT_RESOLUTION = 4
+MOVE_TABLE_CACHE_SIZE = 32  # Parameter sets whose tables get_move_table keeps
+
+# --- Density ---
+def get_polymer_density_array(x, y, center, radius, steepness, z=None):
+    """ Vectorized get_polymer_density for arrays of coordinates (spherical profile if z is given). """
+    dist = np.hypot(x - center[0], y - center[1])
+    if z is not None:
+        dist = np.sqrt(dist ** 2 + (z - center[2]) ** 2)
+    exponent = np.clip(steepness * (dist - radius), -700, 700)
+    return 1 / (1 + np.exp(exponent))
+
+# --- Lookup Table ---
+class MoveProbabilityTable:
+    """ Precomputed O2 move probability over the grid.
+
+        The probability depends only on position and fixed model parameters,
+        so it is evaluated once on a (grid_size * resolution)^2 table instead
+        of a sqrt and an exp per molecule per step. The table array is
+        read-only, so one instance can be shared by all runs (and, after a
+        fork, by all pool workers) with the same parameters.
+    """
+    def __init__(self, grid_size, core_center, core_radius, density_steepness, prob_min, prob_max,
+                 resolution=DEFAULT_RESOLUTION):
+        self.grid_size = grid_size
+        self.resolution = resolution
+
+        # Positions stay in [0, grid_size - 1], or [0, grid_size) with periodic boundaries
+        n = int(round(grid_size * resolution)) + 1
+        coords = np.arange(n) / resolution
+        xx, yy = np.meshgrid(coords, coords, indexing='ij')
+        density = get_polymer_density_array(xx, yy, core_center, core_radius, density_steepness)
+        probs = prob_max - density * (prob_max - prob_min)
+        np.clip(probs, prob_min, prob_max, out=probs)
+        self._set_probs(probs)
+
+    @classmethod
+    def from_probs(cls, grid_size, probs, resolution=DEFAULT_RESOLUTION):
+        """ Table over an already computed probability array (e.g. one in shared memory), without copying it. """
+        table = cls.__new__(cls)
+        table.grid_size = grid_size
+        table.resolution = resolution
+        table._set_probs(probs)
+        return table
+
+    def _set_probs(self, probs):
+        probs.setflags(write=False)
+        self.probs = probs
+        self._view = memoryview(probs)  # Scalar lookups return Python floats, without copying the table
+
+    def lookup(self, x, y):
+        """ Move probability of one molecule at (x, y). """
+        r = self.resolution
+        return self._view[int(x * r + 0.5), int(y * r + 0.5)]
+
+    def lookup_array(self, x, y):
+        """ Move probabilities for arrays of coordinates. """
+        r = self.resolution
+        return self.probs[(x * r + 0.5).astype(np.intp), (y * r + 0.5).astype(np.intp)]
+
+class RadialMoveTable:
+    """ O2 move probability of a spherical (3D) particle, tabulated over the distance from the centre.
+
+        The density profile is radial, so a 1D table of
+        (corner distance * resolution) samples replaces a full 3D table,
+        which would not fit in memory for large lattices (a 256^3 grid
+        sampled 4x finer needs 10^9 entries). A lookup costs one sqrt per
+        molecule.
+    """
+    def __init__(self, grid_size, core_center, core_radius, density_steepness, prob_min, prob_max,
+                 resolution=DEFAULT_RESOLUTION):
+        self.grid_size = grid_size
+        self.resolution = resolution
+        self.core_center = core_center
+        max_distance = np.sqrt(len(core_center)) * grid_size
+        distances = np.arange(int(np.ceil(max_distance * resolution)) + 2) / resolution
+        density = 1 / (1 + np.exp(np.clip(density_steepness * (distances - core_radius), -700, 700)))
+        probs = prob_max - density * (prob_max - prob_min)
+        np.clip(probs, prob_min, prob_max, out=probs)
+        probs.setflags(write=False)
+        self.probs = probs
+
+    def lookup_array(self, x, y, z):
+        """ Move probabilities for arrays of coordinates. """
+        cx, cy, cz = self.core_center
+        dist = np.sqrt((x - cx) ** 2 + (y - cy) ** 2 + (z - cz) ** 2)
+        return self.probs[(dist * self.resolution + 0.5).astype(np.intp)]
+
+@functools.lru_cache(maxsize=MOVE_TABLE_CACHE_SIZE)
+def get_move_table(grid_size, core_center, core_radius, density_steepness, prob_min, prob_max,
+                   resolution=DEFAULT_RESOLUTION):
+    """ Returns the (cached) move table for one parameter set: radial for a 3D core_center, else 2D. """
+    table_class = RadialMoveTable if len(core_center) == 3 else MoveProbabilityTable
+    return table_class(grid_size, tuple(core_center), core_radius, density_steepness,
+                       prob_min, prob_max, resolution)
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import time
+
+# --- Defaults ---
+DEFAULT_CACHE_DIR = '.sim_cache'
+DEFAULT_MAX_MB = 512
+DEFAULT_MAX_AGE_DAYS = 30
+
+# Modules whose code determines the result of a run (the model, its engines and their helpers);
+# the drivers are left out so that editing their output or plotting code keeps the cache valid
+MODEL_MODULES = ('simulation_core', 'event_scheduler', 'kmc_engine', 'vectorized_engine', 'decomposed_engine',
+                 'boundaries', 'cell_list', 'move_table', 'running_stats', 'checkpoint', 'stream_recorder',
+                 'seeding', 'ensemble')
+
+# --- Helper Functions ---
+def source_version(*paths):
+    """ Hashes the given source files; any edit to the model code changes the version. """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def model_version():
+    """ source_version of the MODEL_MODULES (next to this file); part of every cache key. """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return source_version(*(os.path.join(directory, f"{name}.py") for name in MODEL_MODULES))
+
+def add_cache_arguments(parser):
+    """ Adds the shared cache options to an argparse parser. """
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help='Directory for cached run results')
+    parser.add_argument('--no-cache', action='store_true', help='Recompute every run and do not touch the cache')
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_MAX_MB, help='Evict oldest entries beyond this size')
+    parser.add_argument('--cache-max-age-days', type=float, default=DEFAULT_MAX_AGE_DAYS, help='Evict entries not used for this long')
+
+def cache_from_args(args):
+    """ Builds a ResultCache from parsed cache options (None if --no-cache or no --seed). """
+    if args.no_cache:
+        return None
+    if args.seed is None:
+        # A fresh seed never matches a cached entry, so caching would only fill the directory
+        print("Warning: no --seed given, results are not cached (pass --seed to reuse them)")
+        return None
+    return ResultCache(args.cache_dir, args.cache_max_mb, args.cache_max_age_days)
+
+# --- Cache ---
+class ResultCache:
+    """ Content-addressed on-disk cache of per-run simulation results.
+
+        Entries are keyed by a hash of (full parameter set, seed, code
+        version) and stored one JSON file per run. Reading an entry refreshes
+        its modification time, so evict() drops the least recently used
+        entries first once the directory exceeds max_mb, and any entry unused
+        for more than max_age_days.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_mb=DEFAULT_MAX_MB, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, params, seed, code_version):
+        """ Returns the hex key for one run. """
+        key_data = json.dumps({'params': params, 'seed': seed, 'code_version': code_version},
+                              sort_keys=True, default=str)
+        return hashlib.sha256(key_data.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """ Returns the cached result for key, or None on a miss. """
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        os.utime(path)  # Mark as recently used
+        self.hits += 1
+        return entry['result']
+
+    def put(self, key, result):
+        """ Stores a result atomically (write to a temp file, then rename). """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'created': time.time(), 'result': result}, f)
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """ Removes expired entries, then the least recently used until under the size limit. """
+        now = time.time()
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        removed = 0
+        kept = []
+        for mtime, size, path in entries:
+            if now - mtime > self.max_age:
+                removed += self._remove(path)
+            else:
+                kept.append((mtime, size, path))
+
+        total = sum(size for _, size, _ in kept)
+        for mtime, size, path in sorted(kept):
+            if total <= self.max_bytes:
+                break
+            removed += self._remove(path)
+            total -= size
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
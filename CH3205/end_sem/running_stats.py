@@ -0,0 +1,180 @@
+import numpy as np
+
+# --- Defaults ---
+DISTANCE_BINS = 20
+
+# Fixed-size state vector layout: count, mean, M2, min, max, low, high, histogram...
+_HEADER = 7
+
+# --- Running Statistics ---
+class RunningStats:
+    """ Online mean / variance / min / max and fixed-bin histogram of a stream of values.
+
+        Uses Welford's update, so adding a value is O(1) and memory does not
+        grow with the number of values. Two accumulators with the same bins
+        can be merged (Chan et al. parallel update), e.g. per-complex stats
+        into a population, or results from parallel workers. Values outside
+        [low, high) are counted in the first / last bin.
+    """
+    def __init__(self, low, high, bins):
+        self.low = float(low)
+        self.high = float(high)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.histogram = np.zeros(bins, dtype=np.int64)
+
+    def _bin(self, value):
+        bins = len(self.histogram)
+        index = int((value - self.low) / (self.high - self.low) * bins)
+        return min(bins - 1, max(0, index))
+
+    def add(self, value):
+        """ Adds one value. """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.histogram[self._bin(value)] += 1
+
+    def merge(self, other):
+        """ Adds all values accumulated by another RunningStats with the same bins. """
+        if (self.low, self.high, len(self.histogram)) != (other.low, other.high, len(other.histogram)):
+            raise ValueError("Cannot merge RunningStats with different histogram bins")
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.histogram += other.histogram
+        return self
+
+    @property
+    def variance(self):
+        """ Sample variance (0 for fewer than two values). """
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.variance))
+
+    def bin_edges(self):
+        return np.linspace(self.low, self.high, len(self.histogram) + 1)
+
+    def to_dict(self):
+        """ Summary for JSON output. """
+        return {
+            'count': self.count,
+            'mean': self.mean if self.count else None,
+            'std': self.std if self.count else None,
+            'min': float(self.min) if self.count else None,
+            'max': float(self.max) if self.count else None
+        }
+
+    # --- Serialization ---
+    def get_state(self):
+        """ Returns the accumulator as one float array (for checkpoints / worker results). """
+        return np.concatenate([[self.count, self.mean, self.m2, self.min, self.max, self.low, self.high],
+                               self.histogram])
+
+    @classmethod
+    def from_state(cls, state):
+        stats = cls(state[5], state[6], len(state) - _HEADER)
+        stats.count = int(state[0])
+        stats.mean, stats.m2, stats.min, stats.max = (float(v) for v in state[1:5])
+        stats.histogram = np.asarray(state[_HEADER:]).astype(np.int64)
+        return stats
+
+class RunningStatsArray:
+    """ One RunningStats per element (e.g. per complex), stored as NumPy arrays.
+
+        add() takes arrays of element indices and values and updates all of
+        them at once; each index may appear at most once per call.
+    """
+    def __init__(self, n, low, high, bins):
+        self.low = float(low)
+        self.high = float(high)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.mean = np.zeros(n)
+        self.m2 = np.zeros(n)
+        self.min = np.full(n, np.inf)
+        self.max = np.full(n, -np.inf)
+        self.histogram = np.zeros((n, bins), dtype=np.int64)
+
+    def add(self, indices, values):
+        """ Adds values[k] to element indices[k] (indices must be unique). """
+        if len(indices) == 0:
+            return
+        values = np.asarray(values, dtype=np.float64)
+        self.count[indices] += 1
+        delta = values - self.mean[indices]
+        self.mean[indices] += delta / self.count[indices]
+        self.m2[indices] += delta * (values - self.mean[indices])
+        self.min[indices] = np.minimum(self.min[indices], values)
+        self.max[indices] = np.maximum(self.max[indices], values)
+        bins = self.histogram.shape[1]
+        bin_index = ((values - self.low) / (self.high - self.low) * bins).astype(np.int64)
+        self.histogram[indices, np.clip(bin_index, 0, bins - 1)] += 1
+
+    def __len__(self):
+        return len(self.count)
+
+    def __getitem__(self, i):
+        """ Returns element i as a RunningStats. """
+        return RunningStats.from_state(np.concatenate([
+            [self.count[i], self.mean[i], self.m2[i], self.min[i], self.max[i], self.low, self.high],
+            self.histogram[i]]))
+
+    def merged(self, mask=None):
+        """ Merges the selected elements (all if mask is None) into one RunningStats. """
+        indices = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        total = RunningStats(self.low, self.high, self.histogram.shape[1])
+        for i in indices.tolist():
+            total.merge(self[i])
+        return total
+
+    # --- Serialization ---
+    def get_state(self):
+        """ Returns an (n, 7 + bins) array, one RunningStats state per row. """
+        n = len(self)
+        return np.column_stack([self.count, self.mean, self.m2, self.min, self.max,
+                                np.full(n, self.low), np.full(n, self.high), self.histogram])
+
+    @classmethod
+    def from_state(cls, state):
+        n, width = state.shape
+        stats = cls(n, state[0, 5] if n else 0, state[0, 6] if n else 1, width - _HEADER)
+        stats.count = state[:, 0].astype(np.int64)
+        stats.mean = state[:, 1].copy()
+        stats.m2 = state[:, 2].copy()
+        stats.min = state[:, 3].copy()
+        stats.max = state[:, 4].copy()
+        stats.histogram = state[:, _HEADER:].astype(np.int64)
+        return stats
+
+# --- Helper Functions ---
+def lifetime_stats(max_lifetime):
+    """ RunningStats for excited-state durations (one bin per time step, 0..max_lifetime). """
+    return RunningStats(0, max_lifetime + 1, max_lifetime + 1)
+
+def distance_stats(quenching_radius):
+    """ RunningStats for quencher distances (0..quenching_radius). """
+    return RunningStats(0, quenching_radius, DISTANCE_BINS)
+
+def merge_stats(stats_list):
+    """ Merges a non-empty list of RunningStats into a new accumulator. """
+    first = stats_list[0]
+    total = RunningStats(first.low, first.high, len(first.histogram))
+    for stats in stats_list:
+        total.merge(stats)
+    return total
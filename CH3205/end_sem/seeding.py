@@ -0,0 +1,22 @@
+import hashlib
+import json
+
+import numpy as np
+
+# --- Seeding Helpers ---
+def resolve_seed(seed):
+    """ Returns the given seed, or fresh OS entropy if it is None (print it to reproduce the run). """
+    return seed if seed is not None else int(np.random.SeedSequence().entropy)
+
+def seed_for_params(base_seed, params):
+    """ Derives an independent child seed for one sweep point from a base seed.
+
+        The child is spawned with a key taken from a hash of the point's
+        parameters, so it depends only on the base seed and the parameter
+        values - not on the run's position in the sweep or on which worker
+        runs it. Adding values to a sweep leaves existing points' seeds (and
+        their cached results) unchanged.
+    """
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).digest()
+    spawn_key = tuple(int.from_bytes(digest[i:i + 4], 'little') for i in range(0, 16, 4))
+    return int(np.random.SeedSequence(base_seed, spawn_key=spawn_key).generate_state(1)[0])
@@ -1,7 +1,10 @@
 import numpy as np
 import random
 import time
-import math
+import argparse
+
+from seeding import resolve_seed
+from simulation_core import Simulation, SimulationConfig, get_polymer_density
 
 # Optional: Import matplotlib for visualization if available
 try:
@@ -34,118 +37,6 @@ DENSITY_STEEPNESS = 0.3 # Controls how quickly density falls off around CORE_RAD
 ANIMATION_INTERVAL = 50 # Milliseconds between animation frames
 FRAMES_TO_SKIP = 1      # Update visualization every N frames (1 = update every frame)
 
-# --- Classes ---
-class RutheniumComplex:
-    """ Represents a Ruthenium complex molecule. (Unchanged from previous version) """
-    def __init__(self, x, y, type):
-        self.x = x
-        self.y = y
-        self.type = type # 'Ru1' (surface) or 'Ru2' (core)
-        self.state = 'ground' # 'ground' or 'excited'
-        self.excited_timer = 0
-        self.emission_count = 0
-        self.quenched_count = 0
-        self.total_excitations = 0
-
-    def excite(self):
-        if self.state == 'ground':
-            self.state = 'excited'
-            self.excited_timer = EXCITED_LIFETIME
-            self.total_excitations += 1
-
-    def step(self):
-        if self.state == 'excited':
-            self.excited_timer -= 1
-            if self.excited_timer <= 0:
-                self.emit()
-
-    def quench(self):
-        if self.state == 'excited':
-            self.state = 'ground'
-            self.excited_timer = 0
-            self.quenched_count += 1
-
-    def emit(self):
-        if self.state == 'excited':
-            self.state = 'ground'
-            self.excited_timer = 0
-            self.emission_count += 1
-
-    def get_simulated_qy(self):
-        total_events = self.emission_count + self.quenched_count
-        return self.emission_count / total_events if total_events > 0 else 0
-
-class OxygenMolecule:
-    """ Represents an Oxygen molecule (quencher). """
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-
-    def move(self, grid_size, core_center, core_radius):
-        """ Moves the oxygen molecule randomly, hindered by polymer density. """
-        # Calculate density based on distance from core center
-        density = get_polymer_density(self.x, self.y, core_center, core_radius, DENSITY_STEEPNESS)
-
-        # Calculate movement probability based on density
-        # Probability decreases linearly from MAX to MIN as density goes from 0 to 1
-        move_prob = O2_MOVE_PROB_MAX - density * (O2_MOVE_PROB_MAX - O2_MOVE_PROB_MIN)
-        move_prob = max(O2_MOVE_PROB_MIN, min(O2_MOVE_PROB_MAX, move_prob)) # Clamp probability
-
-        if random.random() < move_prob:
-            # Move one step in a random direction (including staying put)
-            dx = random.choice([-1, 0, 1])
-            dy = random.choice([-1, 0, 1])
-
-            # Apply boundary conditions (stay within grid)
-            new_x = max(0, min(grid_size - 1, self.x + dx))
-            new_y = max(0, min(grid_size - 1, self.y + dy))
-            self.x = new_x
-            self.y = new_y
-
-
-# --- Helper Functions ---
-def get_polymer_density(x, y, center, radius, steepness):
-    """ Calculates a simulated polymer density based on distance from the center.
-        Uses a sigmoid-like function for a smooth falloff.
-        Density approaches 1 deep in the core and 0 far away.
-    """
-    dist = math.sqrt((x - center[0])**2 + (y - center[1])**2)
-    # Sigmoid function centered around 'radius'
-    density = 1 / (1 + math.exp(steepness * (dist - radius)))
-    return density
-
-def is_in_core_region(x, y, center, radius):
-    """ Checks if coordinates (x, y) are within the nominal core radius (for placement). """
-    # Use a simple radius check for initial placement purposes
-    return (x - center[0])**2 + (y - center[1])**2 < radius**2
-
-def place_complexes(num, type, grid_size, core_center, core_radius):
-    """ Places Ru complexes either in the core region or near the surface region. """
-    complexes = []
-    attempts = 0
-    max_attempts = num * 300 # Increase attempts for potentially trickier placement
-
-    surface_outer_radius = core_radius + SURFACE_THICKNESS
-
-    while len(complexes) < num and attempts < max_attempts:
-        attempts += 1
-        x = random.uniform(0, grid_size - 1)
-        y = random.uniform(0, grid_size - 1)
-        in_core_flag = is_in_core_region(x, y, core_center, core_radius)
-        dist_from_center = math.sqrt((x - core_center[0])**2 + (y - core_center[1])**2)
-
-        # Place Ru1 (Surface): Must be OUTSIDE core radius but WITHIN surface thickness boundary
-        if type == 'Ru1' and not in_core_flag and dist_from_center < surface_outer_radius:
-            complexes.append(RutheniumComplex(x, y, type))
-
-        # Place Ru2 (Core): Must be INSIDE core radius
-        elif type == 'Ru2' and in_core_flag:
-            complexes.append(RutheniumComplex(x, y, type))
-
-    if len(complexes) < num:
-        print(f"Warning: Could only place {len(complexes)} of {num} desired {type} complexes. Try adjusting parameters.")
-    return complexes
-
 # --- Visualization Setup ---
 fig, ax = None, None
 ru1_scatter, ru2_scatter, o2_scatter = None, None, None
@@ -190,34 +81,16 @@ def setup_visualization(grid_size, core_center, core_radius):
     return fig, ax
 
 # --- Animation Update Function ---
-def update_frame(frame, ru1_complexes, ru2_complexes, o2_molecules, grid_size, core_center, core_radius, steps_per_frame):
+def update_frame(frame, sim, steps_per_frame):
     """ Updates the simulation state and plot for each animation frame. """
     global ru1_scatter, ru2_scatter, o2_scatter, ax
 
     # Run multiple simulation steps per frame for smoother animation feel
     for _ in range(steps_per_frame):
-        # 1. Excite complexes (optional: could be probabilistic)
-        for ru in ru1_complexes + ru2_complexes:
-            ru.excite() # Simple continuous excitation
-
-        # 2. Move Oxygen
-        for o2 in o2_molecules:
-            o2.move(grid_size, core_center, core_radius)
-
-        # 3. Check for Quenching
-        for ru in ru1_complexes + ru2_complexes:
-            if ru.state == 'excited':
-                for o2 in o2_molecules:
-                    dist_sq = (ru.x - o2.x)**2 + (ru.y - o2.y)**2
-                    if dist_sq < QUENCHING_RADIUS_SQ:
-                        ru.quench()
-                        break # Quenched
-
-        # 4. Ru complexes evolve (timer/emission)
-        for ru in ru1_complexes + ru2_complexes:
-            ru.step()
+        sim.step()
 
     # --- Update Visualization Data ---
+    ru1_complexes, ru2_complexes, o2_molecules = sim.ru1_complexes, sim.ru2_complexes, sim.o2_molecules
     # Ru(1) - orangered (excited) / darkred (ground)
     ru1_pos = np.array([[c.x, c.y] for c in ru1_complexes]) if ru1_complexes else np.empty((0, 2))
     ru1_colors = ['orangered' if c.state == 'excited' else 'darkred' for c in ru1_complexes]
@@ -241,30 +114,30 @@ def update_frame(frame, ru1_complexes, ru2_complexes, o2_molecules, grid_size, c
 
 # --- Main Simulation ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Enhanced Ruthenium Polymer Simulation')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed (random if omitted)')
+    cli_args = parser.parse_args()
+    seed = resolve_seed(cli_args.seed)
+    rng = random.Random(seed)
+
     start_time = time.time()
 
     # --- Simulation Setup ---
     core_center = (GRID_SIZE / 2, GRID_SIZE / 2)
+    config = SimulationConfig(
+        grid_size=GRID_SIZE, core_radius=CORE_RADIUS, surface_thickness=SURFACE_THICKNESS,
+        num_ru1=NUM_RU1, num_ru2=NUM_RU2, num_o2=NUM_O2, excited_lifetime=EXCITED_LIFETIME,
+        quenching_radius=QUENCHING_RADIUS, o2_prob_max=O2_MOVE_PROB_MAX, o2_prob_min=O2_MOVE_PROB_MIN,
+        density_steepness=DENSITY_STEEPNESS,
+        o2_placement='outside_core' # Ensure O2 starts in lower density region initially
+    )
 
     print("Setting up enhanced simulation...")
-    # Place Ru complexes
-    ru1_complexes = place_complexes(NUM_RU1, 'Ru1', GRID_SIZE, core_center, CORE_RADIUS)
-    ru2_complexes = place_complexes(NUM_RU2, 'Ru2', GRID_SIZE, core_center, CORE_RADIUS)
+    print(f"Random seed: {seed}")
+    # Place Ru complexes and O2 molecules (start them outside the core region)
+    sim = Simulation(config, rng)
+    ru1_complexes, ru2_complexes, o2_molecules = sim.ru1_complexes, sim.ru2_complexes, sim.o2_molecules
     print(f"Placed {len(ru1_complexes)} Ru(1) and {len(ru2_complexes)} Ru(2) complexes.")
-
-    # Place O2 molecules (start them outside the core region)
-    o2_molecules = []
-    attempts = 0
-    max_attempts = NUM_O2 * 100
-    while len(o2_molecules) < NUM_O2 and attempts < max_attempts:
-        attempts += 1
-        x = random.uniform(0, GRID_SIZE - 1)
-        y = random.uniform(0, GRID_SIZE - 1)
-        # Ensure O2 starts in lower density region initially
-        if get_polymer_density(x, y, core_center, CORE_RADIUS, DENSITY_STEEPNESS) < 0.3:
-             o2_molecules.append(OxygenMolecule(x, y))
-    if len(o2_molecules) < NUM_O2:
-         print(f"Warning: Could only place {len(o2_molecules)} of {NUM_O2} O2 molecules initially.")
     print(f"Placed {len(o2_molecules)} O2 molecules.")
 
     # --- Run Simulation ---
@@ -276,8 +149,7 @@ if __name__ == "__main__":
         num_frames = SIMULATION_STEPS // FRAMES_TO_SKIP
         # Create animation
         ani = animation.FuncAnimation(fig, update_frame, frames=num_frames,
-                                      fargs=(ru1_complexes, ru2_complexes, o2_molecules,
-                                             GRID_SIZE, core_center, CORE_RADIUS, FRAMES_TO_SKIP),
+                                      fargs=(sim, FRAMES_TO_SKIP),
                                       interval=ANIMATION_INTERVAL, blit=False, repeat=False) # blit=False often more reliable
         plt.show() # Display the animation window
 
@@ -291,20 +163,7 @@ if __name__ == "__main__":
         # Run simulation without visualization
         print(f"\n--- Running Simulation ({SIMULATION_STEPS} steps) without visualization ---")
         for step in range(SIMULATION_STEPS):
-            # 1. Excite
-            for ru in ru1_complexes + ru2_complexes: ru.excite()
-            # 2. Move O2
-            for o2 in o2_molecules: o2.move(GRID_SIZE, core_center, CORE_RADIUS)
-            # 3. Quench
-            for ru in ru1_complexes + ru2_complexes:
-                if ru.state == 'excited':
-                    for o2 in o2_molecules:
-                        dist_sq = (ru.x - o2.x)**2 + (ru.y - o2.y)**2
-                        if dist_sq < QUENCHING_RADIUS_SQ:
-                            ru.quench()
-                            break
-            # 4. Evolve Ru
-            for ru in ru1_complexes + ru2_complexes: ru.step()
+            sim.step()
             # Print progress
             if step % 100 == 0 or step == SIMULATION_STEPS - 1:
                  print(f"  Step {step+1}/{SIMULATION_STEPS} completed...")
@@ -1,12 +1,21 @@
 import numpy as np
-import random
 import time
-import math
 import argparse
 from datetime import datetime
 import json
 import os
 
+from batch_render import FrameSnapshots, render_video
+from boundaries import BOUNDARIES
+from checkpoint import CheckpointWriter, decode_json, encode_json, load_checkpoint
+from running_stats import RunningStats, merge_stats
+from seeding import resolve_seed
+from simulation_core import (ENGINES, WALKS, ComplexType, Observer, ProgressObserver, RutheniumComplex, Simulation,
+                             SimulationConfig, get_polymer_density, get_qy)
+from stream_recorder import StreamRecorder
+from telemetry import JsonLinesSink, TelemetryObserver, frame_time_summary
+from trajectory_store import SUMMARY_KEYS, TrajectoryReader, TrajectoryWriter
+
 # Optional: Import matplotlib for visualization
 try:
     import matplotlib.pyplot as plt
@@ -40,205 +49,77 @@ def parse_arguments():
     parser.add_argument('--o2-prob-min', type=float, default=0.10, help='Minimum O2 movement probability')
     parser.add_argument('--density-steepness', type=float, default=0.3, help='Steepness of density gradient')
     parser.add_argument('--excitation-prob', type=float, default=1.0, help='Probability of excitation per time step')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed (random if omitted)')
+    parser.add_argument('--engine', choices=ENGINES, default='object',
+                        help='Step engine (vectorized: NumPy arrays, event: queued excitations / emissions, kmc: kinetic Monte Carlo, '
+                             'decomposed: NumPy arrays split into strips stepped in parallel)')
+    parser.add_argument('--tiles', type=int, default=1, help='Worker processes (grid strips) of the decomposed engine')
+    parser.add_argument('--dimensions', type=int, choices=(2, 3), default=2,
+                        help='2: disk-shaped particle, 3: spherical particle on a cubic lattice (vectorized engine; plots show the x/y projection)')
+    parser.add_argument('--walk', choices=WALKS, default='moore',
+                        help='O2 lattice walk (moore: 8/26 neighbours, axial: 4/6 neighbours; axial needs the vectorized engine)')
+    parser.add_argument('--boundary', choices=BOUNDARIES, default='clamp',
+                        help='O2 boundary condition (clamp: stick to the wall, reflect, periodic, absorbing: exchange '
+                             'with a reservoir); object, event and vectorized engines')
     
     # Visualization/run options
     parser.add_argument('--visualize', action='store_true', help='Enable visualization')
     parser.add_argument('--no-vis', action='store_false', dest='visualize', help='Disable visualization')
     parser.add_argument('--animation-interval', type=int, default=50, help='Animation interval in milliseconds')
     parser.add_argument('--frames-to-skip', type=int, default=1, help='Frames to skip in animation')
-    parser.add_argument('--save-animation', action='store_true', help='Save animation to file')
+    parser.add_argument('--save-animation', action='store_true',
+                        help='Simulate headless, then render the saved frames to an MP4')
+    parser.add_argument('--render-workers', type=int, default=None,
+                        help='Processes used to render the animation (default: all cores)')
     parser.add_argument('--save-path', type=str, default='simulation_results', help='Path to save results')
     parser.add_argument('--save-data', action='store_true', help='Save simulation data to file')
     parser.add_argument('--high-res', action='store_true', help='Use high resolution for visualization')
     
+    # Checkpoint/restart options (headless runs)
+    parser.add_argument('--checkpoint-every', type=int, default=0, help='Write a checkpoint every N steps (0 = never)')
+    parser.add_argument('--checkpoint-path', type=str, default=None,
+                        help='Checkpoint file (default: <save-path>/checkpoint.npz)')
+    parser.add_argument('--resume', action='store_true', help='Resume from the checkpoint file')
+    
+    # Streaming event/trajectory recording
+    parser.add_argument('--record-dir', type=str, default=None,
+                        help='Stream events and O2 trajectories to chunked files in this directory')
+    parser.add_argument('--record-stride', type=int, default=10, help='Record O2 positions every N steps')
+    parser.add_argument('--trajectory', type=str, default=None,
+                        help='Write O2 positions and complex states every --trajectory-stride steps to this '
+                             'memory-mapped trajectory file')
+    parser.add_argument('--trajectory-stride', type=int, default=10, help='Steps between trajectory frames')
+    parser.add_argument('--analyze', type=str, default=None, metavar='TRAJECTORY',
+                        help='Do not simulate: redo the final analysis from a trajectory file (out-of-core)')
+    
+    # Telemetry
+    parser.add_argument('--telemetry', type=str, default=None,
+                        help="Write JSON-lines telemetry to a file, '-' (stdout), tcp://host:port or udp://host:port")
+    parser.add_argument('--telemetry-every', type=int, default=None,
+                        help='Telemetry record every N steps (default: 100 records per run)')
+    
     parser.set_defaults(visualize=True)
     return parser.parse_args()
 
-# --- Classes ---
-class RutheniumComplex:
-    """ Represents a Ruthenium complex molecule with enhanced tracking capabilities """
-    def __init__(self, x, y, type):
-        self.x = x
-        self.y = y
-        self.type = type  # 'Ru1' (surface) or 'Ru2' (core)
-        self.state = 'ground'  # 'ground' or 'excited'
-        self.excited_timer = 0
-        self.emission_count = 0
-        self.quenched_count = 0
-        self.total_excitations = 0
-        
-        # Enhanced tracking
-        self.lifetime_history = []  # Track excited state durations
-        self.quencher_distances = []  # Track distances to quenchers when quenched
-        self.position_history = []  # Optional: track positions over time
-        
-    def excite(self, excitation_prob=1.0, lifetime=30):
-        """Excite the complex with given probability and lifetime"""
-        if self.state == 'ground' and random.random() < excitation_prob:
-            self.state = 'excited'
-            self.excited_timer = lifetime
-            self.total_excitations += 1
-            # Record initial position when excited
-            self.position_history.append((self.x, self.y))
-
-    def step(self):
-        """Update the complex state for one time step"""
-        if self.state == 'excited':
-            self.excited_timer -= 1
-            if self.excited_timer <= 0:
-                self.emit()
-
-    def quench(self, quencher_distance=None):
-        """Quench the complex and record quenching event data"""
-        if self.state == 'excited':
-            # Calculate lifetime that was achieved before quenching
-            achieved_lifetime = self.excited_timer
-            self.lifetime_history.append(achieved_lifetime)
-            
-            # Record quencher distance if provided
-            if quencher_distance is not None:
-                self.quencher_distances.append(quencher_distance)
-                
-            # Reset state
-            self.state = 'ground'
-            self.excited_timer = 0
-            self.quenched_count += 1
-
-    def emit(self):
-        """Emit light and record emission event"""
-        if self.state == 'excited':
-            # Calculate full lifetime that was achieved
-            achieved_lifetime = self.excited_timer
-            self.lifetime_history.append(achieved_lifetime)
-            
-            # Reset state
-            self.state = 'ground'
-            self.excited_timer = 0
-            self.emission_count += 1
-
-    def get_simulated_qy(self):
-        """Calculate quantum yield from recorded events"""
-        total_events = self.emission_count + self.quenched_count
-        return self.emission_count / total_events if total_events > 0 else 0
-    
-    def get_average_lifetime(self):
-        """Calculate average excited state lifetime across all events"""
-        return sum(self.lifetime_history) / len(self.lifetime_history) if self.lifetime_history else 0
-    
-    def get_lifetime_distribution(self):
-        """Return histogram data for lifetime distribution"""
-        return self.lifetime_history
-    
-    def to_dict(self):
-        """Convert complex data to dictionary for serialization"""
-        return {
-            'type': self.type,
-            'position': (self.x, self.y),
-            'emissions': self.emission_count,
-            'quenched': self.quenched_count,
-            'total_excitations': self.total_excitations,
-            'avg_lifetime': self.get_average_lifetime(),
-            'quantum_yield': self.get_simulated_qy()
-        }
-
-class OxygenMolecule:
-    """ Represents an Oxygen molecule (quencher) with enhanced tracking. """
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.quench_count = 0
-        self.path_length = 0
-        self.position_history = []  # Optional: track positions over time
-        
-    def move(self, grid_size, core_center, core_radius, density_steepness, prob_min, prob_max):
-        """ Moves the oxygen molecule with density-dependent probability. """
-        # Store previous position
-        prev_x, prev_y = self.x, self.y
-        
-        # Calculate density and movement probability
-        density = get_polymer_density(self.x, self.y, core_center, core_radius, density_steepness)
-        move_prob = prob_max - density * (prob_max - prob_min)
-        move_prob = max(prob_min, min(prob_max, move_prob))  # Clamp probability
-
-        if random.random() < move_prob:
-            # Move one step in a random direction
-            dx = random.choice([-1, 0, 1])
-            dy = random.choice([-1, 0, 1])
-
-            # Apply boundary conditions (stay within grid)
-            new_x = max(0, min(grid_size - 1, self.x + dx))
-            new_y = max(0, min(grid_size - 1, self.y + dy))
-            self.x, self.y = new_x, new_y
-            
-            # Calculate distance moved
-            dist_moved = math.sqrt((new_x - prev_x)**2 + (new_y - prev_y)**2)
-            self.path_length += dist_moved
-            
-            # Optionally record position
-            self.position_history.append((self.x, self.y))
-    
-    def record_quench(self):
-        """Record a quenching event by this O2 molecule"""
-        self.quench_count += 1
-    
-    def get_average_velocity(self, time_steps):
-        """Calculate average velocity over simulation"""
-        return self.path_length / time_steps if time_steps > 0 else 0
-    
-    def to_dict(self):
-        """Convert O2 data to dictionary for serialization"""
-        return {
-            'position': (self.x, self.y),
-            'quench_count': self.quench_count,
-            'path_length': self.path_length
-        }
-
 # --- Helper Functions ---
-def get_polymer_density(x, y, center, radius, steepness):
-    """ Calculates polymer density using a sigmoid-like function. """
-    dist = math.sqrt((x - center[0])**2 + (y - center[1])**2)
-    # Sigmoid function centered around 'radius'
-    # Using a safe approach to prevent potential overflow
-    exponent = steepness * (dist - radius)
-    # Clamp exponent to prevent overflow/underflow
-    exponent = max(-700, min(700, exponent))
-    try:
-        density = 1 / (1 + math.exp(exponent))
-    except OverflowError:
-        # If exponent too large, density is effectively 0
-        density = 0.0
-    return density
-
-def is_in_core_region(x, y, center, radius):
-    """ Checks if coordinates are within the core radius. """
-    return (x - center[0])**2 + (y - center[1])**2 < radius**2
-
-def place_complexes(num, type, grid_size, core_center, core_radius, surface_thickness):
-    """ Places Ru complexes in appropriate regions. """
-    complexes = []
-    attempts = 0
-    max_attempts = num * 300
-    surface_outer_radius = core_radius + surface_thickness
+def get_population_stats(complexes, name):
+    """ Merges one RunningStats attribute over a population of complexes (None if empty). """
+    return merge_stats([getattr(c, name) for c in complexes]) if complexes else None
 
-    while len(complexes) < num and attempts < max_attempts:
-        attempts += 1
-        x = random.uniform(0, grid_size - 1)
-        y = random.uniform(0, grid_size - 1)
-        in_core_flag = is_in_core_region(x, y, core_center, core_radius)
-        dist_from_center = math.sqrt((x - core_center[0])**2 + (y - core_center[1])**2)
+def calculate_o2_distribution(o2_molecules, grid_size, n_bins=10, frames=slice(-1, None)):
+    """Calculate the spatial distribution of O2 molecules
 
-        if type == 'Ru1' and not in_core_flag and dist_from_center < surface_outer_radius:
-            complexes.append(RutheniumComplex(x, y, type))
-        elif type == 'Ru2' and in_core_flag:
-            complexes.append(RutheniumComplex(x, y, type))
-
-    if len(complexes) < num:
-        print(f"Warning: Could only place {len(complexes)} of {num} desired {type} complexes.")
-    return complexes
-
-def calculate_o2_distribution(o2_molecules, grid_size, n_bins=10):
-    """Calculate the spatial distribution of O2 molecules"""
+    o2_molecules may also be a TrajectoryReader: the histogram is then
+    summed over the selected frames (default: the last one), reading one
+    block of frames at a time, so it runs out-of-core.
+    """
     bin_edges = np.linspace(0, grid_size, n_bins+1)
+    if isinstance(o2_molecules, TrajectoryReader):
+        H = np.zeros((n_bins, n_bins))
+        for block in o2_molecules.iter_frames(frames):
+            H += np.histogram2d(block['o2'][:, 0].ravel(), block['o2'][:, 1].ravel(),
+                                bins=[bin_edges, bin_edges])[0]
+        return H, bin_edges, bin_edges
     o2_positions = np.array([(o2.x, o2.y) for o2 in o2_molecules])
     
     # Create 2D histogram
@@ -335,130 +216,88 @@ def setup_visualization(grid_size, core_center, core_radius, surface_thickness,
     plt.tight_layout()
     return fig, (ax_main, ax_stats_ru1, ax_stats_ru2), (ru1_scatter, ru2_scatter, o2_scatter), (ru1_text, ru2_text)
 
-def update_frame(frame, ru1_complexes, ru2_complexes, o2_molecules, args, sim_data):
+def frame_from_simulation(sim):
+    """ Collects the data drawn in one frame from the current simulation state. """
+    excited = sim.get_excited()
+    n_ru1 = len(sim.ru1_complexes)
+    o2_x, o2_y = sim.get_o2_positions()
+    ru1_emissions, ru1_quenched = sim.get_type_counts('Ru1')
+    ru2_emissions, ru2_quenched = sim.get_type_counts('Ru2')
+    return {
+        'step': sim.step_count,
+        'ru1_pos': np.array([[c.x, c.y] for c in sim.ru1_complexes]).reshape(-1, 2),
+        'ru1_excited': excited[:n_ru1].tolist(),
+        'ru2_pos': np.array([[c.x, c.y] for c in sim.ru2_complexes]).reshape(-1, 2),
+        'ru2_excited': excited[n_ru1:].tolist(),
+        'o2_pos': np.column_stack([o2_x, o2_y]),
+        'ru1_emissions': ru1_emissions,
+        'ru1_quenched': ru1_quenched,
+        'ru2_emissions': ru2_emissions,
+        'ru2_quenched': ru2_quenched
+    }
+
+def draw_frame(axes, scatters, texts, frame_data, total_steps):
+    """ Draws one frame (positions, excitation states and running statistics). """
+    ax_main = axes[0]
+    ru1_scatter, ru2_scatter, o2_scatter = scatters
+    
+    # Ru complexes (bright when excited) and oxygen molecules
+    ru1_scatter.set_offsets(frame_data['ru1_pos'])
+    ru1_scatter.set_facecolor(['orangered' if e else 'darkred' for e in frame_data['ru1_excited']])
+    ru2_scatter.set_offsets(frame_data['ru2_pos'])
+    ru2_scatter.set_facecolor(['deepskyblue' if e else 'darkblue' for e in frame_data['ru2_excited']])
+    o2_scatter.set_offsets(frame_data['o2_pos'])
+    
+    # Update statistics displays
+    current_step = frame_data['step']
+    sim_percent = (current_step / total_steps) * 100
+    for text, label in zip(texts, ('ru1', 'ru2')):
+        emissions = frame_data[f'{label}_emissions']
+        quenched = frame_data[f'{label}_quenched']
+        excited = frame_data[f'{label}_excited']
+        text.set_text(
+            f"Step: {current_step}/{total_steps} ({sim_percent:.1f}%)\n"
+            f"Emissions: {emissions}\n"
+            f"Quenched: {quenched}\n"
+            f"Currently Excited: {sum(excited)}/{len(excited)}\n"
+            f"Quantum Yield: {get_qy(emissions, quenched):.4f}\n"
+        )
+    
+    # Update main title with progress
+    ax_main.set_title(f'Simulation Progress: {sim_percent:.1f}% (Step {current_step}/{total_steps})')
+
+def update_frame(frame, sim, args, sim_data):
     """ Updates visualization for one animation frame with enhanced statistics """
     # Unpack objects
     axes, scatters, texts = sim_data['axes'], sim_data['scatters'], sim_data['texts']
-    ax_main, ax_stats_ru1, ax_stats_ru2 = axes
     ru1_scatter, ru2_scatter, o2_scatter = scatters
     ru1_text, ru2_text = texts
-    
-    # Unpack parameters
-    grid_size = args.grid_size
-    core_center = (grid_size / 2, grid_size / 2)
-    core_radius = args.core_radius
-    density_steepness = args.density_steepness
     steps_per_frame = args.frames_to_skip
-    excited_lifetime = args.excited_lifetime
-    quenching_radius_sq = args.quenching_radius ** 2
-    o2_prob_min = args.o2_prob_min
-    o2_prob_max = args.o2_prob_max
-    excitation_prob = args.excitation_prob
     
     # Track frame time for analysis of simulation speed
     frame_start_time = time.time()
     
     # Run multiple simulation steps per frame
     for _ in range(steps_per_frame):
-        # 1. Excite complexes with probability
-        for ru in ru1_complexes + ru2_complexes:
-            ru.excite(excitation_prob, excited_lifetime)
-
-        # 2. Move Oxygen
-        for o2 in o2_molecules:
-            o2.move(grid_size, core_center, core_radius, density_steepness, o2_prob_min, o2_prob_max)
-
-        # 3. Check for Quenching
-        for ru in ru1_complexes + ru2_complexes:
-            if ru.state == 'excited':
-                for o2 in o2_molecules:
-                    dist_sq = (ru.x - o2.x)**2 + (ru.y - o2.y)**2
-                    if dist_sq < quenching_radius_sq:
-                        ru.quench(math.sqrt(dist_sq))  # Pass actual distance
-                        o2.record_quench()  # Record quench event for this O2
-                        break  # Quenched
-
-        # 4. Ru complexes evolve (timer/emission)
-        for ru in ru1_complexes + ru2_complexes:
-            ru.step()
-    
-    # Update core visualization data
-    # Ru(1) complexes
-    ru1_pos = np.array([[c.x, c.y] for c in ru1_complexes]) if ru1_complexes else np.empty((0, 2))
-    ru1_colors = ['orangered' if c.state == 'excited' else 'darkred' for c in ru1_complexes]
-    ru1_scatter.set_offsets(ru1_pos)
-    ru1_scatter.set_facecolor(ru1_colors)
-    
-    # Ru(2) complexes
-    ru2_pos = np.array([[c.x, c.y] for c in ru2_complexes]) if ru2_complexes else np.empty((0, 2))
-    ru2_colors = ['deepskyblue' if c.state == 'excited' else 'darkblue' for c in ru2_complexes]
-    ru2_scatter.set_offsets(ru2_pos)
-    ru2_scatter.set_facecolor(ru2_colors)
-    
-    # Oxygen molecules
-    o2_pos = np.array([[o.x, o.y] for o in o2_molecules]) if o2_molecules else np.empty((0, 2))
-    o2_scatter.set_offsets(o2_pos)
-    
-    # Calculate current statistics for text displays
-    current_step = frame * steps_per_frame
-    sim_percent = (current_step / args.steps) * 100
-    
-    # Calculate quantum yields
-    ru1_emissions = sum(c.emission_count for c in ru1_complexes)
-    ru1_quenched = sum(c.quenched_count for c in ru1_complexes)
-    ru1_total_events = ru1_emissions + ru1_quenched
-    simulated_qy_ru1 = ru1_emissions / ru1_total_events if ru1_total_events > 0 else 0
-    
-    ru2_emissions = sum(c.emission_count for c in ru2_complexes)
-    ru2_quenched = sum(c.quenched_count for c in ru2_complexes)
-    ru2_total_events = ru2_emissions + ru2_quenched
-    simulated_qy_ru2 = ru2_emissions / ru2_total_events if ru2_total_events > 0 else 0
-    
-    # Count currently excited complexes
-    ru1_excited = sum(1 for c in ru1_complexes if c.state == 'excited')
-    ru2_excited = sum(1 for c in ru2_complexes if c.state == 'excited')
-    
-    # Update statistics displays
-    ru1_stats = (
-        f"Step: {current_step}/{args.steps} ({sim_percent:.1f}%)\n"
-        f"Emissions: {ru1_emissions}\n"
-        f"Quenched: {ru1_quenched}\n"
-        f"Currently Excited: {ru1_excited}/{len(ru1_complexes)}\n"
-        f"Quantum Yield: {simulated_qy_ru1:.4f}\n"
-    )
-    
-    ru2_stats = (
-        f"Step: {current_step}/{args.steps} ({sim_percent:.1f}%)\n"
-        f"Emissions: {ru2_emissions}\n"
-        f"Quenched: {ru2_quenched}\n"
-        f"Currently Excited: {ru2_excited}/{len(ru2_complexes)}\n"
-        f"Quantum Yield: {simulated_qy_ru2:.4f}\n"
-    )
-    
-    # Update texts
-    ru1_text.set_text(ru1_stats)
-    ru2_text.set_text(ru2_stats)
-    
-    # Update main title with progress
-    ax_main.set_title(f'Simulation Progress: {sim_percent:.1f}% (Step {current_step}/{args.steps})')
+        sim.step()
     
-    # Calculate frame time and update predicted completion
-    frame_time = time.time() - frame_start_time
-    frames_remaining = (args.steps // steps_per_frame) - frame - 1
-    estimated_time = frames_remaining * frame_time
+    # Draw the current state
+    frame_data = frame_from_simulation(sim)
+    draw_frame(axes, scatters, texts, frame_data, args.steps)
     
     # Record performance data
+    frame_time = time.time() - frame_start_time
     sim_data['frame_times'].append(frame_time)
     
     # If this is the last frame, prepare for final analysis
-    if current_step >= args.steps - steps_per_frame:
+    if sim.step_count >= args.steps - steps_per_frame:
         sim_data['final_stats'] = {
-            'ru1_qy': simulated_qy_ru1,
-            'ru2_qy': simulated_qy_ru2,
-            'ru1_emissions': ru1_emissions,
-            'ru1_quenched': ru1_quenched,
-            'ru2_emissions': ru2_emissions,
-            'ru2_quenched': ru2_quenched
+            'ru1_qy': get_qy(frame_data['ru1_emissions'], frame_data['ru1_quenched']),
+            'ru2_qy': get_qy(frame_data['ru2_emissions'], frame_data['ru2_quenched']),
+            'ru1_emissions': frame_data['ru1_emissions'],
+            'ru1_quenched': frame_data['ru1_quenched'],
+            'ru2_emissions': frame_data['ru2_emissions'],
+            'ru2_quenched': frame_data['ru2_quenched']
         }
     
     return ru1_scatter, ru2_scatter, o2_scatter, ru1_text, ru2_text
@@ -510,16 +349,17 @@ def generate_final_analysis(ru1_complexes, ru2_complexes, o2_molecules, args, st
     
     # 3. Lifetime distributions
     ax3 = plt.subplot2grid((3, 3), (0, 2))
-    ru1_lifetimes = [lt for c in ru1_complexes for lt in c.lifetime_history]
-    ru2_lifetimes = [lt for c in ru2_complexes for lt in c.lifetime_history]
+    # Population histograms are merged from the per-complex running stats
+    ru1_lifetime_stats = get_population_stats(ru1_complexes, 'lifetime_stats')
+    ru2_lifetime_stats = get_population_stats(ru2_complexes, 'lifetime_stats')
     
-    if ru1_lifetimes and ru2_lifetimes:
-        max_lifetime = max(max(ru1_lifetimes) if ru1_lifetimes else 0, 
-                         max(ru2_lifetimes) if ru2_lifetimes else 0)
-        bins = np.linspace(0, max_lifetime, 20)
+    if ru1_lifetime_stats and ru2_lifetime_stats:
+        bins = ru1_lifetime_stats.bin_edges()
         
-        ax3.hist(ru1_lifetimes, bins=bins, alpha=0.5, label='Ru1', color='orangered')
-        ax3.hist(ru2_lifetimes, bins=bins, alpha=0.5, label='Ru2', color='deepskyblue')
+        ax3.hist(bins[:-1], bins=bins, weights=ru1_lifetime_stats.histogram, alpha=0.5,
+                 label=f'Ru1 (mean {ru1_lifetime_stats.mean:.1f} ± {ru1_lifetime_stats.std:.1f})', color='orangered')
+        ax3.hist(bins[:-1], bins=bins, weights=ru2_lifetime_stats.histogram, alpha=0.5,
+                 label=f'Ru2 (mean {ru2_lifetime_stats.mean:.1f} ± {ru2_lifetime_stats.std:.1f})', color='deepskyblue')
         ax3.set_xlabel('Excited State Duration')
         ax3.set_ylabel('Frequency')
         ax3.set_title('Lifetime Distributions')
@@ -575,7 +415,10 @@ def generate_final_analysis(ru1_complexes, ru2_complexes, o2_molecules, args, st
     
     # 6. O2 quenching activity
     ax6 = plt.subplot2grid((3, 3), (2, 0))
-    o2_quench_counts = [o2.quench_count for o2 in o2_molecules]
+    if isinstance(o2_molecules, TrajectoryReader):
+        o2_quench_counts = o2_molecules.summary()['o2_quench_count'].tolist()
+    else:
+        o2_quench_counts = [o2.quench_count for o2 in o2_molecules]
     if o2_quench_counts:
         max_quenches = max(o2_quench_counts)
         bins = np.arange(0, max_quenches + 2) - 0.5
@@ -651,7 +494,7 @@ def save_simulation_data(ru1_complexes, ru2_complexes, o2_molecules, args, start
         "results": {
             "ru1_complexes": [c.to_dict() for c in ru1_complexes],
             "ru2_complexes": [c.to_dict() for c in ru2_complexes],
-            "o2_molecules": [o2.to_dict() for o in o2_molecules],
+            "o2_molecules": [o.to_dict() for o in o2_molecules],
             "summary": {
                 "ru1_count": len(ru1_complexes),
                 "ru2_count": len(ru2_complexes),
@@ -663,7 +506,14 @@ def save_simulation_data(ru1_complexes, ru2_complexes, o2_molecules, args, start
                 "ru1_quantum_yield": sum(c.emission_count for c in ru1_complexes) / 
                                     max(1, sum(c.emission_count + c.quenched_count for c in ru1_complexes)),
                 "ru2_quantum_yield": sum(c.emission_count for c in ru2_complexes) / 
-                                    max(1, sum(c.emission_count + c.quenched_count for c in ru2_complexes))
+                                    max(1, sum(c.emission_count + c.quenched_count for c in ru2_complexes)),
+                "population_stats": {
+                    f"{name}_{stat}": population.to_dict()
+                    for name, complexes in (('ru1', ru1_complexes), ('ru2', ru2_complexes)) if complexes
+                    for stat, population in (
+                        ('lifetime', get_population_stats(complexes, 'lifetime_stats')),
+                        ('quencher_distance', get_population_stats(complexes, 'quencher_distance_stats')))
+                }
             }
         }
     }
@@ -676,6 +526,117 @@ def save_simulation_data(ru1_complexes, ru2_complexes, o2_molecules, args, start
     print(f"Simulation data saved to: {filename}")
     return filename
 
+# --- Checkpointing ---
+# Arguments that must match between a checkpoint and the run resuming it
+CHECKPOINT_PARAMETERS = ('grid_size', 'core_radius', 'surface_thickness', 'num_ru1', 'num_ru2', 'num_o2',
+                         'excited_lifetime', 'quenching_radius', 'o2_prob_max', 'o2_prob_min',
+                         'density_steepness', 'excitation_prob', 'engine', 'dimensions', 'walk',
+                         'boundary')
+
+def check_checkpoint_args(checkpoint, args):
+    """Exit with an error if the checkpoint was written with different model parameters"""
+    saved_args = decode_json(checkpoint['args'])
+    # Parameters added after a checkpoint was written take their default
+    mismatched = [name for name in CHECKPOINT_PARAMETERS
+                  if saved_args.get(name, getattr(SimulationConfig, name, None)) != getattr(args, name)]
+    if mismatched:
+        details = ', '.join(f"{name}={saved_args.get(name)!r}" for name in mismatched)
+        raise SystemExit(f"Error: Checkpoint was written with different parameters ({details}).")
+
+# --- Observers ---
+class CheckpointObserver(Observer):
+    """ Saves a checkpoint (on a background thread) every `interval` steps. """
+    def __init__(self, interval, path, args, recorder=None, trajectory=None):
+        self.interval = interval
+        self.args = args
+        self.recorder = recorder
+        self.trajectory = trajectory
+        self.writer = CheckpointWriter(path)
+
+    def on_step(self, sim):
+        state = sim.get_state()
+        state['args'] = encode_json(vars(self.args))
+        # Recorded chunks up to this step are kept on resume, later ones dropped
+        event_chunks, o2_chunks = self.recorder.flush() if self.recorder is not None else (0, 0)
+        state['record_event_chunks'] = np.array(event_chunks)
+        state['record_o2_chunks'] = np.array(o2_chunks)
+        state['trajectory_frames'] = np.array(self.trajectory.flush() if self.trajectory is not None else 0)
+        self.writer.save(state)
+
+    def on_finish(self, sim):
+        self.writer.wait()
+
+class SnapshotObserver(Observer):
+    """ Adds a frame to a FrameSnapshots every `interval` steps. """
+    def __init__(self, interval, snapshots):
+        self.interval = interval
+        self.snapshots = snapshots
+
+    def on_step(self, sim):
+        o2_x, o2_y = sim.get_o2_positions()
+        self.snapshots.add(sim.step_count, o2_x, o2_y, sim.get_excited(),
+                           sim.get_type_counts('Ru1') + sim.get_type_counts('Ru2'))
+
+class TrajectoryObserver(Observer):
+    """ Appends a frame to a TrajectoryWriter every `interval` steps; on finish adds the final frame and aggregates. """
+    def __init__(self, interval, writer, start_time):
+        self.interval = interval
+        self.writer = writer
+        self.start_time = start_time
+        self.last_step = None
+
+    def on_step(self, sim):
+        self.writer.add_frame(sim.step_count, sim.get_o2_coordinates(), sim.get_excited(),
+                              sim.get_type_counts('Ru1') + sim.get_type_counts('Ru2'))
+        self.last_step = sim.step_count
+
+    def on_finish(self, sim):
+        if self.last_step != sim.step_count:
+            self.on_step(sim)
+        state = sim.get_state()
+        self.writer.close({key: state[key] for key in SUMMARY_KEYS}, time.time() - self.start_time)
+
+def open_trajectory(args, sim, checkpoint):
+    """ Creates the trajectory file of a run (or, when resuming, cuts it back to the checkpoint). """
+    resume_frames = None
+    if checkpoint is not None:
+        resume_frames = int(checkpoint['trajectory_frames']) if 'trajectory_frames' in checkpoint else 0
+    ru_positions = [[c.x for c in sim.all_complexes], [c.y for c in sim.all_complexes]]
+    if args.dimensions == 3:
+        ru_positions.append([c.z for c in sim.all_complexes])
+    return TrajectoryWriter(args.trajectory, ru_positions, [c.type for c in sim.all_complexes],
+                            len(sim.o2_molecules), args.trajectory_stride, vars(args), resume_frames)
+
+def analyze_trajectory(path, save_path):
+    """ Redoes the final analysis of a finished run from its trajectory file, without loading the frames. """
+    trajectory = TrajectoryReader(path)
+    summary = trajectory.summary()
+    if summary is None:
+        raise SystemExit(f"Error: {path} has no final aggregates (the run did not finish).")
+    args = argparse.Namespace(**trajectory.params)
+    args.steps = int(summary['step'])
+
+    # Complexes with the final counts and statistics (O2 data stays in the file)
+    ru1_complexes, ru2_complexes = [], []
+    for i, (position, type) in enumerate(zip(trajectory.complexes['position'].tolist(), trajectory.complex_types())):
+        c = RutheniumComplex(position[0], position[1], type, args.excited_lifetime, args.quenching_radius)
+        c.emission_count = int(summary['emission_count'][i])
+        c.quenched_count = int(summary['quenched_count'][i])
+        c.total_excitations = int(summary['total_excitations'][i])
+        c.lifetime_stats = RunningStats.from_state(summary['lifetime_stats'][i])
+        c.quencher_distance_stats = RunningStats.from_state(summary['distance_stats'][i])
+        (ru1_complexes if c.type == ComplexType.RU1 else ru2_complexes).append(c)
+
+    print(f"Trajectory {path}: {trajectory.frame_count} frames of {trajectory.n_o2} O2 molecules "
+          f"(steps {int(trajectory.steps[0])}-{int(trajectory.steps[-1])})")
+    start_time = time.time() - (trajectory.index.get('runtime') or 0)
+    fig = generate_final_analysis(ru1_complexes, ru2_complexes, trajectory, args, start_time)
+    os.makedirs(save_path, exist_ok=True)
+    filename = os.path.join(save_path, f"final_analysis_{os.path.splitext(os.path.basename(path))[0]}.png")
+    fig.savefig(filename, dpi=150)
+    print(f"Final analysis saved to: {filename}")
+    return filename
+
 # --- Main Simulation Function ---
 def run_simulation(args):
     """Run the complete simulation with all enhancements"""
@@ -686,34 +647,59 @@ def run_simulation(args):
     grid_size = args.grid_size
     core_center = (grid_size / 2, grid_size / 2)
     
+    # Checkpoint file for headless runs
+    checkpoint_path = args.checkpoint_path or os.path.join(args.save_path, 'checkpoint.npz')
+    checkpoint = None
+    if args.save_animation and (args.resume or not VISUALIZE):
+        raise SystemExit("Error: --save-animation needs matplotlib and cannot be combined with --resume.")
+    if args.resume:
+        checkpoint = load_checkpoint(checkpoint_path)
+        check_checkpoint_args(checkpoint, args)
+        args.seed = decode_json(checkpoint['args'])['seed']
+        print(f"Resuming from {checkpoint_path} at step {int(checkpoint['step'])}")
+    
+    # Seed the run so it can be reproduced (the seed is saved with the data)
+    args.seed = resolve_seed(args.seed)
+    
     # Initialize simulation elements
     print("Initializing simulation components...")
-    
-    # Place Ru complexes
-    ru1_complexes = place_complexes(args.num_ru1, 'Ru1', grid_size, core_center, 
-                                   args.core_radius, args.surface_thickness)
-    ru2_complexes = place_complexes(args.num_ru2, 'Ru2', grid_size, core_center, 
-                                   args.core_radius, args.surface_thickness)
-    
-    # Place O2 molecules with distribution weighted by polymer density
-    o2_molecules = []
-    attempts = 0
-    max_attempts = args.num_o2 * 10
-    
-    while len(o2_molecules) < args.num_o2 and attempts < max_attempts:
-        attempts += 1
-        x = random.uniform(0, grid_size - 1)
-        y = random.uniform(0, grid_size - 1)
-        
-        # Calculate probability based on density
-        density = get_polymer_density(x, y, core_center, args.core_radius, args.density_steepness)
-        if random.random() < density:
-            o2_molecules.append(OxygenMolecule(x, y))
+    print(f"Random seed: {args.seed}")
+    
+    # Optional streaming recorder for events and O2 trajectories
+    recorder = None
+    if args.record_dir:
+        recorder = StreamRecorder(args.record_dir, args.record_stride)
+        if checkpoint is not None:
+            recorder.resume(int(checkpoint['record_event_chunks']), int(checkpoint['record_o2_chunks']))
+    
+    # Place Ru complexes and O2 molecules weighted by polymer density (or restore them)
+    sim = Simulation(SimulationConfig.from_args(args), recorder=recorder, state=checkpoint)
+    ru1_complexes, ru2_complexes, o2_molecules = sim.ru1_complexes, sim.ru2_complexes, sim.o2_molecules
+    all_complexes = sim.all_complexes
+    
+    # Memory-mapped trajectory of O2 positions and complex states
+    trajectory = None
+    if args.trajectory:
+        trajectory = open_trajectory(args, sim, checkpoint)
+        sim.add_observer(TrajectoryObserver(args.trajectory_stride, trajectory, start_time))
+    
+    # Periodic checkpoints (written on a background thread)
+    if args.checkpoint_every > 0:
+        sim.add_observer(CheckpointObserver(args.checkpoint_every, checkpoint_path, args, recorder, trajectory))
+    
+    # Frame snapshots for the batch renderer (--save-animation)
+    snapshots = None
+    if args.save_animation:
+        snapshot_params = {name: getattr(args, name) for name in
+                           ('grid_size', 'core_radius', 'surface_thickness', 'density_steepness', 'high_res', 'steps')}
+        snapshots = FrameSnapshots([c.x for c in all_complexes], [c.y for c in all_complexes],
+                                   [c.type for c in all_complexes], snapshot_params)
+        sim.add_observer(SnapshotObserver(args.frames_to_skip, snapshots))
     
     print(f"Placed {len(ru1_complexes)} Ru1, {len(ru2_complexes)} Ru2, and {len(o2_molecules)} O2 molecules.")
     
-    # Set up visualization if enabled
-    if args.visualize and VISUALIZE:
+    # Interactive animation (saving an animation always runs headless)
+    if args.visualize and VISUALIZE and not args.save_animation:
         fig, axes, scatters, texts = setup_visualization(
             grid_size, core_center, args.core_radius, args.surface_thickness, 
             args.density_steepness, args.high_res
@@ -728,89 +714,83 @@ def run_simulation(args):
             'final_stats': {}
         }
         
+        if args.telemetry:
+            sim.add_observer(TelemetryObserver(JsonLinesSink(args.telemetry), sim, args.steps, args.telemetry_every,
+                                               sim_data['frame_times']))
+        
         # Create animation
-        frames = args.steps // args.frames_to_skip
+        frames = (args.steps - sim.step_count) // args.frames_to_skip
         ani = animation.FuncAnimation(
             fig, update_frame, frames=frames,
-            fargs=(ru1_complexes, ru2_complexes, o2_molecules, args, sim_data),
+            fargs=(sim, args, sim_data),
             interval=args.animation_interval, blit=True
         )
         
-        # Save animation if requested
-        if args.save_animation:
-            print("Saving animation... (this may take a while)")
-            os.makedirs(args.save_path, exist_ok=True)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            ani.save(f"{args.save_path}/simulation_{timestamp}.mp4", writer='ffmpeg', dpi=150)
-        
         # Show animation
         plt.show()
+        sim.finish()
+        if recorder is not None:
+            recorder.close()
+        frames_summary = frame_time_summary(sim_data['frame_times'])
+        if frames_summary is not None:
+            print(f"Animation: {frames_summary['count']} frames, {frames_summary['mean_ms']:.1f} ms/frame on average "
+                  f"(max {frames_summary['max_ms']:.1f} ms, {frames_summary['fps']:.1f} frames/s)")
         
         # Generate and display final analysis
-        final_fig = generate_final_analysis(ru1_complexes, ru2_complexes, o2_molecules, args, start_time)
-        
-        # Save final analysis figure if requested
-        if args.save_animation:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            final_fig.savefig(f"{args.save_path}/final_analysis_{timestamp}.png", dpi=150)
-        
+        generate_final_analysis(ru1_complexes, ru2_complexes, o2_molecules, args, start_time)
         plt.show()
     else:
         # Run simulation without visualization
-        print("Running simulation without visualization...")
-        for step in range(args.steps):
-            # Print progress
-            if step % (args.steps // 10) == 0:
-                print(f"Progress: {step / args.steps * 100:.1f}%")
-            
-            # 1. Excite complexes
-            for ru in ru1_complexes + ru2_complexes:
-                ru.excite(args.excitation_prob, args.excited_lifetime)
-
-            # 2. Move Oxygen
-            for o2 in o2_molecules:
-                o2.move(grid_size, core_center, args.core_radius, args.density_steepness, 
-                       args.o2_prob_min, args.o2_prob_max)
-
-            # 3. Check for Quenching
-            for ru in ru1_complexes + ru2_complexes:
-                if ru.state == 'excited':
-                    for o2 in o2_molecules:
-                        dist_sq = (ru.x - o2.x)**2 + (ru.y - o2.y)**2
-                        if dist_sq < args.quenching_radius ** 2:
-                            ru.quench(math.sqrt(dist_sq))
-                            o2.record_quench()
-                            break  # Quenched
-
-            # 4. Ru complexes evolve (timer/emission)
-            for ru in ru1_complexes + ru2_complexes:
-                ru.step()
+        print(f"Running simulation without visualization ({args.engine} engine)...")
+        sim.add_observer(ProgressObserver(args.steps, sim.step_count))
+        if args.telemetry:
+            sim.add_observer(TelemetryObserver(JsonLinesSink(args.telemetry), sim, args.steps, args.telemetry_every))
+        sim.run(args.steps)
+        if recorder is not None:
+            recorder.close()
+    
+    # Render the saved frames (in parallel, without re-simulating)
+    if snapshots is not None:
+        os.makedirs(args.save_path, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        snapshot_path = os.path.join(args.save_path, f"frames_{timestamp}.npz")
+        snapshots.save(snapshot_path)
+        print(f"Rendering {len(snapshots)} frames... (this may take a while)")
+        render_video(snapshot_path, os.path.join(args.save_path, f"simulation_{timestamp}.mp4"),
+                     fps=1000 / args.animation_interval, workers=args.render_workers)
+        final_fig = generate_final_analysis(ru1_complexes, ru2_complexes, o2_molecules, args, start_time)
+        final_fig.savefig(os.path.join(args.save_path, f"final_analysis_{timestamp}.png"), dpi=150)
     
     # Save simulation data if requested
     if args.save_data:
         save_simulation_data(ru1_complexes, ru2_complexes, o2_molecules, args, start_time, args.save_path)
     
     # Print final results
-    ru1_emissions = sum(c.emission_count for c in ru1_complexes)
-    ru1_quenched = sum(c.quenched_count for c in ru1_complexes)
-    ru1_total_events = ru1_emissions + ru1_quenched
-    simulated_qy_ru1 = ru1_emissions / ru1_total_events if ru1_total_events > 0 else 0
-    
-    ru2_emissions = sum(c.emission_count for c in ru2_complexes)
-    ru2_quenched = sum(c.quenched_count for c in ru2_complexes)
-    ru2_total_events = ru2_emissions + ru2_quenched
-    simulated_qy_ru2 = ru2_emissions / ru2_total_events if ru2_total_events > 0 else 0
+    ru1_emissions, ru1_quenched = sim.get_type_counts('Ru1')
+    ru2_emissions, ru2_quenched = sim.get_type_counts('Ru2')
     
     print("\nSimulation Complete!")
     print(f"Runtime: {time.time() - start_time:.2f} seconds")
-    print(f"Ru1 (Surface) - QY: {simulated_qy_ru1:.4f} ({ru1_emissions} emissions / {ru1_total_events} events)")
-    print(f"Ru2 (Core) - QY: {simulated_qy_ru2:.4f} ({ru2_emissions} emissions / {ru2_total_events} events)")
+    print(f"Ru1 (Surface) - QY: {get_qy(ru1_emissions, ru1_quenched):.4f} "
+          f"({ru1_emissions} emissions / {ru1_emissions + ru1_quenched} events)")
+    print(f"Ru2 (Core) - QY: {get_qy(ru2_emissions, ru2_quenched):.4f} "
+          f"({ru2_emissions} emissions / {ru2_emissions + ru2_quenched} events)")
+    for label, complexes in (('Ru1', ru1_complexes), ('Ru2', ru2_complexes)):
+        lifetimes = get_population_stats(complexes, 'lifetime_stats')
+        if lifetimes is not None and lifetimes.count:
+            print(f"{label} lifetime: {lifetimes.mean:.2f} ± {lifetimes.std:.2f} steps "
+                  f"(min {lifetimes.min:.0f}, max {lifetimes.max:.0f})")
     
     return ru1_complexes, ru2_complexes, o2_molecules
 
 # --- Main Entry Point ---
 if __name__ == "__main__":
     args = parse_arguments()
+    if args.analyze:
+        if not VISUALIZE:
+            raise SystemExit("Error: --analyze needs matplotlib.")
+        analyze_trajectory(args.analyze, args.save_path)
+        raise SystemExit(0)
     print("Ruthenium Polymer Simulation")
     print("=" * 30)
     print(f"Grid Size: {args.grid_size}x{args.grid_size}")
@@ -1,13 +1,24 @@
 import numpy as np
 import random
 import time
-import math
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
 from datetime import datetime
 import json
 import os
 import matplotlib.pyplot as plt
 
+from ensemble import EnsembleRunner, add_ensemble_arguments, ensemble_settings
+from result_cache import add_cache_arguments, cache_from_args, model_version
+from seeding import resolve_seed, seed_for_params
+from simulation_core import ENGINES, Simulation, SimulationConfig
+
+# Arguments that determine the outcome of a single run (together with the O2 count)
+MODEL_PARAMETERS = ('grid_size', 'core_radius', 'surface_thickness', 'num_ru1', 'num_ru2', 'steps',
+                    'excited_lifetime', 'quenching_radius', 'o2_prob_max', 'o2_prob_min',
+                    'density_steepness', 'excitation_prob', 'engine')
+
 # --- Command Line Arguments ---
 def parse_arguments():
     parser = argparse.ArgumentParser(description='O2 Concentration vs QY Simulation')
@@ -20,7 +31,11 @@ def parse_arguments():
     parser.add_argument('--num-ru2', type=int, default=30, help='Number of Ru(2) core complexes')
     parser.add_argument('--min-o2', type=int, default=10, help='Minimum number of oxygen molecules')
     parser.add_argument('--max-o2', type=int, default=200, help='Maximum number of oxygen molecules')
-    parser.add_argument('--o2-steps', type=int, default=10, help='Number of O2 concentration steps')
+    parser.add_argument('--o2-steps', type=int, default=10, help='Number of O2 concentration steps (initial grid if adaptive)')
+    parser.add_argument('--adaptive', action='store_true', help='Refine the O2 grid where the QY curve bends')
+    parser.add_argument('--max-points', type=int, default=25, help='Maximum number of O2 counts in adaptive mode')
+    parser.add_argument('--adaptive-tol', type=float, default=0.005,
+                        help='Stop refining intervals whose estimated QY interpolation error is below this')
     parser.add_argument('--steps', type=int, default=600, help='Number of simulation time steps')
     
     # Physical model parameters
@@ -31,165 +46,27 @@ def parse_arguments():
     parser.add_argument('--density-steepness', type=float, default=0.3, help='Steepness of density gradient')
     parser.add_argument('--excitation-prob', type=float, default=1.0, help='Probability of excitation per time step')
     
+    parser.add_argument('--engine', choices=ENGINES, default='object',
+                        help='Step engine (vectorized: NumPy arrays, event: queued excitations / emissions, '
+                             'kmc: kinetic Monte Carlo, decomposed: strips stepped by --tiles processes)')
+    parser.add_argument('--tiles', type=int, default=1, help='Number of strips (worker processes) of the decomposed engine')
+    parser.add_argument('--seed', type=int, default=None, help='Base random seed (random if omitted)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes for the replicates')
+    add_ensemble_arguments(parser)
+    
     # Output options
     parser.add_argument('--save-path', type=str, default='simulation_results', help='Path to save results')
+    add_cache_arguments(parser)
     
-    return parser.parse_args()
-
-# --- Classes ---
-class RutheniumComplex:
-    """ Represents a Ruthenium complex molecule with enhanced tracking capabilities """
-    def __init__(self, x, y, type):
-        self.x = x
-        self.y = y
-        self.type = type  # 'Ru1' (surface) or 'Ru2' (core)
-        self.state = 'ground'  # 'ground' or 'excited'
-        self.excited_timer = 0
-        self.emission_count = 0
-        self.quenched_count = 0
-        self.total_excitations = 0
-        
-        # Enhanced tracking
-        self.lifetime_history = []  # Track excited state durations
-        self.quencher_distances = []  # Track distances to quenchers when quenched
-        
-    def excite(self, excitation_prob=1.0, lifetime=30):
-        """Excite the complex with given probability and lifetime"""
-        if self.state == 'ground' and random.random() < excitation_prob:
-            self.state = 'excited'
-            self.excited_timer = lifetime
-            self.total_excitations += 1
-
-    def step(self):
-        """Update the complex state for one time step"""
-        if self.state == 'excited':
-            self.excited_timer -= 1
-            if self.excited_timer <= 0:
-                self.emit()
-
-    def quench(self, quencher_distance=None):
-        """Quench the complex and record quenching event data"""
-        if self.state == 'excited':
-            # Calculate lifetime that was achieved before quenching
-            achieved_lifetime = self.excited_timer
-            self.lifetime_history.append(achieved_lifetime)
-            
-            # Record quencher distance if provided
-            if quencher_distance is not None:
-                self.quencher_distances.append(quencher_distance)
-                
-            # Reset state
-            self.state = 'ground'
-            self.excited_timer = 0
-            self.quenched_count += 1
-
-    def emit(self):
-        """Emit light and record emission event"""
-        if self.state == 'excited':
-            # Calculate full lifetime that was achieved
-            achieved_lifetime = self.excited_timer
-            self.lifetime_history.append(achieved_lifetime)
-            
-            # Reset state
-            self.state = 'ground'
-            self.excited_timer = 0
-            self.emission_count += 1
-
-    def get_simulated_qy(self):
-        """Calculate quantum yield from recorded events"""
-        total_events = self.emission_count + self.quenched_count
-        return self.emission_count / total_events if total_events > 0 else 0
-
-class OxygenMolecule:
-    """ Represents an Oxygen molecule (quencher) with enhanced tracking. """
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.quench_count = 0
-        
-    def move(self, grid_size, core_center, core_radius, density_steepness, prob_min, prob_max):
-        """ Moves the oxygen molecule with density-dependent probability. """
-        # Calculate density and movement probability
-        density = get_polymer_density(self.x, self.y, core_center, core_radius, density_steepness)
-        move_prob = prob_max - density * (prob_max - prob_min)
-        move_prob = max(prob_min, min(prob_max, move_prob))  # Clamp probability
-
-        if random.random() < move_prob:
-            # Move one step in a random direction
-            dx = random.choice([-1, 0, 1])
-            dy = random.choice([-1, 0, 1])
-
-            # Apply boundary conditions (stay within grid)
-            new_x = max(0, min(grid_size - 1, self.x + dx))
-            new_y = max(0, min(grid_size - 1, self.y + dy))
-            self.x, self.y = new_x, new_y
-    
-    def record_quench(self):
-        """Record a quenching event by this O2 molecule"""
-        self.quench_count += 1
+    args = parser.parse_args()
+    # Pool workers are daemonic and cannot start the decomposed engine's tile processes
+    if args.engine == 'decomposed' and args.workers > 1:
+        parser.error("--engine decomposed runs its own processes (--tiles) and cannot be combined with --workers > 1")
+    return args
 
 # --- Helper Functions ---
-def get_polymer_density(x, y, center, radius, steepness):
-    """ Calculates polymer density using a sigmoid-like function. """
-    dist = math.sqrt((x - center[0])**2 + (y - center[1])**2)
-    # Sigmoid function centered around 'radius'
-    exponent = steepness * (dist - radius)
-    # Clamp exponent to prevent overflow/underflow
-    exponent = max(-700, min(700, exponent))
-    try:
-        density = 1 / (1 + math.exp(exponent))
-    except OverflowError:
-        # If exponent too large, density is effectively 0
-        density = 0.0
-    return density
-
-def is_in_core_region(x, y, center, radius):
-    """ Checks if coordinates are within the core radius. """
-    return (x - center[0])**2 + (y - center[1])**2 < radius**2
-
-def place_complexes(num, type, grid_size, core_center, core_radius, surface_thickness):
-    """ Places Ru complexes in appropriate regions. """
-    complexes = []
-    attempts = 0
-    max_attempts = num * 300
-    surface_outer_radius = core_radius + surface_thickness
-
-    while len(complexes) < num and attempts < max_attempts:
-        attempts += 1
-        x = random.uniform(0, grid_size - 1)
-        y = random.uniform(0, grid_size - 1)
-        in_core_flag = is_in_core_region(x, y, core_center, core_radius)
-        dist_from_center = math.sqrt((x - core_center[0])**2 + (y - core_center[1])**2)
-
-        if type == 'Ru1' and not in_core_flag and dist_from_center < surface_outer_radius:
-            complexes.append(RutheniumComplex(x, y, type))
-        elif type == 'Ru2' and in_core_flag:
-            complexes.append(RutheniumComplex(x, y, type))
-
-    if len(complexes) < num:
-        print(f"Warning: Could only place {len(complexes)} of {num} desired {type} complexes.")
-    return complexes
-
-def place_oxygen_molecules(num_o2, grid_size, core_center, core_radius, density_steepness):
-    """Place O2 molecules with distribution weighted by polymer density"""
-    o2_molecules = []
-    attempts = 0
-    max_attempts = num_o2 * 10
-    
-    while len(o2_molecules) < num_o2 and attempts < max_attempts:
-        attempts += 1
-        x = random.uniform(0, grid_size - 1)
-        y = random.uniform(0, grid_size - 1)
-        
-        # Calculate probability based on density
-        density = get_polymer_density(x, y, core_center, core_radius, density_steepness)
-        if random.random() < density:
-            o2_molecules.append(OxygenMolecule(x, y))
-    
-    return o2_molecules
-
-def save_results(o2_counts, ru1_qy_values, ru2_qy_values, args, save_path):
-    """Save results to CSV and JSON files"""
+def save_results(o2_counts, ru1_qy_values, ru2_qy_values, args, save_path, errors=None):
+    """Save results to CSV and JSON files (errors: per-point replicate statistics, if any)"""
     os.makedirs(save_path, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
@@ -203,6 +80,8 @@ def save_results(o2_counts, ru1_qy_values, ru2_qy_values, args, save_path):
             "ru2_qy_values": ru2_qy_values
         }
     }
+    if errors is not None:
+        results["data"]["errors"] = errors
     
     # Save to JSON
     json_filename = os.path.join(save_path, f"o2_vs_qy_{timestamp}.json")
@@ -212,20 +91,35 @@ def save_results(o2_counts, ru1_qy_values, ru2_qy_values, args, save_path):
     # Also save as CSV for easy importing into other software
     csv_filename = os.path.join(save_path, f"o2_vs_qy_{timestamp}.csv")
     with open(csv_filename, 'w') as f:
-        f.write("O2_Count,Ru1_QY,Ru2_QY\n")
-        for i in range(len(o2_counts)):
-            f.write(f"{o2_counts[i]},{ru1_qy_values[i]},{ru2_qy_values[i]}\n")
+        if errors is None:
+            f.write("O2_Count,Ru1_QY,Ru2_QY\n")
+            for i in range(len(o2_counts)):
+                f.write(f"{o2_counts[i]},{ru1_qy_values[i]},{ru2_qy_values[i]}\n")
+        else:
+            f.write("O2_Count,Ru1_QY,Ru2_QY,Ru1_SEM,Ru1_CI_Low,Ru1_CI_High,Ru2_SEM,Ru2_CI_Low,Ru2_CI_High,Replicates\n")
+            for i in range(len(o2_counts)):
+                e = errors[i]
+                f.write(f"{o2_counts[i]},{ru1_qy_values[i]},{ru2_qy_values[i]},"
+                        f"{e['ru1_sem']},{e['ru1_ci_low']},{e['ru1_ci_high']},"
+                        f"{e['ru2_sem']},{e['ru2_ci_low']},{e['ru2_ci_high']},{e['replicates']}\n")
     
     print(f"Results saved to: {json_filename} and {csv_filename}")
     return json_filename, csv_filename
 
-def plot_results(o2_counts, ru1_qy_values, ru2_qy_values, save_path):
+def plot_results(o2_counts, ru1_qy_values, ru2_qy_values, save_path, errors=None):
     """Create visualization of results"""
     plt.figure(figsize=(12, 8))
     
-    # Plot QY vs O2 concentration
-    plt.plot(o2_counts, ru1_qy_values, 'o-', color='orangered', label='Ru1 (Surface)')
-    plt.plot(o2_counts, ru2_qy_values, 's-', color='deepskyblue', label='Ru2 (Core)')
+    # Plot QY vs O2 concentration (with CI error bars when replicates were run)
+    if errors is None:
+        plt.plot(o2_counts, ru1_qy_values, 'o-', color='orangered', label='Ru1 (Surface)')
+        plt.plot(o2_counts, ru2_qy_values, 's-', color='deepskyblue', label='Ru2 (Core)')
+    else:
+        for name, values, marker, color, label in (('ru1', ru1_qy_values, 'o-', 'orangered', 'Ru1 (Surface)'),
+                                                    ('ru2', ru2_qy_values, 's-', 'deepskyblue', 'Ru2 (Core)')):
+            yerr = [[v - e[f'{name}_ci_low'] for v, e in zip(values, errors)],
+                    [e[f'{name}_ci_high'] - v for v, e in zip(values, errors)]]
+            plt.errorbar(o2_counts, values, yerr=yerr, fmt=marker, color=color, capsize=3, label=label)
     
     plt.xlabel('O₂ Concentration (Number of Molecules)', fontsize=14)
     plt.ylabel('Quantum Yield', fontsize=14)
@@ -253,59 +147,138 @@ def plot_results(o2_counts, ru1_qy_values, ru2_qy_values, save_path):
     
     return filename
 
-def run_single_simulation(args, num_o2):
-    """Run a single simulation with specified O2 count"""
-    # Set up grid and calculate centers
-    grid_size = args.grid_size
-    core_center = (grid_size / 2, grid_size / 2)
-    
-    # Place Ru complexes (only need to do this once)
-    ru1_complexes = place_complexes(args.num_ru1, 'Ru1', grid_size, core_center, 
-                                   args.core_radius, args.surface_thickness)
-    ru2_complexes = place_complexes(args.num_ru2, 'Ru2', grid_size, core_center, 
-                                   args.core_radius, args.surface_thickness)
-    
-    # Place O2 molecules
-    o2_molecules = place_oxygen_molecules(num_o2, grid_size, core_center, 
-                                         args.core_radius, args.density_steepness)
-    
-    # Run simulation without visualization
-    for step in range(args.steps):
-        # 1. Excite complexes
-        for ru in ru1_complexes + ru2_complexes:
-            ru.excite(args.excitation_prob, args.excited_lifetime)
+def run_config(args, num_o2, seed=None):
+    """SimulationConfig of a run at one O2 count"""
+    return SimulationConfig.from_args(args, num_o2=int(num_o2), o2_placement='density', seed=seed)
 
-        # 2. Move Oxygen
-        for o2 in o2_molecules:
-            o2.move(grid_size, core_center, args.core_radius, args.density_steepness, 
-                   args.o2_prob_min, args.o2_prob_max)
+def run_single_simulation(args, num_o2, seed):
+    """Run a single simulation with specified O2 count and random seed"""
+    config = run_config(args, num_o2, seed)
+    sim = Simulation(config, random.Random(seed)).run(args.steps)
+    return sim.get_simulated_qy('Ru1'), sim.get_simulated_qy('Ru2'), len(sim.o2_molecules)
 
-        # 3. Check for Quenching
-        for ru in ru1_complexes + ru2_complexes:
-            if ru.state == 'excited':
-                for o2 in o2_molecules:
-                    dist_sq = (ru.x - o2.x)**2 + (ru.y - o2.y)**2
-                    if dist_sq < args.quenching_radius ** 2:
-                        ru.quench(math.sqrt(dist_sq))
-                        o2.record_quench()
-                        break  # Quenched
+def run_replicate(args, num_o2, seed):
+    """Run one replicate at an O2 count (process-pool entry point)"""
+    ru1_qy, ru2_qy, actual_o2 = run_single_simulation(args, num_o2, seed)
+    return {'ru1_qy': ru1_qy, 'ru2_qy': ru2_qy, 'actual_o2': actual_o2}
 
-        # 4. Ru complexes evolve (timer/emission)
-        for ru in ru1_complexes + ru2_complexes:
-            ru.step()
-    
-    # Calculate QY values
-    ru1_emissions = sum(c.emission_count for c in ru1_complexes)
-    ru1_quenched = sum(c.quenched_count for c in ru1_complexes)
-    ru1_total_events = ru1_emissions + ru1_quenched
-    simulated_qy_ru1 = ru1_emissions / ru1_total_events if ru1_total_events > 0 else 0
-    
-    ru2_emissions = sum(c.emission_count for c in ru2_complexes)
-    ru2_quenched = sum(c.quenched_count for c in ru2_complexes)
-    ru2_total_events = ru2_emissions + ru2_quenched
-    simulated_qy_ru2 = ru2_emissions / ru2_total_events if ru2_total_events > 0 else 0
-    
-    return simulated_qy_ru1, simulated_qy_ru2, len(o2_molecules)
+def point_result(point, runner):
+    """Mean QYs of an O2 count's replicates with their standard errors and CIs"""
+    summary = runner.summary(point)
+    result = {'ru1_qy': summary['ru1_qy']['mean'], 'ru2_qy': summary['ru2_qy']['mean'],
+              'actual_o2': int(round(np.mean(point.values('actual_o2')))), 'replicates': len(point)}
+    for name in ('ru1', 'ru2'):
+        qy = summary[f'{name}_qy']
+        # Single replicates have no error estimate
+        for key in ('sem', 'ci_low', 'ci_high'):
+            result[f'{name}_{key}'] = qy[key] if len(point) > 1 else None
+    return result
+
+def format_result(result):
+    """One-line summary of an O2 count's result"""
+    if result['replicates'] > 1:
+        return (f"Ru1 QY = {result['ru1_qy']:.4f} [{result['ru1_ci_low']:.4f}, {result['ru1_ci_high']:.4f}], "
+                f"Ru2 QY = {result['ru2_qy']:.4f} [{result['ru2_ci_low']:.4f}, {result['ru2_ci_high']:.4f}] "
+                f"({result['replicates']} replicates)")
+    return f"Ru1 QY = {result['ru1_qy']:.4f}, Ru2 QY = {result['ru2_qy']:.4f}, Actual O2 = {result['actual_o2']}"
+
+def run_o2_points(args, o2_counts, runner, cache, code_version, settings, start_time):
+    """Run (or load from the cache) the given O2 counts; returns {num_o2: result}"""
+    results = {}
+    cache_keys = {}
+    points = []
+    for num_o2 in o2_counts:
+        run_params = {name: getattr(args, name) for name in MODEL_PARAMETERS}
+        run_params['num_o2'] = int(num_o2)
+        run_seed = seed_for_params(args.seed, run_params)
+        if cache is not None:
+            # The key holds the full config actually run (replicate seeds derive from run_seed)
+            key_params = dict(asdict(run_config(args, num_o2)), steps=args.steps, **settings)
+            cache_keys[num_o2] = cache.make_key(key_params, run_seed, code_version)
+            cached = cache.get(cache_keys[num_o2])
+            if cached is not None:
+                results[num_o2] = cached
+                print(f"\n{num_o2} O2 molecules loaded from cache")
+                print(f"  Results: {format_result(cached)}")
+                continue
+        points.append((num_o2, (args, num_o2), run_seed))
+    
+    # The replicates of all O2 counts share the runner's process pool (if any)
+    for point in runner.run(points):
+        num_o2 = point.key
+        results[num_o2] = point_result(point, runner)
+        if cache is not None:
+            cache.put(cache_keys[num_o2], results[num_o2])
+        print(f"\n{num_o2} O2 molecules done after {time.time() - start_time:.2f} seconds")
+        print(f"  Results: {format_result(results[num_o2])}")
+    return results
+
+def interval_errors(o2_counts, results):
+    """Estimated error of linear interpolation on each interval between neighbouring O2 counts.
+
+    The error on an interval of width h is about h^2 / 8 * |f''|, with f''
+    (of the Ru1 or Ru2 QY, whichever is larger) estimated from second
+    divided differences at the interval's end points.
+    """
+    x = np.asarray(o2_counts, dtype=float)
+    if len(x) < 3:
+        return np.full(max(0, len(x) - 1), np.inf)  # No curvature estimate yet
+    errors = np.zeros(len(x) - 1)
+    for name in ('ru1_qy', 'ru2_qy'):
+        y = np.array([results[n][name] for n in o2_counts])
+        slopes = np.diff(y) / np.diff(x)
+        curvature = np.zeros(len(x))
+        curvature[1:-1] = np.abs(2 * np.diff(slopes) / (x[2:] - x[:-2]))
+        # End intervals only have an inner neighbour
+        curvature[0], curvature[-1] = curvature[1], curvature[-2]
+        h = np.diff(x)
+        errors = np.maximum(errors, h ** 2 / 8 * np.maximum(curvature[:-1], curvature[1:]))
+    return errors
+
+def interval_noise(o2_counts, results):
+    """Mean CI half-width of each interval's end points (0 without replicates)"""
+    half_widths = []
+    for n in o2_counts:
+        result = results[n]
+        if result['replicates'] > 1:
+            half_widths.append(max((result[f'{name}_ci_high'] - result[f'{name}_ci_low']) / 2 for name in ('ru1', 'ru2')))
+        else:
+            half_widths.append(0.0)
+    half_widths = np.array(half_widths)
+    return (half_widths[:-1] + half_widths[1:]) / 2
+
+def run_adaptive_points(args, runner, cache, code_version, settings, start_time):
+    """Refine the O2 grid where the QY curve bends, until the budget or tolerance is reached.
+
+    Starts from the coarse --o2-steps grid and repeatedly bisects the
+    intervals with the largest estimated interpolation error. Intervals
+    whose error is below --adaptive-tol, or below the CI half-width of their
+    end points (refining noise does not help), are left alone. All points
+    run so far are kept, and every point is cached under the same key as
+    in the fixed-grid mode.
+    """
+    o2_counts = sorted(set(np.linspace(args.min_o2, args.max_o2, args.o2_steps, dtype=int).tolist()))
+    results = run_o2_points(args, o2_counts, runner, cache, code_version, settings, start_time)
+    batch_size = max(1, args.workers)
+    refinement = 0
+    while len(results) < args.max_points:
+        o2_counts = sorted(results)
+        errors = interval_errors(o2_counts, results)
+        threshold = np.maximum(args.adaptive_tol, interval_noise(o2_counts, results))
+        candidates = [(errors[i], i) for i in range(len(errors))
+                      if errors[i] > threshold[i] and o2_counts[i + 1] - o2_counts[i] >= 2]
+        if not candidates:
+            print("\nAll intervals are within the tolerance")
+            break
+        # Bisect the worst intervals (one batch keeps all workers busy)
+        candidates.sort(reverse=True)
+        count = min(batch_size, args.max_points - len(results), len(candidates))
+        new_counts = [(o2_counts[i] + o2_counts[i + 1]) // 2 for _, i in candidates[:count]]
+        refinement += 1
+        print(f"\nRefinement {refinement}: largest interpolation error {candidates[0][0]:.4f}, "
+              f"adding O2 counts {sorted(new_counts)}")
+        results.update(run_o2_points(args, new_counts, runner, cache, code_version, settings, start_time))
+    return results
 
 # --- Main Function ---
 def run_o2_concentration_study(args):
@@ -313,39 +286,56 @@ def run_o2_concentration_study(args):
     print(f"\nStarting O2 concentration vs QY study ({args.min_o2} to {args.max_o2} O2 molecules)")
     print("=" * 50)
     
-    # Generate O2 counts to test
-    o2_counts = np.linspace(args.min_o2, args.max_o2, args.o2_steps, dtype=int)
-    
-    # Arrays to store results
-    actual_o2_counts = []
-    ru1_qy_values = []
-    ru2_qy_values = []
-    
-    # Run simulations for each O2 concentration
+    # Completed points are reused from the result cache (decided before a missing seed is drawn)
+    cache = cache_from_args(args)
+    code_version = model_version()
+
+    # One independent child seed per O2 concentration (replicates are spawned from it)
+    args.seed = resolve_seed(args.seed)
+    print(f"Base random seed: {args.seed}")
+    settings = ensemble_settings(args)
+    if settings['max_replicates'] > 1:
+        print(f"Replicates per O2 count: {settings['min_replicates']}-{settings['max_replicates']}, "
+              f"target CI half-width: {settings['target_ci']}")
+    
+    # Run the replicates of all O2 counts (on a process pool if requested)
     total_start_time = time.time()
-    
-    for i, num_o2 in enumerate(o2_counts):
-        print(f"\nRunning simulation {i+1}/{len(o2_counts)}: {num_o2} O2 molecules")
-        start_time = time.time()
-        
-        # Run simulation and collect results
-        ru1_qy, ru2_qy, actual_o2 = run_single_simulation(args, num_o2)
-        
-        # Store results
-        actual_o2_counts.append(actual_o2)
-        ru1_qy_values.append(ru1_qy)
-        ru2_qy_values.append(ru2_qy)
-        
-        # Print progress
-        elapsed = time.time() - start_time
-        print(f"  Completed in {elapsed:.2f} seconds")
-        print(f"  Results: Ru1 QY = {ru1_qy:.4f}, Ru2 QY = {ru2_qy:.4f}, Actual O2 = {actual_o2}")
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    runner = EnsembleRunner(run_replicate, ('ru1_qy', 'ru2_qy'), settings['min_replicates'], settings['max_replicates'],
+                            settings['target_ci'], settings['confidence'], settings['ci_method'], executor)
+    try:
+        if args.adaptive:
+            print(f"Adaptive grid: {args.o2_steps} initial O2 counts, at most {args.max_points} in total")
+            results = run_adaptive_points(args, runner, cache, code_version, settings, total_start_time)
+        else:
+            # Generate O2 counts to test
+            # Rounding can repeat counts on narrow ranges; each count is run once
+            o2_counts = np.unique(np.linspace(args.min_o2, args.max_o2, args.o2_steps, dtype=int)).tolist()
+            results = run_o2_points(args, o2_counts, runner, cache, code_version, settings, total_start_time)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    results = [results[n] for n in sorted(results)]
+    print(f"\n{len(results)} O2 counts, {runner.replicates_run} simulations run")
+    
+    # Store results
+    actual_o2_counts = [result['actual_o2'] for result in results]
+    ru1_qy_values = [result['ru1_qy'] for result in results]
+    ru2_qy_values = [result['ru2_qy'] for result in results]
+    errors = None
+    if any(result['replicates'] > 1 for result in results):
+        errors = [{key: value for key, value in result.items() if key not in ('ru1_qy', 'ru2_qy', 'actual_o2')}
+                  for result in results]
+    
+    if cache is not None:
+        evicted = cache.evict()
+        print(f"\nCache: {cache.hits} hits, {cache.misses} misses, {evicted} old entries evicted")
     
     # Save results
-    json_file, csv_file = save_results(actual_o2_counts, ru1_qy_values, ru2_qy_values, args, args.save_path)
+    json_file, csv_file = save_results(actual_o2_counts, ru1_qy_values, ru2_qy_values, args, args.save_path, errors)
     
     # Plot results
-    plot_file = plot_results(actual_o2_counts, ru1_qy_values, ru2_qy_values, args.save_path)
+    plot_file = plot_results(actual_o2_counts, ru1_qy_values, ru2_qy_values, args.save_path, errors)
     
     # Print summary
     total_time = time.time() - total_start_time
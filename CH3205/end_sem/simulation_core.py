@@ -0,0 +1,743 @@
+import functools
+import math
+import random
+from collections import defaultdict
+from dataclasses import dataclass, fields
+from enum import Enum
+from time import perf_counter
+
+import numpy as np
+
+from boundaries import BOUNDARIES, boundary_position, minimum_image
+from cell_list import CellList
+from checkpoint import decode_json, encode_json
+from decomposed_engine import DecomposedSimulation
+from event_scheduler import EventScheduler
+from kmc_engine import KineticMonteCarloSimulation
+from move_table import DEFAULT_RESOLUTION, get_move_table, get_polymer_density_array
+from running_stats import RunningStats, distance_stats, lifetime_stats
+from stream_recorder import EMITTED_EVENT, EXCITED_EVENT, QUENCHED_EVENT
+from vectorized_engine import EXCITED, GROUND, VectorizedSimulation
+
+# --- Engines ---
+# 'object': per-object stepping, 'vectorized': NumPy arrays,
+# 'event': object model with excitations / emissions on an event queue,
+# 'kmc': continuous-time kinetic Monte Carlo (KineticMonteCarloSimulation),
+# 'decomposed': NumPy arrays split into strips stepped by `tiles` processes
+ENGINES = ('object', 'vectorized', 'event', 'kmc', 'decomposed')
+
+# --- Geometry ---
+# 'moore': every coordinate steps by -1, 0 or +1 (8 / 26 neighbours or stay),
+# 'axial': one step along one axis (4 / 6 neighbours); 3D and axial walks
+# run on the vectorized engine
+WALKS = ('moore', 'axial')
+BOUNDARY_ENGINES = ('object', 'event', 'vectorized')  # Engines supporting every boundary in BOUNDARIES
+
+# --- Placement ---
+MAX_PLACEMENT_CELLS = 4_000_000  # Cells of the O2 placement table (bounds its memory on huge grids)
+MAX_PLACEMENT_ROUNDS = 100  # Redraw rounds for complexes whose region extends past the grid
+
+# --- Configuration ---
+@dataclass
+class SimulationConfig:
+    """ Model parameters of one Ru/O2 quenching run.
+
+        o2_placement selects how O2 molecules are initially placed:
+        'density' accepts a point with probability equal to the polymer
+        density, 'outside_core' keeps only points with density < 0.3.
+
+        dimensions selects a 2D disk (the original model) or a 3D sphere:
+        the core/shell profile becomes spherical and O2 molecules walk on
+        a cubic lattice. walk is one of WALKS and boundary one of
+        BOUNDARIES (see boundaries.py); boundaries other than 'clamp' run on
+        the BOUNDARY_ENGINES.
+    """
+    grid_size: int = 100
+    core_radius: float = 15
+    surface_thickness: float = 5
+    num_ru1: int = 30
+    num_ru2: int = 30
+    num_o2: int = 180
+    excited_lifetime: int = 30
+    quenching_radius: float = 1.8
+    o2_prob_max: float = 0.98
+    o2_prob_min: float = 0.10
+    density_steepness: float = 0.3
+    excitation_prob: float = 1.0
+    o2_placement: str = 'density'
+    engine: str = 'object'
+    tiles: int = 1
+    dimensions: int = 2
+    walk: str = 'moore'
+    boundary: str = 'clamp'
+    seed: int = None
+
+    @classmethod
+    def from_args(cls, args, **overrides):
+        """ Builds a config from the matching attributes of an argparse namespace. """
+        values = {f.name: getattr(args, f.name) for f in fields(cls) if hasattr(args, f.name)}
+        values.update(overrides)
+        return cls(**values)
+
+    @property
+    def core_center(self):
+        return (self.grid_size / 2,) * self.dimensions
+
+# --- Populations and States ---
+class ComplexType(str, Enum):
+    """ Ru complex population; members are the strings 'Ru1' / 'Ru2', so comparisons, dict keys and JSON are unchanged. """
+    RU1 = 'Ru1'  # Surface
+    RU2 = 'Ru2'  # Core
+    __str__ = str.__str__
+
+STATE_NAMES = {GROUND: 'ground', EXCITED: 'excited'}
+STATE_CODES = {name: code for code, name in STATE_NAMES.items()}
+
+# --- Classes ---
+class RutheniumComplex:
+    """ Represents a Ruthenium complex molecule with enhanced tracking capabilities
+
+        Slotted, with the state kept as an integer code (GROUND / EXCITED,
+        as in the array engines); the `state` property still reads and
+        accepts 'ground' / 'excited'.
+    """
+    __slots__ = ('x', 'y', 'z', 'type', 'state_code', 'excited_timer', 'emission_count', 'quenched_count',
+                 'total_excitations', 'lifetime_stats', 'quencher_distance_stats', 'recorder', 'index')
+
+    def __init__(self, x, y, type, max_lifetime=30, quenching_radius=1.8, z=None):
+        self.x = x
+        self.y = y
+        self.z = z  # None in 2D
+        self.type = ComplexType(type)  # Ru1 (surface) or Ru2 (core)
+        self.state_code = GROUND
+        self.excited_timer = 0
+        self.emission_count = 0
+        self.quenched_count = 0
+        self.total_excitations = 0
+
+        # Enhanced tracking: online statistics only (full event
+        # histories are streamed to an attached StreamRecorder)
+        self.lifetime_stats = lifetime_stats(max_lifetime)  # Excited state durations
+        self.quencher_distance_stats = distance_stats(quenching_radius)  # Distances to quenchers when quenched
+        self.recorder = None
+        self.index = 0
+
+    @property
+    def state(self):
+        """ 'ground' or 'excited'. """
+        return STATE_NAMES[self.state_code]
+
+    @state.setter
+    def state(self, value):
+        self.state_code = STATE_CODES[value]
+
+    def attach_recorder(self, recorder, index):
+        """Stream this complex's events to recorder under the given index"""
+        self.recorder = recorder
+        self.index = index
+
+    def excite(self, excitation_prob=1.0, lifetime=30, rng=random):
+        """Excite the complex with given probability and lifetime (no random draw if certain)"""
+        if self.state_code == GROUND and (excitation_prob >= 1.0 or rng.random() < excitation_prob):
+            self.state_code = EXCITED
+            self.excited_timer = lifetime
+            self.total_excitations += 1
+            if self.recorder is not None:
+                self.recorder.record_event(self.index, EXCITED_EVENT)
+
+    def step(self):
+        """Update the complex state for one time step"""
+        if self.state_code == EXCITED:
+            self.excited_timer -= 1
+            if self.excited_timer <= 0:
+                self.emit()
+
+    def quench(self, quencher_distance=None):
+        """Quench the complex and record quenching event data"""
+        if self.state_code == EXCITED:
+            # Calculate lifetime that was achieved before quenching
+            achieved_lifetime = self.excited_timer
+            self.lifetime_stats.add(achieved_lifetime)
+
+            # Record quencher distance if provided
+            if quencher_distance is not None:
+                self.quencher_distance_stats.add(quencher_distance)
+            if self.recorder is not None:
+                self.recorder.record_event(self.index, QUENCHED_EVENT, achieved_lifetime, quencher_distance)
+
+            # Reset state
+            self.state_code = GROUND
+            self.excited_timer = 0
+            self.quenched_count += 1
+
+    def emit(self):
+        """Emit light and record emission event"""
+        if self.state_code == EXCITED:
+            # Calculate full lifetime that was achieved
+            achieved_lifetime = self.excited_timer
+            self.lifetime_stats.add(achieved_lifetime)
+            if self.recorder is not None:
+                self.recorder.record_event(self.index, EMITTED_EVENT, achieved_lifetime)
+
+            # Reset state
+            self.state_code = GROUND
+            self.excited_timer = 0
+            self.emission_count += 1
+
+    def get_simulated_qy(self):
+        """Calculate quantum yield from recorded events"""
+        total_events = self.emission_count + self.quenched_count
+        return self.emission_count / total_events if total_events > 0 else 0
+
+    def get_average_lifetime(self):
+        """Calculate average excited state lifetime across all events"""
+        return self.lifetime_stats.mean
+
+    def to_dict(self):
+        """Convert complex data to dictionary for serialization"""
+        return {
+            'type': self.type,
+            'position': (self.x, self.y) if self.z is None else (self.x, self.y, self.z),
+            'emissions': self.emission_count,
+            'quenched': self.quenched_count,
+            'total_excitations': self.total_excitations,
+            'avg_lifetime': self.get_average_lifetime(),
+            'lifetime_std': self.lifetime_stats.std,
+            'avg_quencher_distance': self.quencher_distance_stats.mean,
+            'quantum_yield': self.get_simulated_qy()
+        }
+
+class OxygenMolecule:
+    """ Represents an Oxygen molecule (quencher) with enhanced tracking. """
+    __slots__ = ('x', 'y', 'z', 'quench_count', 'path_length')
+
+    def __init__(self, x, y, z=None):
+        self.x = x
+        self.y = y
+        self.z = z  # None in 2D
+        self.quench_count = 0
+        self.path_length = 0
+
+    def move(self, grid_size, move_table, rng=random, boundary='clamp'):
+        """ Moves the oxygen molecule with density-dependent probability (see boundaries.py for boundary). """
+        # Store previous position
+        prev_x, prev_y = self.x, self.y
+
+        # Movement probability from the precomputed density table
+        move_prob = move_table.lookup(self.x, self.y)
+
+        if rng.random() < move_prob:
+            # Move one step in a random direction
+            dx = rng.choice([-1, 0, 1])
+            dy = rng.choice([-1, 0, 1])
+
+            if boundary == 'clamp':
+                # Apply boundary conditions (stay within grid)
+                new_x = max(0, min(grid_size - 1, self.x + dx))
+                new_y = max(0, min(grid_size - 1, self.y + dy))
+                self.x, self.y = new_x, new_y
+
+                # Calculate distance moved
+                dist_moved = math.sqrt((new_x - prev_x)**2 + (new_y - prev_y)**2)
+            else:
+                # The whole step is walked (through the wall, or up to the reservoir)
+                (self.x, self.y), _ = boundary_position((self.x + dx, self.y + dy), grid_size, boundary, rng)
+                dist_moved = math.sqrt(dx**2 + dy**2)
+            self.path_length += dist_moved
+
+    def record_quench(self):
+        """Record a quenching event by this O2 molecule"""
+        self.quench_count += 1
+
+    def get_average_velocity(self, time_steps):
+        """Calculate average velocity over simulation"""
+        return self.path_length / time_steps if time_steps > 0 else 0
+
+    def to_dict(self):
+        """Convert O2 data to dictionary for serialization"""
+        return {
+            'position': (self.x, self.y) if self.z is None else (self.x, self.y, self.z),
+            'quench_count': self.quench_count,
+            'path_length': self.path_length
+        }
+
+# --- Helper Functions ---
+def get_polymer_density(x, y, center, radius, steepness):
+    """ Calculates polymer density using a sigmoid-like function. """
+    dist = math.sqrt((x - center[0])**2 + (y - center[1])**2)
+    # Sigmoid function centered around 'radius'
+    exponent = steepness * (dist - radius)
+    # Clamp exponent to prevent overflow/underflow
+    exponent = max(-700, min(700, exponent))
+    return 1 / (1 + math.exp(exponent))
+
+def is_in_core_region(x, y, center, radius):
+    """ Checks if coordinates are within the core radius. """
+    return (x - center[0])**2 + (y - center[1])**2 < radius**2
+
+def get_qy(emissions, quenched):
+    """ Quantum yield from emission and quenching counts. """
+    total_events = emissions + quenched
+    return emissions / total_events if total_events > 0 else 0
+
+def _numpy_rng(rng):
+    """ NumPy generator seeded from a random.Random, so placement is reproducible from the run's seed. """
+    return np.random.default_rng(rng.getrandbits(64))
+
+def sample_annulus(gen, n, center, r_inner, r_outer):
+    """ n points uniform in the annulus r_inner <= r < r_outer around center (a disk if r_inner is 0).
+
+        Polar sampling: r = sqrt(U(r_inner^2, r_outer^2)) makes the density
+        uniform in area, so no draw is rejected.
+    """
+    r = np.sqrt(gen.uniform(r_inner ** 2, r_outer ** 2, n))
+    theta = gen.uniform(0, 2 * np.pi, n)
+    return center[0] + r * np.cos(theta), center[1] + r * np.sin(theta)
+
+def sample_shell(gen, n, center, r_inner, r_outer):
+    """ n points uniform in the spherical shell r_inner <= r < r_outer around a 3D center (a ball if r_inner is 0).
+
+        r = cbrt(U(r_inner^3, r_outer^3)) makes the density uniform in
+        volume; directions are normalized Gaussian vectors.
+    """
+    r = np.cbrt(gen.uniform(r_inner ** 3, r_outer ** 3, n))
+    direction = gen.standard_normal((3, n))
+    direction *= r / np.maximum(np.linalg.norm(direction, axis=0), 1e-300)
+    return tuple(c + d for c, d in zip(center, direction))
+
+@functools.lru_cache(maxsize=8)
+def get_placement_table(grid_size, core_center, core_radius, density_steepness, placement):
+    """ Returns (cells per side, cell size, cumulative cell weights) of the O2 start distribution.
+
+        The grid [0, grid_size - 1]^d (d = len(core_center)) is split into
+        square / cubic cells (finer than the unit lattice, capped at
+        MAX_PLACEMENT_CELLS); a cell's weight is the polymer density at its
+        centre ('density') or 1 where that density is below 0.3
+        ('outside_core').
+    """
+    dimensions = len(core_center)
+    extent = grid_size - 1
+    resolution = min(DEFAULT_RESOLUTION, MAX_PLACEMENT_CELLS ** (1 / dimensions) / max(extent, 1))
+    n = max(1, int(round(extent * resolution)))
+    cell = extent / n
+    centers = (np.arange(n) + 0.5) * cell
+    coords = np.meshgrid(*[centers] * dimensions, indexing='ij', sparse=True)
+    density = get_polymer_density_array(*coords[:2], core_center, core_radius, density_steepness,
+                                        *coords[2:])
+    weights = density if placement == 'density' else (density < 0.3).astype(np.float64)
+    cumulative = np.cumsum(weights.ravel())
+    cumulative.setflags(write=False)
+    return n, cell, cumulative
+
+def place_complexes(num, type, grid_size, core_center, core_radius, surface_thickness, rng=random,
+                    max_lifetime=30, quenching_radius=1.8):
+    """ Places Ru complexes uniformly in their region: the core (Ru2) or the surface shell (Ru1).
+
+        Points are drawn in batches by polar (2D) or spherical (3D, if
+        core_center has three coordinates) sampling; only points that fall
+        off the grid (if the region extends past it) are redrawn.
+    """
+    gen = _numpy_rng(rng)
+    r_inner, r_outer = ((core_radius, core_radius + surface_thickness) if type == ComplexType.RU1 else
+                        (0, core_radius))
+    sample = sample_shell if len(core_center) == 3 else sample_annulus
+    columns = [[np.empty(0)] for _ in core_center]
+    placed = 0
+    acceptance = 1.0
+    for _ in range(MAX_PLACEMENT_ROUNDS):
+        missing = num - placed
+        if missing <= 0:
+            break
+        batch = int(missing / max(acceptance, 0.01) * 1.1) + 1 if acceptance < 1 else missing
+        points = sample(gen, batch, core_center, r_inner, r_outer)
+        on_grid = np.logical_and.reduce([(c >= 0) & (c <= grid_size - 1) for c in points])
+        acceptance = on_grid.mean()
+        for column, c in zip(columns, points):
+            column.append(c[on_grid][:missing])
+        placed += len(columns[0][-1])
+
+    if placed < num:
+        print(f"Warning: Could only place {placed} of {num} desired {type} complexes.")
+    return [RutheniumComplex(x, y, type, max_lifetime, quenching_radius, *z)
+            for x, y, *z in zip(*[np.concatenate(column).tolist() for column in columns])]
+
+def place_oxygen_molecules(num_o2, grid_size, core_center, core_radius, density_steepness, rng=random,
+                           placement='density'):
+    """ Places O2 molecules weighted by polymer density ('density') or in low-density regions ('outside_core').
+
+        Inverse-CDF sampling: each molecule picks a cell of the placement
+        table with probability proportional to its weight, then a uniform
+        point inside it. Exactly num_o2 molecules are placed in one pass.
+    """
+    gen = _numpy_rng(rng)
+    n, cell, cumulative = get_placement_table(grid_size, tuple(core_center), core_radius, density_steepness,
+                                              placement)
+    if num_o2 <= 0 or cumulative[-1] <= 0:
+        if num_o2 > 0:
+            print(f"Warning: No room to place O2 molecules with placement '{placement}'.")
+        return []
+    cells = np.searchsorted(cumulative, gen.uniform(0, cumulative[-1], num_o2), side='right')
+    indices = np.unravel_index(np.minimum(cells, len(cumulative) - 1), (n,) * len(core_center))
+    coords = [((i + gen.random(num_o2)) * cell).tolist() for i in indices]
+    return [OxygenMolecule(*position) for position in zip(*coords)]
+
+# --- Observers ---
+class Observer:
+    """ Hook called by Simulation.run every `interval` steps and once when the run finishes. """
+    interval = 1
+
+    def on_step(self, sim):
+        pass
+
+    def on_finish(self, sim):
+        pass
+
+class ProgressObserver(Observer):
+    """ Prints the percentage of steps done with throughput and ETA, ten times per run. """
+    def __init__(self, total_steps, start_step=0):
+        self.total_steps = total_steps
+        self.interval = max(1, total_steps // 10)
+        self.start_step = start_step
+        self.start_time = perf_counter()
+
+    def on_step(self, sim):
+        elapsed = perf_counter() - self.start_time
+        rate = (sim.step_count - self.start_step) / elapsed if elapsed > 0 else 0.0
+        eta = (self.total_steps - sim.step_count) / rate if rate > 0 else 0.0
+        print(f"Progress: {sim.step_count / self.total_steps * 100:.1f}% ({rate:.0f} steps/s, ETA {eta:.1f} s)")
+
+# --- Simulation ---
+class Simulation:
+    """ One Ru/O2 quenching run with a single stepping API for every front end.
+
+        Places (or restores from a checkpoint state) the complexes and O2
+        molecules described by a SimulationConfig, then advances them with
+        the four phases of a time step (excite, move, quench, evolve) on the
+        object model or, with config.engine == 'vectorized', on the NumPy
+        engine. With config.engine == 'event', excitations and emissions come
+        from an EventScheduler, so per-step work is spent only on O2 motion
+        and on excited complexes. With config.dimensions == 3 (vectorized
+        engine only) the model is a spherical particle on a cubic lattice;
+        positions, plots and recordings then show the x / y projection.
+        Observers are called every
+        observer.interval steps. phase_times accumulates the seconds spent
+        in each phase (for telemetry).
+    """
+    def __init__(self, config, rng=None, recorder=None, observers=(), state=None):
+        if config.dimensions not in (2, 3):
+            raise ValueError(f"dimensions must be 2 or 3, got {config.dimensions}")
+        if config.walk not in WALKS:
+            raise ValueError(f"walk must be one of {WALKS}, got '{config.walk}'")
+        if (config.dimensions != 2 or config.walk != 'moore') and config.engine != 'vectorized':
+            raise ValueError(f"dimensions={config.dimensions} / walk='{config.walk}' needs the vectorized engine "
+                             f"(got '{config.engine}')")
+        if config.boundary not in BOUNDARIES:
+            raise ValueError(f"boundary must be one of {BOUNDARIES}, got '{config.boundary}'")
+        if config.boundary != 'clamp' and config.engine not in BOUNDARY_ENGINES:
+            raise ValueError(f"boundary='{config.boundary}' needs one of the engines {BOUNDARY_ENGINES} "
+                             f"(got '{config.engine}')")
+        self.config = config
+        self.rng = rng if rng is not None else random.Random(config.seed)
+        self.recorder = recorder
+        self.observers = list(observers)
+        self.step_count = 0
+        self.phase_times = defaultdict(float)
+        core_center = config.core_center
+        # Drawn before placement, which a resumed run skips (its key comes from the checkpoint)
+        counter_seed = self.rng.getrandbits(64) if config.engine == 'decomposed' else None
+
+        if state is not None:
+            self.ru1_complexes, self.ru2_complexes, self.o2_molecules = self._restore_objects(state)
+        else:
+            self.ru1_complexes = place_complexes(config.num_ru1, ComplexType.RU1, config.grid_size, core_center,
+                                                 config.core_radius, config.surface_thickness, self.rng,
+                                                 config.excited_lifetime, config.quenching_radius)
+            self.ru2_complexes = place_complexes(config.num_ru2, ComplexType.RU2, config.grid_size, core_center,
+                                                 config.core_radius, config.surface_thickness, self.rng,
+                                                 config.excited_lifetime, config.quenching_radius)
+            self.o2_molecules = place_oxygen_molecules(config.num_o2, config.grid_size, core_center,
+                                                       config.core_radius, config.density_steepness, self.rng,
+                                                       config.o2_placement)
+        self.all_complexes = self.ru1_complexes + self.ru2_complexes
+
+        # O2 move probabilities and spatial index for the quenching check
+        self.move_table = get_move_table(config.grid_size, core_center, config.core_radius,
+                                         config.density_steepness, config.o2_prob_min, config.o2_prob_max)
+        self.o2_cells = CellList(config.grid_size, config.quenching_radius,
+                                 [o.x for o in self.o2_molecules], [o.y for o in self.o2_molecules],
+                                 periodic=config.boundary == 'periodic')
+
+        if recorder is not None:
+            recorder.write_complexes([c.x for c in self.all_complexes], [c.y for c in self.all_complexes],
+                                     [c.type for c in self.all_complexes],
+                                     [c.z for c in self.all_complexes] if config.dimensions == 3 else None)
+        for i, c in enumerate(self.all_complexes):
+            c.attach_recorder(recorder, i)
+
+        self.engine = None
+        self.scheduler = None
+        if config.engine == 'event':
+            self.scheduler = EventScheduler(len(self.all_complexes), config.excitation_prob,
+                                            config.excited_lifetime, self.rng)
+            if state is None:
+                self.scheduler.start(0, range(len(self.all_complexes)))
+        elif config.engine in ('vectorized', 'kmc', 'decomposed'):
+            if config.engine == 'vectorized':
+                engine_class, engine_args = VectorizedSimulation, {'rng': _numpy_rng(self.rng),
+                                                                   'walk': config.walk, 'boundary': config.boundary}
+            elif config.engine == 'kmc':
+                engine_class, engine_args = KineticMonteCarloSimulation, {'rng': self.rng}
+            else:
+                engine_class, engine_args = DecomposedSimulation, {'seed': counter_seed, 'tiles': config.tiles}
+            self.engine = engine_class.from_objects(
+                self.all_complexes, self.o2_molecules,
+                grid_size=config.grid_size, core_center=core_center, core_radius=config.core_radius,
+                density_steepness=config.density_steepness, prob_min=config.o2_prob_min,
+                prob_max=config.o2_prob_max, excited_lifetime=config.excited_lifetime,
+                quenching_radius=config.quenching_radius, excitation_prob=config.excitation_prob,
+                recorder=recorder, move_table=self.move_table, **engine_args
+            )
+            self.phase_times = self.engine.phase_times
+        if state is not None:
+            self.set_state(state)
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    # --- Stepping ---
+    def _move_o2(self):
+        grid_size = self.config.grid_size
+        boundary = self.config.boundary
+        for i, o2 in enumerate(self.o2_molecules):
+            o2.move(grid_size, self.move_table, self.rng, boundary)
+            self.o2_cells.move(i, o2.x, o2.y)
+
+    def _quench(self, complexes):
+        """ Quenches excited complexes that have an O2 within the quenching radius (minimum image if periodic). """
+        quenching_radius_sq = self.config.quenching_radius ** 2
+        o2_molecules = self.o2_molecules
+        period = self.config.grid_size if self.config.boundary == 'periodic' else None
+        quenched = []
+        for ru in complexes:
+            if ru.state_code == EXCITED:
+                for i in self.o2_cells.candidates(ru.x, ru.y):
+                    o2 = o2_molecules[i]
+                    if period is None:
+                        dist_sq = (ru.x - o2.x)**2 + (ru.y - o2.y)**2
+                    else:
+                        dist_sq = minimum_image(ru.x - o2.x, period)**2 + minimum_image(ru.y - o2.y, period)**2
+                    if dist_sq < quenching_radius_sq:
+                        ru.quench(math.sqrt(dist_sq))
+                        o2.record_quench()
+                        quenched.append(ru)
+                        break  # Quenched
+        return quenched
+
+    def _step_objects(self):
+        config = self.config
+        phase_times = self.phase_times
+
+        # 1. Excite complexes
+        t0 = perf_counter()
+        for ru in self.all_complexes:
+            ru.excite(config.excitation_prob, config.excited_lifetime, self.rng)
+
+        # 2. Move Oxygen
+        t1 = perf_counter()
+        self._move_o2()
+
+        # 3. Check for Quenching (only O2 in the 3x3 neighbouring cells)
+        t2 = perf_counter()
+        self._quench(self.all_complexes)
+
+        # 4. Ru complexes evolve (timer/emission)
+        t3 = perf_counter()
+        for ru in self.all_complexes:
+            ru.step()
+        t4 = perf_counter()
+
+        phase_times['excite'] += t1 - t0
+        phase_times['move'] += t2 - t1
+        phase_times['quench'] += t3 - t2
+        phase_times['evolve'] += t4 - t3
+
+    def _step_events(self):
+        step = self.step_count
+        scheduler = self.scheduler
+        complexes = self.all_complexes
+        phase_times = self.phase_times
+
+        # 1. Excite complexes whose waiting time is up
+        t0 = perf_counter()
+        for i in scheduler.pop_excitations(step):
+            complexes[i].excite(1.0, self.config.excited_lifetime)
+
+        # 2. Move Oxygen
+        t1 = perf_counter()
+        self._move_o2()
+
+        # 3. Check for Quenching (excited complexes only)
+        t2 = perf_counter()
+        excited = sorted(scheduler.excited)
+        for i in excited:
+            complexes[i].excited_timer = scheduler.remaining(i, step)
+        for ru in self._quench([complexes[i] for i in excited]):
+            scheduler.schedule_excitation(ru.index, step)
+
+        # 4. Emit complexes whose lifetime ran out
+        t3 = perf_counter()
+        for i in scheduler.pop_emissions(step):
+            complexes[i].excited_timer = 0
+            complexes[i].emit()
+            scheduler.schedule_excitation(i, step)
+        t4 = perf_counter()
+
+        phase_times['excite'] += t1 - t0
+        phase_times['move'] += t2 - t1
+        phase_times['quench'] += t3 - t2
+        phase_times['evolve'] += t4 - t3
+
+    def _sync_timers(self):
+        """ Brings the excited timers of the event engine up to date (they are otherwise lazy). """
+        for i in self.scheduler.excited:
+            self.all_complexes[i].excited_timer = self.scheduler.remaining(i, self.step_count)
+
+    def step(self):
+        """ Advances the simulation by one time step and notifies due observers. """
+        if self.engine is not None:
+            self.engine.step()
+        else:
+            recorder = self.recorder
+            if recorder is not None:
+                recorder.set_step(self.step_count)
+            if self.scheduler is not None:
+                self._step_events()
+            else:
+                self._step_objects()
+            if recorder is not None and recorder.wants_positions(self.step_count):
+                record_start = perf_counter()
+                recorder.record_positions(self.step_count, [o.x for o in self.o2_molecules],
+                                          [o.y for o in self.o2_molecules])
+                self.phase_times['record'] += perf_counter() - record_start
+        self.step_count += 1
+        observers_start = perf_counter()
+        for observer in self.observers:
+            if self.step_count % observer.interval == 0:
+                observer.on_step(self)
+        self.phase_times['observers'] += perf_counter() - observers_start
+
+    def run(self, steps):
+        """ Runs until `steps` time steps are done in total (resumed runs continue), then finishes. """
+        while self.step_count < steps:
+            self.step()
+        self.finish()
+        return self
+
+    def finish(self):
+        """ Copies engine state back onto the objects and notifies observers. """
+        if self.engine is not None:
+            self.engine.write_back(self.all_complexes, self.o2_molecules)
+        elif self.scheduler is not None:
+            self._sync_timers()
+        for observer in self.observers:
+            observer.on_finish(self)
+
+    # --- Current State ---
+    def get_o2_positions(self):
+        """ Returns the O2 (x, y) coordinate arrays (the x / y projection in 3D). """
+        if self.engine is not None:
+            return self.engine.o2_x, self.engine.o2_y
+        return np.array([o.x for o in self.o2_molecules]), np.array([o.y for o in self.o2_molecules])
+
+    def get_o2_coordinates(self):
+        """ Returns the O2 coordinate arrays: (x, y), or (x, y, z) in 3D. """
+        if self.engine is not None:
+            return self.engine.o2_coordinates() if hasattr(self.engine, 'o2_coordinates') else (
+                self.engine.o2_x, self.engine.o2_y)
+        return self.get_o2_positions()
+
+    def get_excited(self):
+        """ Returns the excited flag of every complex (Ru1 first, then Ru2). """
+        if self.engine is not None:
+            return self.engine.state == EXCITED
+        return np.array([c.state_code == EXCITED for c in self.all_complexes], dtype=bool)
+
+    def get_type_counts(self, type):
+        """ Returns (emissions, quenched) summed over complexes of one type. """
+        if self.engine is not None:
+            return self.engine.get_type_counts(type)
+        complexes = self.ru1_complexes if type == ComplexType.RU1 else self.ru2_complexes
+        return sum(c.emission_count for c in complexes), sum(c.quenched_count for c in complexes)
+
+    def get_simulated_qy(self, type):
+        """ Calculates the quantum yield of one complex type. """
+        return get_qy(*self.get_type_counts(type))
+
+    # --- Checkpointing ---
+    def get_state(self):
+        """ Returns a copy of the full run state (including RNG state) as a dict of arrays. """
+        if self.engine is not None:
+            state = self.engine.get_state()
+        else:
+            if self.scheduler is not None:
+                self._sync_timers()
+            complexes, o2_molecules = self.all_complexes, self.o2_molecules
+            state = {
+                'ru_x': np.array([c.x for c in complexes]),
+                'ru_y': np.array([c.y for c in complexes]),
+                'ru_type': np.array([c.type for c in complexes]),
+                'state': np.array([c.state_code for c in complexes], dtype=np.int8),
+                'excited_timer': np.array([c.excited_timer for c in complexes], dtype=np.int64),
+                'emission_count': np.array([c.emission_count for c in complexes], dtype=np.int64),
+                'quenched_count': np.array([c.quenched_count for c in complexes], dtype=np.int64),
+                'total_excitations': np.array([c.total_excitations for c in complexes], dtype=np.int64),
+                'lifetime_stats': np.array([c.lifetime_stats.get_state() for c in complexes]),
+                'distance_stats': np.array([c.quencher_distance_stats.get_state() for c in complexes]),
+                'o2_x': np.array([o.x for o in o2_molecules]),
+                'o2_y': np.array([o.y for o in o2_molecules]),
+                'o2_quench_count': np.array([o.quench_count for o in o2_molecules], dtype=np.int64),
+                'o2_path_length': np.array([o.path_length for o in o2_molecules]),
+                'rng_state': encode_json(self.rng.getstate())
+            }
+            if self.scheduler is not None:
+                state.update(self.scheduler.get_state())
+        state['step'] = np.array(self.step_count)
+        return state
+
+    def set_state(self, state):
+        """ Restores a state returned by get_state (continues bit-identically). """
+        self.step_count = int(state['step'])
+        if self.engine is not None:
+            self.engine.set_state(state)
+            return
+        for i, c in enumerate(self.all_complexes):
+            c.state_code = EXCITED if state['state'][i] else GROUND
+            c.excited_timer = int(state['excited_timer'][i])
+            c.emission_count = int(state['emission_count'][i])
+            c.quenched_count = int(state['quenched_count'][i])
+            c.total_excitations = int(state['total_excitations'][i])
+            c.lifetime_stats = RunningStats.from_state(state['lifetime_stats'][i])
+            c.quencher_distance_stats = RunningStats.from_state(state['distance_stats'][i])
+        for i, o2 in enumerate(self.o2_molecules):
+            o2.x = float(state['o2_x'][i])
+            o2.y = float(state['o2_y'][i])
+            o2.quench_count = int(state['o2_quench_count'][i])
+            o2.path_length = float(state['o2_path_length'][i])
+        self.o2_cells = CellList(self.config.grid_size, self.config.quenching_radius,
+                                 state['o2_x'], state['o2_y'], periodic=self.config.boundary == 'periodic')
+        version, internal_state, gauss_next = decode_json(state['rng_state'])
+        self.rng.setstate((version, tuple(internal_state), gauss_next))
+        if self.scheduler is not None:
+            self.scheduler.set_state(state)
+
+    def _restore_objects(self, state):
+        """ Rebuilds Ru and O2 objects (positions and types) from a state. """
+        config = self.config
+        ru_z = state['ru_z'].tolist() if 'ru_z' in state else [None] * len(state['ru_x'])
+        o2_z = state['o2_z'].tolist() if 'o2_z' in state else [None] * len(state['o2_x'])
+        ru1_complexes, ru2_complexes = [], []
+        for x, y, z, type in zip(state['ru_x'].tolist(), state['ru_y'].tolist(), ru_z, state['ru_type'].tolist()):
+            (ru1_complexes if type == ComplexType.RU1 else ru2_complexes).append(
+                RutheniumComplex(x, y, type, config.excited_lifetime, config.quenching_radius, z))
+        o2_molecules = [OxygenMolecule(x, y, z) for x, y, z in zip(state['o2_x'].tolist(), state['o2_y'].tolist(), o2_z)]
+        return ru1_complexes, ru2_complexes, o2_molecules
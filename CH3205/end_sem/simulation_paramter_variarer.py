@@ -1,10 +1,19 @@
 import numpy as np
 import random
 import time
-import math
 import csv # Added for CSV output
 import itertools # Added for parameter combinations
 import os # Added to manage file paths
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+
+from move_table import MOVE_TABLE_CACHE_SIZE, get_move_table
+from ensemble import EnsembleRunner, add_ensemble_arguments, ensemble_settings
+from result_cache import add_cache_arguments, cache_from_args, model_version
+from seeding import resolve_seed, seed_for_params
+from sweep_design import DESIGNS, make_design
+from simulation_core import Simulation, SimulationConfig
 
 # --- Simulation Parameters (Defaults - some will be overridden by sweep) ---
 GRID_SIZE = 50
@@ -31,249 +40,278 @@ param_sweep_config = {
     # Add other parameters here if desired, e.g., 'CORE_RADIUS': [10, 15, 20]
 }
 
+# Parameter ranges for the space-filling designs (--design lhs/sobol/halton);
+# integer bounds give integer values. The run count is set by --budget, so
+# adding parameters here does not multiply it.
+param_range_config = {
+    'NUM_O2': (100, 250),
+    'DENSITY_STEEPNESS': (0.2, 0.5),
+    'O2_MOVE_PROB_MIN': (0.05, 0.15),
+    'EXCITED_LIFETIME': (20, 40),
+    'CORE_RADIUS': (10, 20),
+    'QUENCHING_RADIUS': (1.4, 2.2)
+}
+
 # --- File Output Configuration ---
 RESULTS_FILENAME = 'simulation_results.csv'
 
 # --- Disable Visualization for Batch Runs ---
 VISUALIZE = False # Keep False for parameter sweeps
 
-# --- Classes (RutheniumComplex, OxygenMolecule) ---
-# Unchanged from the previous version - keeping them internal for clarity
-class RutheniumComplex:
-    """ Represents a Ruthenium complex molecule. """
-    def __init__(self, x, y, type):
-        self.x = x
-        self.y = y
-        self.type = type # 'Ru1' (surface) or 'Ru2' (core)
-        self.state = 'ground'
-        self.excited_timer = 0
-        self.emission_count = 0
-        self.quenched_count = 0
-        # Removed total_excitations as it's not directly used in final QY calc
-
-    def excite(self, lifetime):
-        if self.state == 'ground':
-            self.state = 'excited'
-            self.excited_timer = lifetime # Use passed lifetime
-
-    def step(self):
-        if self.state == 'excited':
-            self.excited_timer -= 1
-            if self.excited_timer <= 0:
-                self.emit()
-
-    def quench(self):
-        if self.state == 'excited':
-            self.state = 'ground'
-            self.excited_timer = 0
-            self.quenched_count += 1
-
-    def emit(self):
-        if self.state == 'excited':
-            self.state = 'ground'
-            self.excited_timer = 0
-            self.emission_count += 1
-
-    def get_simulated_qy(self):
-        total_events = self.emission_count + self.quenched_count
-        return self.emission_count / total_events if total_events > 0 else 0
-
-class OxygenMolecule:
-    """ Represents an Oxygen molecule (quencher). """
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-
-    def move(self, grid_size, core_center, core_radius, density_steepness, prob_min, prob_max):
-        """ Moves the oxygen molecule randomly, hindered by polymer density. """
-        density = get_polymer_density(self.x, self.y, core_center, core_radius, density_steepness)
-        move_prob = prob_max - density * (prob_max - prob_min)
-        move_prob = max(prob_min, min(prob_max, move_prob))
-
-        if random.random() < move_prob:
-            dx = random.choice([-1, 0, 1])
-            dy = random.choice([-1, 0, 1])
-            new_x = max(0, min(grid_size - 1, self.x + dx))
-            new_y = max(0, min(grid_size - 1, self.y + dy))
-            self.x = new_x
-            self.y = new_y
-
-# --- Helper Functions (get_polymer_density, is_in_core_region, place_complexes) ---
-# Unchanged from the previous version
-def get_polymer_density(x, y, center, radius, steepness):
-    """ Calculates a simulated polymer density based on distance from the center. """
-    dist = math.sqrt((x - center[0])**2 + (y - center[1])**2)
-    # Sigmoid function centered around 'radius'
-    # Added small epsilon to prevent potential math domain error if dist exactly equals radius and steepness is high
-    exponent = steepness * (dist - radius)
-    # Clamp exponent to prevent overflow/underflow with large steepness/distance
-    exponent = max(-700, min(700, exponent))
-    try:
-        density = 1 / (1 + math.exp(exponent))
-    except OverflowError:
-        # If exp(exponent) is too large, density is effectively 0
-        density = 0.0
-    return density
-
-def is_in_core_region(x, y, center, radius):
-    """ Checks if coordinates (x, y) are within the nominal core radius (for placement). """
-    return (x - center[0])**2 + (y - center[1])**2 < radius**2
-
-def place_complexes(num, type, grid_size, core_center, core_radius, surface_thickness):
-    """ Places Ru complexes either in the core region or near the surface region. """
-    complexes = []
-    attempts = 0
-    max_attempts = num * 300
-    surface_outer_radius = core_radius + surface_thickness
-
-    while len(complexes) < num and attempts < max_attempts:
-        attempts += 1
-        x = random.uniform(0, grid_size - 1)
-        y = random.uniform(0, grid_size - 1)
-        in_core_flag = is_in_core_region(x, y, core_center, core_radius)
-        dist_from_center = math.sqrt((x - core_center[0])**2 + (y - core_center[1])**2)
-
-        if type == 'Ru1' and not in_core_flag and dist_from_center < surface_outer_radius:
-            complexes.append(RutheniumComplex(x, y, type))
-        elif type == 'Ru2' and in_core_flag:
-            complexes.append(RutheniumComplex(x, y, type))
-
-    if len(complexes) < num:
-        print(f"  Warning: Could only place {len(complexes)} of {num} desired {type} complexes.")
-    return complexes
-
 # --- Simulation Function ---
-def run_simulation(params):
-    """ Runs a single simulation with the given parameters. """
-    # Unpack parameters, using defaults if not provided in sweep
-    num_o2 = params.get('NUM_O2', NUM_O2)
-    density_steepness = params.get('DENSITY_STEEPNESS', DENSITY_STEEPNESS)
-    o2_move_prob_min = params.get('O2_MOVE_PROB_MIN', O2_MOVE_PROB_MIN)
-    excited_lifetime = params.get('EXCITED_LIFETIME', EXCITED_LIFETIME)
-    # Use other defaults
-    grid_size = GRID_SIZE
-    core_radius = CORE_RADIUS
-    surface_thickness = SURFACE_THICKNESS
-    num_ru1 = NUM_RU1
-    num_ru2 = NUM_RU2
-    simulation_steps = SIMULATION_STEPS
-    quenching_radius_sq = QUENCHING_RADIUS_SQ
-    o2_move_prob_max = O2_MOVE_PROB_MAX
-
-    core_center = (grid_size / 2, grid_size / 2)
+def run_simulation(params, rng=random):
+    """ Runs a single simulation with the given parameters, drawing from rng. """
+    # Sweep values over the module defaults
+    full_params = get_full_params(params)
+    config = make_config(full_params)
 
     # Setup simulation environment for this run
-    ru1_complexes = place_complexes(num_ru1, 'Ru1', grid_size, core_center, core_radius, surface_thickness)
-    ru2_complexes = place_complexes(num_ru2, 'Ru2', grid_size, core_center, core_radius, surface_thickness)
-    all_complexes = ru1_complexes + ru2_complexes
-
-    o2_molecules = []
-    attempts = 0
-    max_attempts = num_o2 * 100
-    while len(o2_molecules) < num_o2 and attempts < max_attempts:
-        attempts += 1
-        x = random.uniform(0, grid_size - 1)
-        y = random.uniform(0, grid_size - 1)
-        if get_polymer_density(x, y, core_center, core_radius, density_steepness) < 0.3:
-             o2_molecules.append(OxygenMolecule(x, y))
-    # Add warning if placement failed significantly
-    if len(o2_molecules) < num_o2 * 0.8: # If less than 80% placed
-        print(f"  Warning: Could only place {len(o2_molecules)} of {num_o2} O2 molecules initially for this run.")
-
+    sim = Simulation(config, rng)
 
     # Check if complexes were placed
-    if not ru1_complexes or not ru2_complexes:
+    if not sim.ru1_complexes or not sim.ru2_complexes:
         print("  Error: Failed to place Ru complexes. Skipping this run.")
         return None # Indicate failure
 
     # Simulation Loop for this run
-    for step in range(simulation_steps):
-        for ru in all_complexes: ru.excite(excited_lifetime) # Pass lifetime
-        for o2 in o2_molecules: o2.move(grid_size, core_center, core_radius, density_steepness, o2_move_prob_min, o2_move_prob_max)
-        for ru in all_complexes:
-            if ru.state == 'excited':
-                for o2 in o2_molecules:
-                    dist_sq = (ru.x - o2.x)**2 + (ru.y - o2.y)**2
-                    if dist_sq < quenching_radius_sq:
-                        ru.quench()
-                        break
-        for ru in all_complexes: ru.step()
-
-    # Calculate results for this run
-    ru1_emissions = sum(c.emission_count for c in ru1_complexes)
-    ru1_quenched = sum(c.quenched_count for c in ru1_complexes)
-    ru1_total_events = ru1_emissions + ru1_quenched
-    simulated_qy_ru1 = ru1_emissions / ru1_total_events if ru1_total_events > 0 else 0
-
-    ru2_emissions = sum(c.emission_count for c in ru2_complexes)
-    ru2_quenched = sum(c.quenched_count for c in ru2_complexes)
-    ru2_total_events = ru2_emissions + ru2_quenched
-    simulated_qy_ru2 = ru2_emissions / ru2_total_events if ru2_total_events > 0 else 0
+    sim.run(full_params['SIMULATION_STEPS'])
 
     # Return results including parameters used
+    ru1_emissions, ru1_quenched = sim.get_type_counts('Ru1')
+    ru2_emissions, ru2_quenched = sim.get_type_counts('Ru2')
     result_data = params.copy() # Start with the input params
-    result_data['Simulated_QY_Ru1'] = simulated_qy_ru1
-    result_data['Simulated_QY_Ru2'] = simulated_qy_ru2
-    result_data['Ru1_Events'] = ru1_total_events # Optional: track total events
-    result_data['Ru2_Events'] = ru2_total_events # Optional: track total events
+    result_data['Simulated_QY_Ru1'] = sim.get_simulated_qy('Ru1')
+    result_data['Simulated_QY_Ru2'] = sim.get_simulated_qy('Ru2')
+    result_data['Ru1_Events'] = ru1_emissions + ru1_quenched # Optional: track total events
+    result_data['Ru2_Events'] = ru2_emissions + ru2_quenched # Optional: track total events
 
     return result_data
 
 
+# --- Sweep Execution ---
+def make_config(full_params):
+    """ SimulationConfig of a run from its complete parameter set. """
+    return SimulationConfig(
+        grid_size=full_params['GRID_SIZE'], core_radius=full_params['CORE_RADIUS'],
+        surface_thickness=full_params['SURFACE_THICKNESS'], num_ru1=full_params['NUM_RU1'],
+        num_ru2=full_params['NUM_RU2'], num_o2=full_params['NUM_O2'], excited_lifetime=full_params['EXCITED_LIFETIME'],
+        quenching_radius=full_params['QUENCHING_RADIUS'], o2_prob_max=full_params['O2_MOVE_PROB_MAX'],
+        o2_prob_min=full_params['O2_MOVE_PROB_MIN'], density_steepness=full_params['DENSITY_STEEPNESS'],
+        o2_placement='outside_core' # O2 starts in low-density regions
+    )
+
+def cache_params(full_params, settings):
+    """ Inputs that determine a point's result: the full config run, the step count and the ensemble settings. """
+    return dict(asdict(make_config(full_params)), steps=full_params['SIMULATION_STEPS'], **settings)
+
+def get_full_params(params):
+    """ Returns the complete parameter set of a run (sweep values over the module defaults). """
+    full_params = {
+        'GRID_SIZE': GRID_SIZE, 'CORE_RADIUS': CORE_RADIUS, 'SURFACE_THICKNESS': SURFACE_THICKNESS,
+        'NUM_RU1': NUM_RU1, 'NUM_RU2': NUM_RU2, 'NUM_O2': NUM_O2, 'SIMULATION_STEPS': SIMULATION_STEPS,
+        'EXCITED_LIFETIME': EXCITED_LIFETIME, 'QUENCHING_RADIUS': QUENCHING_RADIUS,
+        'O2_MOVE_PROB_MAX': O2_MOVE_PROB_MAX, 'O2_MOVE_PROB_MIN': O2_MOVE_PROB_MIN,
+        'DENSITY_STEEPNESS': DENSITY_STEEPNESS
+    }
+    full_params.update(params)
+    return full_params
+
+def run_replicate(run_params, seed):
+    """ Runs one replicate of a parameter combination on its own seeded RNG stream (process-pool entry point). """
+    return run_simulation(run_params, random.Random(seed)) # Each replicate gets an independent, reproducible stream
+
+def ensemble_result(run_params, point, runner):
+    """ Result row of a parameter combination: replicate means with their standard errors and CIs. """
+    if not point.results:
+        return None
+    summary = runner.summary(point)
+    result = run_params.copy()
+    for complex_type in ('Ru1', 'Ru2'):
+        qy = summary[f'Simulated_QY_{complex_type}']
+        result[f'Simulated_QY_{complex_type}'] = qy['mean']
+        # Single replicates have no error estimate
+        for column, name in (('SEM', 'sem'), ('CI_Low', 'ci_low'), ('CI_High', 'ci_high')):
+            result[f'QY_{complex_type}_{column}'] = qy[name] if len(point) > 1 else None
+        result[f'{complex_type}_Events'] = float(np.mean(point.values(f'{complex_type}_Events')))
+    result['Replicates'] = len(point)
+    return result
+
+def format_qy(result, complex_type):
+    """ Formats a mean QY with its CI half-width (if there is one). """
+    qy = result[f'Simulated_QY_{complex_type}']
+    if result[f'QY_{complex_type}_SEM'] is None:
+        return f"{qy:.4f}"
+    half_width = (result[f'QY_{complex_type}_CI_High'] - result[f'QY_{complex_type}_CI_Low']) / 2
+    return f"{qy:.4f} ± {half_width:.4f}"
+
+def load_points(filename):
+    """ Reads explicit sweep points from a CSV (e.g. surrogate.py proposals).
+
+        Columns named like module parameters (NUM_O2, EXCITED_LIFETIME, ...)
+        are used; other columns such as predictions are ignored.
+    """
+    with open(filename, newline='') as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        return [], []
+    param_names = [name for name in rows[0] if name in get_full_params({})]
+    param_combinations = []
+    for row in rows:
+        values = [float(row[name]) for name in param_names]
+        param_combinations.append(tuple(int(v) if v.is_integer() else v for v in values))
+    return param_names, param_combinations
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Ruthenium Complex QY Parameter Sweep')
+    parser.add_argument('--points', type=str, default=None,
+                        help='CSV of parameter points to run instead of the param_sweep_config grid')
+    parser.add_argument('--output', type=str, default=RESULTS_FILENAME, help='Results CSV file')
+    parser.add_argument('--design', choices=DESIGNS, default='grid',
+                        help='Sweep design: full factorial over param_sweep_config, or space-filling over param_range_config')
+    parser.add_argument('--budget', type=int, default=64, help='Number of points of a space-filling design')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes for the sweep')
+    parser.add_argument('--seed', type=int, default=None, help='Base random seed (random if omitted)')
+    add_ensemble_arguments(parser)
+    add_cache_arguments(parser)
+    return parser.parse_args()
+
 # --- Main Execution Block ---
 if __name__ == "__main__":
+    args = parse_arguments()
     overall_start_time = time.time()
     all_results = []
 
-    # Generate all combinations of parameters
-    param_names = list(param_sweep_config.keys())
-    param_values = list(param_sweep_config.values())
-    param_combinations = list(itertools.product(*param_values))
-    total_runs = len(param_combinations)
-
-    print(f"--- Starting Parameter Sweep ---")
-    print(f"Total simulation runs planned: {total_runs}")
-    print(f"Results will be saved to: {RESULTS_FILENAME}")
-    print(f"Parameters being varied: {param_names}")
+    # Per-point seeds depend only on the base seed and the parameter values,
+    # so the results do not depend on the number of workers or the sweep layout
+    base_seed = resolve_seed(args.seed)
 
-    # Run simulations for each combination
+    # Generate the design's parameter combinations (or read the given points)
+    if args.points:
+        param_names, param_combinations = load_points(args.points)
+    else:
+        param_names, param_combinations = make_design(args.design, param_sweep_config, param_range_config,
+                                                      args.budget, base_seed)
+    total_runs = len(param_combinations)
+    settings = ensemble_settings(args)
+    tasks = []
     for i, combo in enumerate(param_combinations):
         run_params = dict(zip(param_names, combo))
-        print(f"\nRunning simulation {i+1}/{total_runs} with parameters:")
-        print(f"  {run_params}")
-        run_start_time = time.time()
-
-        # Execute the simulation
-        result = run_simulation(run_params)
-
-        run_end_time = time.time()
-        print(f"  Run {i+1} finished in {run_end_time - run_start_time:.2f} seconds.")
+        tasks.append((i, run_params, seed_for_params(base_seed, get_full_params(run_params))))
+
+    # Look up every point in the result cache; only the misses are simulated
+    cache = cache_from_args(args)
+    code_version = model_version()
+    cache_keys = {}
+    cached_results = []
+    pending_tasks = tasks
+    if cache is not None:
+        pending_tasks = []
+        for task in tasks:
+            index, run_params, task_seed = task
+            cache_keys[index] = cache.make_key(cache_params(get_full_params(run_params), settings), task_seed, code_version)
+            cached = cache.get(cache_keys[index])
+            if cached is not None:
+                cached_results.append((index, run_params, cached))
+            else:
+                pending_tasks.append(task)
+    cached_indices = {index for index, _, _ in cached_results}
 
-        if result:
-            all_results.append(result)
-            print(f"  Results: QY_Ru1={result['Simulated_QY_Ru1']:.4f}, QY_Ru2={result['Simulated_QY_Ru2']:.4f}")
+    print(f"--- Starting Parameter Sweep ---")
+    print(f"Total parameter combinations planned: {total_runs}")
+    print(f"Results will be saved to: {args.output}")
+    print(f"Parameters being varied: {param_names}")
+    print(f"Design: {'points from ' + args.points if args.points else args.design}")
+    print(f"Workers: {args.workers}, Base seed: {base_seed}")
+    print(f"Replicates per point: {settings['min_replicates']}-{settings['max_replicates']}, "
+          f"target CI half-width: {settings['target_ci']}")
+    print(f"Cached points reused: {len(cached_results)}, points to simulate: {len(pending_tasks)}")
+
+    # Define CSV header based on the parameter names + calculated results
+    fieldnames = param_names + ['Simulated_QY_Ru1', 'Simulated_QY_Ru2', 'Ru1_Events', 'Ru2_Events',
+                                'QY_Ru1_SEM', 'QY_Ru1_CI_Low', 'QY_Ru1_CI_High',
+                                'QY_Ru2_SEM', 'QY_Ru2_CI_Low', 'QY_Ru2_CI_High', 'Replicates']
+
+    # Results are streamed to a partial file in completion order as they finish
+    partial_filename = args.output + '.partial'
+    with open(partial_filename, 'w', newline='') as partial_file:
+        partial_writer = csv.DictWriter(partial_file, fieldnames=['Run_Index'] + fieldnames, extrasaction='ignore')
+        partial_writer.writeheader()
+
+        if args.workers > 1:
+            # Build the (read-only) move tables once in the parent so forked
+            # workers share them instead of each rebuilding them; a sweep over
+            # more parameter sets than the table cache holds (e.g. a continuous
+            # design) leaves them to be built lazily in the workers
+            table_keys = set()
+            for _, run_params, _ in pending_tasks:
+                full_params = get_full_params(run_params)
+                table_keys.add((full_params['GRID_SIZE'], (full_params['GRID_SIZE'] / 2, full_params['GRID_SIZE'] / 2),
+                                full_params['CORE_RADIUS'], full_params['DENSITY_STEEPNESS'],
+                                full_params['O2_MOVE_PROB_MIN'], full_params['O2_MOVE_PROB_MAX']))
+            if len(table_keys) <= MOVE_TABLE_CACHE_SIZE:
+                for key in table_keys:
+                    get_move_table(*key)
+            executor = ProcessPoolExecutor(max_workers=args.workers)
         else:
-            print(f"  Run {i+1} failed or produced no results.")
+            executor = None
+
+        # Replicates of all pending points share the pool; each point stops
+        # adding replicates once its QY CIs are narrower than the target
+        runner = EnsembleRunner(run_replicate, ('Simulated_QY_Ru1', 'Simulated_QY_Ru2'),
+                                settings['min_replicates'], settings['max_replicates'], settings['target_ci'],
+                                settings['confidence'], settings['ci_method'], executor)
+        run_params_by_index = {index: run_params for index, run_params, _ in pending_tasks}
+        point_start_time = time.time()
+        completed = ((point.key, run_params_by_index[point.key],
+                      ensemble_result(run_params_by_index[point.key], point, runner))
+                     for point in runner.run((index, (run_params,), task_seed)
+                                             for index, run_params, task_seed in pending_tasks))
+        completed = itertools.chain(cached_results, completed)
 
+        try:
+            for n_done, (index, run_params, result) in enumerate(completed, start=1):
+                if index in cached_indices:
+                    print(f"\nPoint {index+1}/{total_runs} loaded from cache ({n_done}/{total_runs} done):")
+                else:
+                    print(f"\nPoint {index+1}/{total_runs} finished, {time.time() - point_start_time:.2f} seconds "
+                          f"into the sweep ({n_done}/{total_runs} done):")
+                print(f"  {run_params}")
+                if result:
+                    if cache is not None and index not in cached_indices:
+                        cache.put(cache_keys[index], result)
+                    all_results.append((index, result))
+                    partial_writer.writerow(dict(result, Run_Index=index))
+                    partial_file.flush()
+                    print(f"  Results: QY_Ru1={format_qy(result, 'Ru1')}, QY_Ru2={format_qy(result, 'Ru2')} "
+                          f"({result['Replicates']} replicates)")
+                else:
+                    print(f"  Point {index+1} failed or produced no results.")
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    print(f"Replicates simulated: {runner.replicates_run}")
+    if cache is not None:
+        evicted = cache.evict()
+        print(f"Cache: {cache.hits} hits, {cache.misses} misses, {evicted} old entries evicted")
 
     print(f"\n--- Parameter Sweep Finished ---")
 
-    # Save results to CSV file
+    # Save results to CSV file, in combination order
     if not all_results:
         print("No results were generated, skipping CSV file writing.")
     else:
-        # Define CSV header based on the keys in the first result dictionary
-        # Ensure consistent order by using the parameter names + calculated results
-        fieldnames = param_names + ['Simulated_QY_Ru1', 'Simulated_QY_Ru2', 'Ru1_Events', 'Ru2_Events']
-        # Make sure all keys exist in the results (handle potential missing optional keys)
-        # fieldnames = list(all_results[0].keys()) # Alternative if all keys are guaranteed
+        all_results.sort(key=lambda item: item[0])
 
-        print(f"\nSaving {len(all_results)} results to {RESULTS_FILENAME}...")
+        print(f"\nSaving {len(all_results)} results to {args.output}...")
         try:
-            with open(RESULTS_FILENAME, 'w', newline='') as csvfile:
+            tmp_filename = args.output + '.tmp'
+            with open(tmp_filename, 'w', newline='') as csvfile:
                 writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore') # Ignore extra keys if any
                 writer.writeheader()
-                writer.writerows(all_results)
+                writer.writerows(result for _, result in all_results)
+            os.replace(tmp_filename, args.output)
+            os.remove(partial_filename)
             print("Results saved successfully.")
         except IOError as e:
             print(f"Error writing results to CSV file: {e}")
@@ -283,4 +321,3 @@ if __name__ == "__main__":
 
     overall_end_time = time.time()
     print(f"\nTotal execution time for all runs: {overall_end_time - overall_start_time:.2f} seconds")
-
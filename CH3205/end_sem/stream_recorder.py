@@ -0,0 +1,167 @@
+import glob
+import os
+
+import numpy as np
+
+# --- Event Kinds ---
+EXCITED_EVENT = 0
+EMITTED_EVENT = 1
+QUENCHED_EVENT = 2
+
+# Default number of buffered rows per chunk file
+DEFAULT_CHUNK_ROWS = 65536
+
+# --- Recorder ---
+class StreamRecorder:
+    """ Streams per-step events and sampled O2 trajectories to chunked columnar files.
+
+        Layout of a recording directory:
+            ru_positions.npz          x, y[, z], type of every complex (written once)
+            events/chunk_NNNNNN.npz   columns step, complex, kind, lifetime, distance
+            o2/chunk_NNNNNN.npz       columns step (n_samples,), x, y[, z] (n_samples, n_o2)
+
+        Rows are buffered in memory and written as one chunk file per
+        chunk_rows rows, so memory stays bounded for any run length. O2
+        positions are sampled every `stride` steps; z is stored for 3D runs.
+    """
+    def __init__(self, directory, stride=1, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.directory = directory
+        self.stride = max(1, stride)
+        self.chunk_rows = chunk_rows
+        self.step = 0
+        self._events = {'step': [], 'complex': [], 'kind': [], 'lifetime': [], 'distance': []}
+        self._o2_steps = []
+        self._o2_x = []
+        self._o2_y = []
+        self._o2_z = []
+        self._o2_rows = 0
+        self.event_chunks = 0
+        self.o2_chunks = 0
+        os.makedirs(os.path.join(directory, 'events'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'o2'), exist_ok=True)
+
+    def write_complexes(self, x, y, types, z=None):
+        """ Writes the (fixed) complex positions (z in 3D) and types. """
+        columns = {'x': np.asarray(x, dtype=np.float32), 'y': np.asarray(y, dtype=np.float32), 'type': np.asarray(types)}
+        if z is not None:
+            columns['z'] = np.asarray(z, dtype=np.float32)
+        np.savez(os.path.join(self.directory, 'ru_positions.npz'), **columns)
+
+    def set_step(self, step):
+        """ Sets the time step stamped on subsequent events. """
+        self.step = step
+
+    def record_event(self, complex_index, kind, lifetime=0, distance=np.nan):
+        """ Buffers one excitation / emission / quenching event. """
+        events = self._events
+        events['step'].append(self.step)
+        events['complex'].append(complex_index)
+        events['kind'].append(kind)
+        events['lifetime'].append(lifetime)
+        events['distance'].append(np.nan if distance is None else distance)
+        if len(events['step']) >= self.chunk_rows:
+            self._flush_events()
+
+    def record_events(self, complex_indices, kind, lifetimes=0, distances=np.nan):
+        """ Buffers a batch of events of one kind (array arguments, used by the vectorized engine). """
+        n = len(complex_indices)
+        if n == 0:
+            return
+        events = self._events
+        events['step'].extend([self.step] * n)
+        events['complex'].extend(np.asarray(complex_indices).tolist())
+        events['kind'].extend([kind] * n)
+        events['lifetime'].extend(np.broadcast_to(lifetimes, n).tolist())
+        events['distance'].extend(np.broadcast_to(distances, n).tolist())
+        if len(events['step']) >= self.chunk_rows:
+            self._flush_events()
+
+    def wants_positions(self, step):
+        """ Whether O2 positions should be sampled at this step. """
+        return step % self.stride == 0
+
+    def record_positions(self, step, x, y, z=None):
+        """ Buffers one sample of all O2 positions (z in 3D). """
+        self._o2_steps.append(step)
+        self._o2_x.append(np.asarray(x, dtype=np.float32))
+        self._o2_y.append(np.asarray(y, dtype=np.float32))
+        if z is not None:
+            self._o2_z.append(np.asarray(z, dtype=np.float32))
+        self._o2_rows += len(self._o2_x[-1])
+        if self._o2_rows >= self.chunk_rows:
+            self._flush_positions()
+
+    def _flush_events(self):
+        if not self._events['step']:
+            return
+        path = os.path.join(self.directory, 'events', f"chunk_{self.event_chunks:06d}.npz")
+        np.savez(path,
+                 step=np.array(self._events['step'], dtype=np.int64),
+                 complex=np.array(self._events['complex'], dtype=np.int32),
+                 kind=np.array(self._events['kind'], dtype=np.int8),
+                 lifetime=np.array(self._events['lifetime'], dtype=np.float32),
+                 distance=np.array(self._events['distance'], dtype=np.float32))
+        self.event_chunks += 1
+        for column in self._events.values():
+            column.clear()
+
+    def _flush_positions(self):
+        if not self._o2_steps:
+            return
+        path = os.path.join(self.directory, 'o2', f"chunk_{self.o2_chunks:06d}.npz")
+        columns = {'step': np.array(self._o2_steps, dtype=np.int64), 'x': np.stack(self._o2_x), 'y': np.stack(self._o2_y)}
+        if self._o2_z:
+            columns['z'] = np.stack(self._o2_z)
+        np.savez(path, **columns)
+        self.o2_chunks += 1
+        self._o2_steps, self._o2_x, self._o2_y, self._o2_z = [], [], [], []
+        self._o2_rows = 0
+
+    def flush(self):
+        """ Writes all buffered rows (returns the chunk counts, for checkpoints). """
+        self._flush_events()
+        self._flush_positions()
+        return self.event_chunks, self.o2_chunks
+
+    def resume(self, event_chunks, o2_chunks):
+        """ Continues a recording from a checkpoint, dropping chunks written after it. """
+        for subdir, keep in (('events', event_chunks), ('o2', o2_chunks)):
+            for path in glob.glob(os.path.join(self.directory, subdir, 'chunk_*.npz')):
+                if int(os.path.basename(path)[6:12]) >= keep:
+                    os.remove(path)
+        self.event_chunks = event_chunks
+        self.o2_chunks = o2_chunks
+
+    def close(self):
+        self.flush()
+
+# --- Readers ---
+def _read_chunks(directory, subdir):
+    paths = sorted(glob.glob(os.path.join(directory, subdir, 'chunk_*.npz')))
+    chunks = []
+    for path in paths:
+        with np.load(path) as data:
+            chunks.append({name: data[name] for name in data.files})
+    return chunks
+
+def read_events(directory):
+    """ Reads all event chunks of a recording into one dict of columns. """
+    chunks = _read_chunks(directory, 'events')
+    columns = ('step', 'complex', 'kind', 'lifetime', 'distance')
+    if not chunks:
+        return {name: np.zeros(0) for name in columns}
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in columns}
+
+def read_o2_trajectory(directory):
+    """ Reads all sampled O2 positions: returns (steps, x, y[, z]). """
+    chunks = _read_chunks(directory, 'o2')
+    if not chunks:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 0)), np.zeros((0, 0))
+    columns = ('step', 'x', 'y', 'z') if 'z' in chunks[0] else ('step', 'x', 'y')
+    return tuple(np.concatenate([chunk[name] for chunk in chunks]) for name in columns)
+
+def read_complexes(directory):
+    """ Reads the complex positions and types of a recording: returns (x, y[, z], type). """
+    with np.load(os.path.join(directory, 'ru_positions.npz')) as data:
+        columns = ('x', 'y', 'z', 'type') if 'z' in data.files else ('x', 'y', 'type')
+        return tuple(data[name] for name in columns)
@@ -0,0 +1,292 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.linalg import cho_solve, solve_triangular
+from scipy.optimize import minimize
+from scipy.stats import qmc
+
+# --- Defaults ---
+# Sweep parameters (those varied in a result file are used)
+PARAMETERS = ('NUM_O2', 'DENSITY_STEEPNESS', 'O2_MOVE_PROB_MIN', 'EXCITED_LIFETIME', 'CORE_RADIUS', 'QUENCHING_RADIUS')
+TARGETS = ('Simulated_QY_Ru1', 'Simulated_QY_Ru2')
+# Columns written by simulation_paramter_variarer.py with replicate ensembles
+SEM_COLUMNS = {'Simulated_QY_Ru1': 'QY_Ru1_SEM', 'Simulated_QY_Ru2': 'QY_Ru2_SEM'}
+# QY spans orders of magnitude, so it is modelled as log(QY + LOG_OFFSET)
+LOG_OFFSET = 1e-3
+RESTARTS = 4
+CANDIDATES = 4096
+
+# --- Gaussian Process ---
+class GaussianProcess:
+    """ Gaussian process regression with an anisotropic RBF kernel and noise.
+
+        Inputs are expected scaled to [0, 1]; targets are standardized
+        internally. The kernel length scales, signal variance and noise
+        variance are fitted by maximizing the log marginal likelihood.
+        Known per-point noise variances (e.g. squared standard errors of
+        replicate means) are added on top of the fitted noise.
+    """
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng(0)
+        self.theta = None  # log length scales..., log signal variance, log noise variance
+
+    def _kernel(self, a, b, theta):
+        length_scales = np.exp(theta[:-2])
+        diff = (a[:, None, :] - b[None, :, :]) / length_scales
+        return np.exp(theta[-2]) * np.exp(-0.5 * np.sum(diff ** 2, axis=-1))
+
+    def _neg_log_likelihood(self, theta, x, y, point_noise):
+        """ Negative log marginal likelihood and its gradient with respect to theta. """
+        n, d = x.shape
+        k_signal = self._kernel(x, x, theta)
+        k = k_signal + np.diag(np.exp(theta[-1]) + point_noise)
+        try:
+            chol = np.linalg.cholesky(k)
+        except np.linalg.LinAlgError:
+            return 1e25, np.zeros_like(theta)
+        alpha = cho_solve((chol, True), y)
+        nll = 0.5 * y @ alpha + np.log(np.diag(chol)).sum() + 0.5 * n * np.log(2 * np.pi)
+
+        # d NLL / d theta_j = -1/2 tr((alpha alpha^T - K^-1) dK/dtheta_j)
+        inner = np.outer(alpha, alpha) - cho_solve((chol, True), np.eye(n))
+        grad = np.empty_like(theta)
+        length_scales = np.exp(theta[:-2])
+        for j in range(d):
+            sq_dist = (x[:, None, j] - x[None, :, j]) ** 2 / length_scales[j] ** 2
+            grad[j] = -0.5 * np.sum(inner * k_signal * sq_dist)
+        grad[-2] = -0.5 * np.sum(inner * k_signal)
+        grad[-1] = -0.5 * np.trace(inner) * np.exp(theta[-1])
+        return nll, grad
+
+    def fit(self, x, y, point_noise=None):
+        """ Fits the hyperparameters and conditions the process on (x, y). """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.y_mean = y.mean()
+        self.y_scale = y.std() or 1.0
+        y_scaled = (y - self.y_mean) / self.y_scale
+        noise = np.zeros(len(y)) if point_noise is None else np.asarray(point_noise) / self.y_scale ** 2
+
+        d = x.shape[1]
+        bounds = [(np.log(0.1), np.log(1e2))] * d + [(np.log(1e-2), np.log(1e2)), (np.log(1e-6), np.log(1.0))]
+        best = None
+        for restart in range(RESTARTS):
+            if restart == 0:
+                start = np.concatenate([np.full(d, np.log(0.5)), [0.0, np.log(1e-2)]])
+            else:
+                start = np.array([self.rng.uniform(low, high) for low, high in bounds])
+            result = minimize(self._neg_log_likelihood, start, args=(x, y_scaled, noise), jac=True,
+                              method='L-BFGS-B', bounds=bounds)
+            if best is None or result.fun < best.fun:
+                best = result
+        self.theta = best.x
+        self.log_likelihood = -best.fun
+        self._condition(x, y_scaled, noise)
+        return self
+
+    def _condition(self, x, y_scaled, noise):
+        self.x = x
+        self.y_scaled = y_scaled
+        self.noise = noise
+        k = self._kernel(x, x, self.theta) + np.diag(np.exp(self.theta[-1]) + noise)
+        self.chol = np.linalg.cholesky(k)
+        self.alpha = cho_solve((self.chol, True), y_scaled)
+        # Explicit inverse factor: predicting is then two small matrix products
+        self.chol_inv = solve_triangular(self.chol, np.eye(len(x)), lower=True)
+
+    def predict(self, x, include_noise=False):
+        """ Returns the predictive mean and standard deviation at the rows of x. """
+        x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+        k_star = self._kernel(x, self.x, self.theta)
+        mean = k_star @ self.alpha
+        v = self.chol_inv @ k_star.T
+        var = np.exp(self.theta[-2]) - np.sum(v ** 2, axis=0)
+        if include_noise:
+            var = var + np.exp(self.theta[-1])
+        std = np.sqrt(np.maximum(var, 0.0))
+        return mean * self.y_scale + self.y_mean, std * self.y_scale
+
+    def conditioned_on(self, x_new):
+        """ Copy that also treats x_new as observed (at its predicted mean).
+
+            The predictive variance does not depend on the observed values,
+            so this shows how much simulating x_new would reduce the
+            uncertainty elsewhere.
+        """
+        mean, _ = self.predict(x_new)
+        other = GaussianProcess(self.rng)
+        other.theta = self.theta
+        other.y_mean, other.y_scale = self.y_mean, self.y_scale
+        other._condition(np.vstack([self.x, x_new]),
+                         np.concatenate([self.y_scaled, (mean - self.y_mean) / self.y_scale]),
+                         np.concatenate([self.noise, np.zeros(len(x_new))]))
+        return other
+
+# --- Surrogate ---
+def load_results(paths, targets=TARGETS):
+    """ Concatenates sweep result CSVs, keeping rows that have all targets. """
+    frames = [pd.read_csv(path) for path in paths]
+    df = pd.concat(frames, ignore_index=True)
+    missing = [column for column in targets if column not in df.columns]
+    if missing:
+        raise ValueError(f"Result files lack the columns {missing}")
+    return df.dropna(subset=list(targets)).reset_index(drop=True)
+
+def varied_parameters(df, parameters=PARAMETERS):
+    """ Sweep parameters that take more than one value in the results. """
+    return [name for name in parameters if name in df.columns and df[name].nunique() > 1]
+
+class Surrogate:
+    """ Emulator of the sweep: one Gaussian process per QY target.
+
+        Parameters are scaled to [0, 1] with the bounds of the training data
+        (or the given bounds). Parameters whose training values are all
+        integers are proposed as integers. The processes model log(QY +
+        LOG_OFFSET); predictions are transformed back to the median and
+        standard deviation of the resulting log-normal QY.
+    """
+    def __init__(self, parameters=PARAMETERS, targets=TARGETS, seed=0):
+        self.parameters = tuple(parameters)
+        self.targets = tuple(targets)
+        self.seed = seed
+        self.models = {}
+
+    def _scale(self, points):
+        return (np.asarray(points, dtype=np.float64) - self.lower) / (self.upper - self.lower)
+
+    def fit(self, df, bounds=None):
+        """ Fits one process per target on a DataFrame of sweep results. """
+        x = df[list(self.parameters)].to_numpy(dtype=np.float64)
+        if bounds is None:
+            bounds = np.column_stack([x.min(axis=0), x.max(axis=0)])
+        self.lower, self.upper = np.asarray(bounds, dtype=np.float64).T
+        self.upper = np.where(self.upper > self.lower, self.upper, self.lower + 1)
+        self.integer = np.all(x == np.round(x), axis=0)
+        self.n_train = len(df)
+        rng = np.random.default_rng(self.seed)
+        for target in self.targets:
+            y = df[target].to_numpy(dtype=np.float64)
+            noise = None
+            if SEM_COLUMNS.get(target) in df.columns:
+                # Standard errors propagated to log space
+                noise = (df[SEM_COLUMNS[target]].fillna(0.0).to_numpy() / (y + LOG_OFFSET)) ** 2
+            self.models[target] = GaussianProcess(rng).fit(self._scale(x), np.log(y + LOG_OFFSET), noise)
+        return self
+
+    def predict(self, points, include_noise=False):
+        """ Returns {target: (median, std)} at the given parameter points (rows).
+
+            With include_noise, std covers the run-to-run scatter of a single
+            simulation as well as the uncertainty of the emulator.
+        """
+        x = self._scale(np.atleast_2d(points))
+        predictions = {}
+        for target, model in self.models.items():
+            mu, sigma = model.predict(x, include_noise)
+            median = np.exp(mu) - LOG_OFFSET
+            std = np.sqrt(np.expm1(sigma ** 2)) * np.exp(mu + sigma ** 2 / 2)
+            predictions[target] = (median, std)
+        return predictions
+
+    def propose(self, n, candidates=CANDIDATES):
+        """ Proposes n parameter points whose simulation would be most informative.
+
+            Candidates are drawn from a scrambled Sobol sequence over the
+            bounds. Points are picked greedily by the largest predictive
+            standard deviation of log QY (summed over targets, relative to
+            each target's spread); after each pick the processes are conditioned
+            on it, so a batch spreads out instead of clustering.
+        """
+        sampler = qmc.Sobol(len(self.parameters), seed=self.seed)
+        points = qmc.scale(sampler.random(candidates), self.lower, self.upper)
+        points[:, self.integer] = np.round(points[:, self.integer])
+        points = np.unique(points, axis=0)
+        x = self._scale(points)
+        models = dict(self.models)
+        chosen = []
+        for _ in range(min(n, len(points))):
+            score = sum(model.predict(x)[1] / model.y_scale for model in models.values())
+            score[chosen] = -np.inf
+            best = int(np.argmax(score))
+            chosen.append(best)
+            models = {target: model.conditioned_on(x[best:best + 1]) for target, model in models.items()}
+        return points[chosen]
+
+    def cross_validate(self, df, folds=5):
+        """ K-fold cross-validation; returns {target: (rmse, fraction of held-out values within 2 std)}. """
+        order = np.random.default_rng(self.seed).permutation(len(df))
+        errors = {target: [] for target in self.targets}
+        z_scores = {target: [] for target in self.targets}
+        for fold in np.array_split(order, folds):
+            train = df.drop(index=df.index[fold])
+            model = Surrogate(self.parameters, self.targets, self.seed).fit(train, np.column_stack([self.lower, self.upper]))
+            predictions = model.predict(df.iloc[fold][list(self.parameters)].to_numpy(), include_noise=True)
+            for target, (mean, std) in predictions.items():
+                observed = df.iloc[fold][target].to_numpy()
+                errors[target].extend(mean - observed)
+                z_scores[target].extend(np.abs(mean - observed) / np.maximum(std, 1e-12))
+        return {target: (float(np.sqrt(np.mean(np.square(errors[target])))),
+                         float(np.mean(np.array(z_scores[target]) <= 2)))
+                for target in self.targets}
+
+# --- Helper Functions ---
+def parse_point(text, parameters):
+    """ Parses 'NAME=value,NAME=value' into a parameter vector (all parameters required). """
+    values = dict(item.split('=', 1) for item in text.split(','))
+    missing = [name for name in parameters if name not in values]
+    if missing:
+        raise ValueError(f"Point '{text}' lacks values for {missing}")
+    return [float(values[name]) for name in parameters]
+
+def proposals_frame(surrogate, points):
+    """ DataFrame of proposed points with the surrogate's predictions (readable by the sweep's --points). """
+    df = pd.DataFrame(points, columns=list(surrogate.parameters))
+    for name, integer in zip(surrogate.parameters, surrogate.integer):
+        if integer:
+            df[name] = df[name].astype(int)
+    for target, (mean, std) in surrogate.predict(points).items():
+        df[f'Predicted_{target}'] = mean
+        df[f'Predicted_{target}_Std'] = std
+    return df
+
+# --- Main Entry Point ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gaussian process surrogate of the Ru QY parameter sweep')
+    parser.add_argument('results', nargs='+', help='Sweep result CSVs (simulation_paramter_variarer.py output)')
+    parser.add_argument('--predict', action='append', default=[],
+                        help="Point to predict, e.g. 'NUM_O2=150,DENSITY_STEEPNESS=0.25,...' (repeatable)")
+    parser.add_argument('--propose', type=int, default=0, help='Number of new points to propose')
+    parser.add_argument('--proposals', type=str, default='proposed_points.csv', help='Output CSV for proposed points')
+    parser.add_argument('--cv-folds', type=int, default=0, help='Report k-fold cross-validation error')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for optimizer restarts and candidate points')
+    args = parser.parse_args()
+
+    df = load_results(args.results)
+    start_time = time.time()
+    surrogate = Surrogate(varied_parameters(df), seed=args.seed).fit(df)
+    print(f"Fitted on {len(df)} runs in {time.time() - start_time:.2f} seconds")
+    for target, model in surrogate.models.items():
+        length_scales = ', '.join(f"{name}={scale:.3g}" for name, scale in zip(surrogate.parameters, np.exp(model.theta[:-2])))
+        print(f"  {target}: log likelihood {model.log_likelihood:.1f}, length scales (scaled units) {length_scales}")
+
+    if args.cv_folds:
+        for target, (rmse, coverage) in surrogate.cross_validate(df, args.cv_folds).items():
+            print(f"  {target}: {args.cv_folds}-fold CV RMSE {rmse:.4f}, {coverage:.0%} of held-out runs within 2 std")
+
+    if args.predict:
+        points = np.array([parse_point(text, surrogate.parameters) for text in args.predict])
+        start_time = time.perf_counter()
+        predictions = surrogate.predict(points)
+        elapsed = time.perf_counter() - start_time
+        for i, text in enumerate(args.predict):
+            summary = ', '.join(f"{target} = {mean[i]:.4f} ± {std[i]:.4f}" for target, (mean, std) in predictions.items())
+            print(f"{text}: {summary}")
+        print(f"Prediction time: {elapsed / len(points) * 1e6:.0f} µs per point")
+
+    if args.propose:
+        proposals = proposals_frame(surrogate, surrogate.propose(args.propose))
+        proposals.to_csv(args.proposals, index=False)
+        print(f"Proposed {len(proposals)} points, saved to: {args.proposals}")
+        print(proposals.to_string(index=False))
@@ -0,0 +1,45 @@
+import itertools
+import warnings
+
+import numpy as np
+from scipy.stats import qmc
+
+# --- Designs ---
+DESIGNS = ('grid', 'lhs', 'sobol', 'halton')
+SAMPLERS = {'lhs': qmc.LatinHypercube, 'sobol': qmc.Sobol, 'halton': qmc.Halton}
+
+def grid_design(grid_config):
+    """ Full factorial design: every combination of the listed values. """
+    names = list(grid_config)
+    return names, list(itertools.product(*grid_config.values()))
+
+def space_filling_design(range_config, design, budget, seed=None):
+    """ Space-filling design of `budget` points over {name: (low, high)} ranges.
+
+        'lhs' is a Latin hypercube (every parameter's range is split into
+        budget strata, each hit once); 'sobol' and 'halton' are scrambled
+        low-discrepancy sequences. Parameters whose bounds are both
+        integers take integer values. The run count is the budget,
+        whatever the number of parameters.
+    """
+    names = list(range_config)
+    low, high = np.array([range_config[name] for name in names], dtype=np.float64).T
+    sampler = SAMPLERS[design](len(names), seed=seed)
+    with warnings.catch_warnings():
+        # Sobol' points are best balanced at powers of 2, but any budget is valid
+        warnings.simplefilter('ignore', UserWarning)
+        unit = sampler.random(budget)
+    points = qmc.scale(unit, low, high)
+    integer = [isinstance(range_config[name][0], int) and isinstance(range_config[name][1], int) for name in names]
+    combinations = []
+    for row in points:
+        combinations.append(tuple(int(round(v)) if is_int else float(v) for v, is_int in zip(row, integer)))
+    return names, combinations
+
+def make_design(design, grid_config, range_config, budget, seed=None):
+    """ Returns (parameter names, list of value tuples) of the chosen design. """
+    if design == 'grid':
+        return grid_design(grid_config)
+    if design not in SAMPLERS:
+        raise ValueError(f"Unknown design '{design}' (choose from {DESIGNS})")
+    return space_filling_design(range_config, design, budget, seed)
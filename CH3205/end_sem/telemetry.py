@@ -0,0 +1,156 @@
+import json
+import os
+import socket
+import sys
+import time
+from urllib.parse import urlparse
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from simulation_core import Observer
+
+# --- Helper Functions ---
+def current_rss_bytes():
+    """ Resident set size of this process (peak RSS where /proc is not available). """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # bytes on macOS, KiB on Linux
+
+def frame_time_summary(frame_times):
+    """ Count, mean / max frame time (ms) and frame rate of a list of frame durations (s). """
+    if not frame_times:
+        return None
+    mean = sum(frame_times) / len(frame_times)
+    return {'count': len(frame_times), 'mean_ms': mean * 1000, 'max_ms': max(frame_times) * 1000,
+            'fps': 1 / mean if mean > 0 else None}
+
+# --- Sink ---
+class JsonLinesSink:
+    """ Writes one JSON object per line to a file, stdout or a socket.
+
+        target is a file path (appended to), '-' for stdout, or
+        tcp://host:port / udp://host:port for a collector. If writing fails
+        (e.g. the collector went away) telemetry is switched off with a
+        warning instead of stopping the simulation.
+    """
+    def __init__(self, target):
+        self.target = target
+        self._file = None
+        self._socket = None
+        self._address = None
+        url = urlparse(target)
+        if target == '-':
+            self._file = sys.stdout
+        elif url.scheme == 'tcp':
+            self._socket = socket.create_connection((url.hostname, url.port), timeout=5)
+        elif url.scheme == 'udp':
+            family, _, _, _, self._address = socket.getaddrinfo(url.hostname, url.port, type=socket.SOCK_DGRAM)[0]
+            self._socket = socket.socket(family, socket.SOCK_DGRAM)
+        else:
+            self._file = open(target, 'a', buffering=1)
+
+    def write(self, record):
+        if self._file is None and self._socket is None:
+            return
+        line = json.dumps(record) + '\n'
+        try:
+            if self._file is not None:
+                self._file.write(line)
+                self._file.flush()
+            elif self._address is not None:
+                self._socket.sendto(line.encode(), self._address)
+            else:
+                self._socket.sendall(line.encode())
+        except OSError as e:
+            print(f"Warning: telemetry to {self.target} failed ({e}); telemetry disabled.")
+            self.close()
+
+    def close(self):
+        if self._file is not None and self._file is not sys.stdout:
+            self._file.close()
+        if self._socket is not None:
+            self._socket.close()
+        self._file = None
+        self._socket = None
+
+# --- Telemetry Observer ---
+class TelemetryObserver(Observer):
+    """ Emits performance telemetry of a running Simulation as JSON lines.
+
+        Every `interval` steps (and once at the end) a record is written
+        with the step, throughput (steps/s overall and since the last
+        record, molecule updates/s - every O2 molecule and complex is
+        updated once per step, or KMC events/s), the cumulative time per
+        step phase, the process RSS and the ETA. With frame_times (the
+        animation's list of frame durations), frame-time statistics of the
+        frames drawn since the last record are included.
+    """
+    def __init__(self, sink, sim, total_steps, interval=None, frame_times=None):
+        self.sink = sink
+        self.total_steps = total_steps
+        self.interval = interval or max(1, total_steps // 100)
+        self.frame_times = frame_times
+        self.start_time = self.last_time = time.perf_counter()
+        self.start_step = self.last_step = sim.step_count
+        self.start_updates = self.last_updates = self._updates(sim)
+        self.frames_seen = 0
+
+    @staticmethod
+    def _updates(sim):
+        """ Molecule updates so far: KMC events, or every molecule once per step. """
+        events = getattr(sim.engine, 'events_done', None)
+        if events is not None:
+            return events
+        return sim.step_count * (len(sim.o2_molecules) + len(sim.all_complexes))
+
+    def record(self, sim, event):
+        """ Builds and writes one record; returns it. """
+        now = time.perf_counter()
+        elapsed = now - self.start_time
+        window = now - self.last_time
+        updates = self._updates(sim)
+        steps_per_s = (sim.step_count - self.start_step) / elapsed if elapsed > 0 else None
+        # Rates since the last record (overall rates if no step was done since)
+        if sim.step_count > self.last_step and window > 0:
+            window_rate = (sim.step_count - self.last_step) / window
+            updates_rate = (updates - self.last_updates) / window
+        else:
+            window_rate = steps_per_s
+            updates_rate = (updates - self.start_updates) / elapsed if elapsed > 0 else None
+        phase_total = sum(sim.phase_times.values())
+
+        record = {
+            'event': event, 'time': time.time(), 'engine': sim.config.engine,
+            'step': sim.step_count, 'total_steps': self.total_steps, 'elapsed_s': elapsed,
+            'steps_per_s': steps_per_s, 'steps_per_s_window': window_rate,
+            'molecule_updates_per_s': updates_rate,
+            'phase_s': dict(sim.phase_times),
+            'phase_fraction': {name: t / phase_total for name, t in sim.phase_times.items()} if phase_total else {},
+            'rss_mb': (current_rss_bytes() or 0) / 2**20,
+            'eta_s': max(0, self.total_steps - sim.step_count) / window_rate if window_rate else None
+        }
+        if self.frame_times is not None:
+            record['frames'] = frame_time_summary(self.frame_times[self.frames_seen:])
+            self.frames_seen = len(self.frame_times)
+
+        self.sink.write(record)
+        self.last_time = now
+        self.last_step = sim.step_count
+        self.last_updates = updates
+        return record
+
+    def on_step(self, sim):
+        self.record(sim, 'progress')
+
+    def on_finish(self, sim):
+        self.record(sim, 'finish')
+        self.sink.close()
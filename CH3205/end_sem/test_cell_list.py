@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from cell_list import CellList
+
+@pytest.mark.parametrize('periodic', [False, True])
+@pytest.mark.parametrize('dimensions', [2, 3])
+@pytest.mark.parametrize('grid_size, cell_size', [(50, 1.8), (4, 2.5)])
+def test_candidate_pairs_match_candidates(periodic, dimensions, grid_size, cell_size):
+    rng = np.random.default_rng(0)
+    upper = grid_size if periodic else grid_size - 1
+    molecules = [rng.uniform(0, upper, 400) for _ in range(dimensions)]
+    queries = [rng.uniform(0, upper, 60) for _ in range(dimensions)]
+    cells = CellList(grid_size, cell_size, *molecules, periodic=periodic)
+
+    query, molecule = cells.candidate_pairs(*queries)
+    assert np.all(np.diff(query) >= 0)
+    for i in range(len(queries[0])):
+        assert sorted(molecule[query == i].tolist()) == cells.candidates(*[c[i] for c in queries])
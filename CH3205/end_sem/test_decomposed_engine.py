@@ -0,0 +1,27 @@
+import numpy as np
+
+from checkpoint import CheckpointWriter, load_checkpoint
+from simulation_core import Simulation, SimulationConfig
+
+CONFIG = SimulationConfig(grid_size=40, core_radius=8, surface_thickness=3, num_ru1=10, num_ru2=10, num_o2=80,
+                          excitation_prob=0.5, engine='decomposed', tiles=2, seed=7)
+RESULT_ARRAYS = ('emission_count', 'quenched_count', 'o2_quench_count', 'o2_x', 'o2_y', 'o2_path_length')
+
+def results(sim):
+    return [getattr(sim.engine, name).copy() for name in RESULT_ARRAYS]
+
+def test_resume_matches_uninterrupted_run(tmp_path):
+    uninterrupted = Simulation(CONFIG).run(120)
+    expected = results(uninterrupted)
+    uninterrupted.engine.close()
+
+    first = Simulation(CONFIG).run(60)
+    writer = CheckpointWriter(str(tmp_path / 'checkpoint.npz'))
+    writer.save(first.get_state())
+    writer.wait()
+    first.engine.close()
+
+    resumed = Simulation(CONFIG, state=load_checkpoint(str(tmp_path / 'checkpoint.npz'))).run(120)
+    for name, a, b in zip(RESULT_ARRAYS, expected, results(resumed)):
+        assert np.array_equal(a, b), name
+    resumed.engine.close()
@@ -0,0 +1,16 @@
+from kmc_engine import compare_engines
+from simulation_core import SimulationConfig
+
+# A short lifetime and moderate O2 count keep the QYs high and the runs cheap;
+# one step of extra quenching exposure shifts the Ru1 QY here by about 0.03
+CONFIG = SimulationConfig(grid_size=40, core_radius=6, surface_thickness=3, num_ru1=20, num_ru2=20, num_o2=40,
+                          excited_lifetime=5)
+STEPS = 300
+SEEDS = range(16)
+QY_TOLERANCE = 0.02  # About two standard errors of the mean QY difference over SEEDS
+
+def test_qy_matches_stepper():
+    results = compare_engines(CONFIG, STEPS, SEEDS)
+    (object_ru1, object_ru2, _), (kmc_ru1, kmc_ru2, _) = results['object'], results['kmc']
+    assert abs(kmc_ru1.mean() - object_ru1.mean()) < QY_TOLERANCE
+    assert abs(kmc_ru2.mean() - object_ru2.mean()) < QY_TOLERANCE
@@ -0,0 +1,209 @@
+import io
+import json
+import os
+
+import numpy as np
+
+# --- File Layout ---
+# [header: MAGIC, uint32 JSON length, JSON index, zero padding to HEADER_BYTES]
+# [complex table: position float32 (dimensions,), type int8 - one record per complex]
+# [frames: fixed-width records step int64, counts int64 (4,), o2 float32 (dimensions, n_o2), excited int8 (n_ru)]
+# [summary: .npz of the final per-complex / per-O2 aggregates, written on close]
+MAGIC = b'RUTRAJ01'
+HEADER_BYTES = 16384
+DEFAULT_CHUNK_BYTES = 32 * 2**20  # Frame data read at a time by the out-of-core reductions
+SUMMARY_KEYS = ('emission_count', 'quenched_count', 'total_excitations', 'lifetime_stats', 'distance_stats',
+                'o2_quench_count', 'o2_path_length', 'step')
+
+def complex_dtype(dimensions):
+    return np.dtype([('position', '<f4', (dimensions,)), ('type', 'i1')])
+
+def frame_dtype(dimensions, n_o2, n_ru):
+    """ Record of one frame; counts = (ru1_emissions, ru1_quenched, ru2_emissions, ru2_quenched). """
+    return np.dtype([('step', '<i8'), ('counts', '<i8', (4,)), ('o2', '<f4', (dimensions, n_o2)),
+                     ('excited', 'i1', (n_ru,))])
+
+def _write_header(f, index):
+    text = json.dumps(index).encode()
+    if len(MAGIC) + 4 + len(text) > HEADER_BYTES:
+        raise ValueError(f"Trajectory header needs {len(text)} bytes, more than the {HEADER_BYTES} reserved")
+    f.seek(0)
+    f.write(MAGIC + np.uint32(len(text)).tobytes() + text)
+    f.write(b'\0' * (HEADER_BYTES - len(MAGIC) - 4 - len(text)))
+
+def _read_header(f):
+    f.seek(0)
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{f.name} is not a trajectory file")
+    length = int(np.frombuffer(f.read(4), dtype=np.uint32)[0])
+    return json.loads(f.read(length))
+
+# --- Writer ---
+class TrajectoryWriter:
+    """ Appends fixed-width frames to a trajectory file that TrajectoryReader memory-maps.
+
+        Complex positions and types are written once; every frame holds the
+        step, the running emission / quench counts, all O2 coordinates
+        (float32) and the excited flag of every complex (int8). Because
+        frames have a fixed width, frame k starts at
+        data_offset + k * frame_bytes, so the header index only has to hold
+        the layout, and a file cut short by a crash is still readable up to
+        its last complete frame. close() appends the final aggregates and
+        records their offset in the header.
+
+        With resume_frames the existing file is reopened and cut back to
+        that many frames (the count saved with a checkpoint).
+    """
+    def __init__(self, path, ru_positions, ru_type, n_o2, stride=1, params=None, resume_frames=None):
+        self.path = path
+        ru_positions = [np.asarray(c, dtype=np.float32) for c in ru_positions]
+        self.dimensions = len(ru_positions)
+        self.n_ru = len(ru_positions[0])
+        self.n_o2 = n_o2
+        self.dtype = frame_dtype(self.dimensions, n_o2, self.n_ru)
+        self._record = np.zeros(1, dtype=self.dtype)
+        if resume_frames is not None and os.path.exists(path):
+            self.file = open(path, 'r+b')
+            self.index = _read_header(self.file)
+            self.index.update(frame_count=None, summary_offset=None)
+            self.frame_count = resume_frames
+            self.file.truncate(self.index['data_offset'] + resume_frames * self.dtype.itemsize)
+            _write_header(self.file, self.index)
+            self.file.seek(0, os.SEEK_END)
+            return
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        type_names = sorted(set(str(t) for t in ru_type))
+        complexes = np.zeros(self.n_ru, dtype=complex_dtype(self.dimensions))
+        complexes['position'] = np.stack(ru_positions, axis=1) if self.n_ru else 0
+        complexes['type'] = [type_names.index(str(t)) for t in ru_type]
+        self.index = {
+            'dimensions': self.dimensions, 'n_ru': self.n_ru, 'n_o2': n_o2, 'stride': stride,
+            'type_names': type_names, 'complex_offset': HEADER_BYTES,
+            'data_offset': HEADER_BYTES + complexes.nbytes, 'frame_bytes': self.dtype.itemsize,
+            'frame_count': None, 'summary_offset': None, 'params': params or {}
+        }
+        self.frame_count = 0
+        self.file = open(path, 'w+b')
+        _write_header(self.file, self.index)
+        self.file.write(complexes.tobytes())
+
+    def add_frame(self, step, o2_coordinates, excited, counts):
+        """ Appends one frame (o2_coordinates: one array per axis). """
+        record = self._record
+        record['step'] = step
+        record['counts'] = counts
+        record['o2'][0] = o2_coordinates
+        record['excited'] = excited
+        self.file.write(record.tobytes())
+        self.frame_count += 1
+
+    def flush(self):
+        """ Writes buffered frames to disk; returns the frame count (saved with checkpoints). """
+        self.file.flush()
+        return self.frame_count
+
+    def close(self, summary=None, runtime=None):
+        """ Appends the final aggregates (arrays keyed like SUMMARY_KEYS) and completes the header. """
+        if self.file is None:
+            return
+        self.file.seek(0, os.SEEK_END)
+        if summary is not None:
+            self.index['summary_offset'] = self.file.tell()
+            np.savez(self.file, **summary)
+        self.index['frame_count'] = self.frame_count
+        self.index['runtime'] = runtime
+        _write_header(self.file, self.index)
+        self.file.close()
+        self.file = None
+
+# --- Reader ---
+class TrajectoryReader:
+    """ Random-access view of a trajectory file; nothing is loaded until it is indexed.
+
+        The frames are a read-only np.memmap of fixed-width records, so
+        frame k, frame_at(step) and the track of one molecule are read
+        directly from their offsets in the file (the OS pages them in on
+        demand). iter_frames yields blocks of frames for reductions over
+        trajectories larger than memory.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.index = _read_header(f)
+        index = self.index
+        self.dimensions, self.n_ru, self.n_o2 = index['dimensions'], index['n_ru'], index['n_o2']
+        self.stride = index['stride']
+        self.params = index['params']
+        self.dtype = frame_dtype(self.dimensions, self.n_o2, self.n_ru)
+        frame_count = index['frame_count']
+        if frame_count is None:  # Not closed: every complete frame on disk
+            frame_count = (os.path.getsize(path) - index['data_offset']) // self.dtype.itemsize
+        self.frames = (np.memmap(path, dtype=self.dtype, mode='r', offset=index['data_offset'], shape=(frame_count,))
+                       if frame_count else np.zeros(0, dtype=self.dtype))
+        self.complexes = (np.memmap(path, dtype=complex_dtype(self.dimensions), mode='r',
+                                    offset=index['complex_offset'], shape=(self.n_ru,))
+                          if self.n_ru else np.zeros(0, dtype=complex_dtype(self.dimensions)))
+
+    def __len__(self):
+        """ Number of O2 molecules (so a reader can stand in for the O2 list in the analysis). """
+        return self.n_o2
+
+    @property
+    def frame_count(self):
+        return len(self.frames)
+
+    @property
+    def steps(self):
+        return self.frames['step']
+
+    def complex_types(self):
+        """ Type name ('Ru1' / 'Ru2') of every complex. """
+        return np.array(self.index['type_names'])[self.complexes['type']]
+
+    def frame(self, k):
+        """ Frame k: a record with fields step, counts, o2 (dimensions, n_o2) and excited. """
+        return self.frames[k]
+
+    def frame_index(self, step):
+        """ Index of the frame recorded at `step` (frames are evenly strided; searched otherwise). """
+        steps = self.frames['step']
+        if len(steps):
+            k = (step - int(steps[0])) // self.stride
+            if 0 <= k < len(steps) and steps[k] == step:
+                return int(k)
+            k = int(np.searchsorted(steps, step))
+            if k < len(steps) and steps[k] == step:
+                return k
+        raise KeyError(f"No frame recorded at step {step}")
+
+    def frame_at(self, step):
+        return self.frames[self.frame_index(step)]
+
+    def o2_positions(self, k=-1):
+        """ O2 coordinate arrays (x, y[, z]) of frame k (default: the last frame). """
+        return tuple(self.frames[k]['o2'])
+
+    def track(self, molecule, frames=slice(None)):
+        """ (steps, coordinates (n_frames, dimensions)) of one O2 molecule over a slice of frames. """
+        selected = self.frames[frames]
+        return np.asarray(selected['step']), np.asarray(selected['o2'][:, :, molecule])
+
+    def iter_frames(self, frames=slice(None), chunk_bytes=DEFAULT_CHUNK_BYTES):
+        """ Yields the selected frames in blocks of about chunk_bytes (at least one frame). """
+        start, stop, step = frames.indices(len(self.frames))
+        block = max(1, chunk_bytes // self.dtype.itemsize) * step
+        for first in range(start, stop, block):
+            yield self.frames[first:min(first + block, stop):step]
+
+    def summary(self):
+        """ Final aggregates written on close (keys as SUMMARY_KEYS), or None if the run did not finish. """
+        offset = self.index['summary_offset']
+        if offset is None:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            with np.load(io.BytesIO(f.read()), allow_pickle=False) as data:
+                return {name: data[name] for name in data.files}
@@ -0,0 +1,322 @@
+from collections import defaultdict
+from time import perf_counter
+
+import numpy as np
+
+from boundaries import apply_boundary, minimum_image
+from cell_list import CellList
+from checkpoint import decode_json, encode_json
+from move_table import get_move_table
+from running_stats import DISTANCE_BINS, RunningStatsArray
+from stream_recorder import EMITTED_EVENT, EXCITED_EVENT, QUENCHED_EVENT
+
+# --- State Codes ---
+GROUND = 0
+EXCITED = 1
+
+# --- Vectorized Engine ---
+class VectorizedSimulation:
+    """ Structure-of-arrays version of the Ru/O2 quenching model.
+
+        Positions, states, timers and counters are held in NumPy arrays and
+        the four phases of a time step (excite, move, quench, evolve) are done
+        as batched array operations. The rules are the same as in the
+        RutheniumComplex / OxygenMolecule object model, so the statistics
+        (emissions, quenches, lifetimes, quencher distances) match.
+
+        Lifetimes and quencher distances are kept as per-complex online
+        statistics; individual events go to the optional StreamRecorder.
+
+        With ru_z / o2_z (and a 3D core_center) the model is 3D: a spherical
+        density profile, a cubic lattice walk and 3D quenching distances.
+        walk 'moore' steps every coordinate by -1, 0 or +1 (as the object
+        model), 'axial' steps one coordinate by -1 or +1 (4 / 6 neighbours).
+        Memory is O(molecules): the lattice itself is never stored.
+        boundary is one of boundaries.BOUNDARIES; reinjected counts the O2
+        molecules exchanged with the reservoir under 'absorbing'.
+    """
+    def __init__(self, ru_x, ru_y, ru_type, o2_x, o2_y, grid_size, core_center, core_radius,
+                 density_steepness, prob_min, prob_max, excited_lifetime, quenching_radius,
+                 excitation_prob=1.0, rng=None, recorder=None, move_table=None, ru_z=None, o2_z=None,
+                 walk='moore', boundary='clamp'):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.recorder = recorder
+        self.phase_times = defaultdict(float)  # Seconds spent per step phase
+
+        # Ru complexes
+        self.ru_x = np.asarray(ru_x, dtype=np.float64)
+        self.ru_y = np.asarray(ru_y, dtype=np.float64)
+        self.ru_z = None if ru_z is None else np.asarray(ru_z, dtype=np.float64)
+        self.ru_type = np.asarray(ru_type)
+        n_ru = len(self.ru_x)
+        self.state = np.full(n_ru, GROUND, dtype=np.int8)
+        self.excited_timer = np.zeros(n_ru, dtype=np.int64)
+        self.emission_count = np.zeros(n_ru, dtype=np.int64)
+        self.quenched_count = np.zeros(n_ru, dtype=np.int64)
+        self.total_excitations = np.zeros(n_ru, dtype=np.int64)
+        self.lifetime_stats = RunningStatsArray(n_ru, 0, excited_lifetime + 1, excited_lifetime + 1)
+        self.quencher_distance_stats = RunningStatsArray(n_ru, 0, quenching_radius, DISTANCE_BINS)
+
+        # O2 molecules
+        self.o2_x = np.array(o2_x, dtype=np.float64)
+        self.o2_y = np.array(o2_y, dtype=np.float64)
+        self.o2_z = None if o2_z is None else np.array(o2_z, dtype=np.float64)
+        n_o2 = len(self.o2_x)
+        self.o2_quench_count = np.zeros(n_o2, dtype=np.int64)
+        self.o2_path_length = np.zeros(n_o2, dtype=np.float64)
+
+        # Model parameters
+        self.grid_size = grid_size
+        self.core_center = core_center
+        self.core_radius = core_radius
+        self.density_steepness = density_steepness
+        self.prob_min = prob_min
+        self.prob_max = prob_max
+        self.excited_lifetime = excited_lifetime
+        self.quenching_radius = quenching_radius
+        self.quenching_radius_sq = quenching_radius ** 2
+        self.excitation_prob = excitation_prob
+        self.walk = walk
+        self.boundary = boundary
+        self.period = grid_size if boundary == 'periodic' else None
+        self.dimensions = 2 if self.o2_z is None else 3
+        self.move_table = move_table if move_table is not None else get_move_table(
+            grid_size, core_center, core_radius, density_steepness, prob_min, prob_max)
+
+        # Spatial index of the O2 molecules for the quenching check
+        self.o2_cells = CellList(grid_size, quenching_radius, self.o2_x, self.o2_y, self.o2_z,
+                                 periodic=self.period is not None)
+
+        self.reinjected = 0
+        self.steps_done = 0
+
+    @classmethod
+    def from_objects(cls, complexes, o2_molecules, **params):
+        """ Builds the engine from lists of RutheniumComplex / OxygenMolecule objects (3D if core_center is). """
+        if len(params['core_center']) == 3:
+            params.update(ru_z=[c.z for c in complexes], o2_z=[o.z for o in o2_molecules])
+        return cls(
+            [c.x for c in complexes], [c.y for c in complexes], [c.type for c in complexes],
+            [o.x for o in o2_molecules], [o.y for o in o2_molecules],
+            **params
+        )
+
+    def o2_coordinates(self):
+        """ The O2 coordinate arrays: (x, y) or (x, y, z). """
+        return (self.o2_x, self.o2_y) if self.o2_z is None else (self.o2_x, self.o2_y, self.o2_z)
+
+    def ru_coordinates(self):
+        """ The Ru coordinate arrays: (x, y) or (x, y, z). """
+        return (self.ru_x, self.ru_y) if self.ru_z is None else (self.ru_x, self.ru_y, self.ru_z)
+
+    # --- Phases ---
+    def excite(self):
+        """ Excites ground-state complexes with the excitation probability. """
+        draws = self.rng.random(len(self.state))
+        newly = (self.state == GROUND) & (draws < self.excitation_prob)
+        self.state[newly] = EXCITED
+        self.excited_timer[newly] = self.excited_lifetime
+        self.total_excitations[newly] += 1
+        if self.recorder is not None:
+            self.recorder.record_events(np.flatnonzero(newly), EXCITED_EVENT)
+
+    def _steps(self, n):
+        """ Lattice steps of n moving molecules, one array per coordinate. """
+        if self.walk == 'moore':
+            return [self.rng.integers(-1, 2, size=n) for _ in range(self.dimensions)]
+        # 'axial': one of the 2 * dimensions unit steps
+        direction = self.rng.integers(0, 2 * self.dimensions, size=n)
+        axis, sign = np.divmod(direction, 2)
+        step = 2 * sign - 1
+        return [np.where(axis == k, step, 0) for k in range(self.dimensions)]
+
+    def move(self):
+        """ Moves all O2 molecules with density-dependent probability. """
+        coordinates = self.o2_coordinates()
+        move_prob = self.move_table.lookup_array(*coordinates)
+        moving = np.flatnonzero(self.rng.random(len(self.o2_x)) < move_prob)
+        if len(moving) == 0:
+            return
+
+        old = [c[moving] for c in coordinates]
+        steps = self._steps(len(moving))
+        new = [c + d for c, d in zip(old, steps)]
+        absorbed = apply_boundary(new, self.grid_size, self.boundary, self.rng)
+        if absorbed is not None:
+            self.reinjected += int(np.count_nonzero(absorbed))
+        for c, values in zip(coordinates, new):
+            c[moving] = values
+        # Distance moved: the clamped displacement, or the whole step for the other boundaries
+        moved = [n - o for n, o in zip(new, old)] if self.boundary == 'clamp' else steps
+        if self.o2_z is None:
+            self.o2_path_length[moving] += np.hypot(moved[0], moved[1])
+        else:
+            self.o2_path_length[moving] += np.sqrt(sum(d ** 2 for d in moved))
+        self.o2_cells.move_many(moving, *new)
+
+    def quench(self):
+        """ Quenches excited complexes that have an O2 within the quenching radius.
+
+            As in the object model, the quencher is the first O2 (in molecule
+            order) found inside the radius.
+        """
+        excited = np.flatnonzero(self.state == EXCITED)
+        if len(excited) == 0 or len(self.o2_x) == 0:
+            return
+        # Distances of all (excited complex, nearby O2) pairs at once
+        ru_coordinates, o2_coordinates = self.ru_coordinates(), self.o2_coordinates()
+        positions = [c[excited] for c in ru_coordinates]
+        pair_ru, pair_o2 = self.o2_cells.candidate_pairs(*positions)
+        if self.period is None:
+            dist_sq = ((positions[0][pair_ru] - self.o2_x[pair_o2]) ** 2
+                       + (positions[1][pair_ru] - self.o2_y[pair_o2]) ** 2)
+            if self.o2_z is not None:
+                dist_sq += (positions[2][pair_ru] - self.o2_z[pair_o2]) ** 2
+        else:
+            dist_sq = sum(minimum_image(p[pair_ru] - c[pair_o2], self.period) ** 2
+                          for p, c in zip(positions, o2_coordinates))
+        within = np.flatnonzero(dist_sq < self.quenching_radius_sq)
+
+        # One quencher per complex: the lowest-index O2 among its pairs in range
+        within = within[np.lexsort((pair_o2[within], pair_ru[within]))]
+        complexes, first = np.unique(pair_ru[within], return_index=True)
+        quencher = np.full(len(excited), -1, dtype=np.int64)
+        quencher_dist_sq = np.zeros(len(excited))
+        quencher[complexes] = pair_o2[within[first]]
+        quencher_dist_sq[complexes] = dist_sq[within[first]]
+
+        hit = quencher >= 0
+        if not hit.any():
+            return
+        quenched = excited[hit]
+        lifetimes = self.excited_timer[quenched]
+        distances = np.sqrt(quencher_dist_sq[hit])
+        self.lifetime_stats.add(quenched, lifetimes)
+        self.quencher_distance_stats.add(quenched, distances)
+        if self.recorder is not None:
+            self.recorder.record_events(quenched, QUENCHED_EVENT, lifetimes, distances)
+        self.state[quenched] = GROUND
+        self.excited_timer[quenched] = 0
+        self.quenched_count[quenched] += 1
+        np.add.at(self.o2_quench_count, quencher[hit], 1)
+
+    def evolve(self):
+        """ Counts down excited timers and emits complexes whose timer ran out. """
+        excited = self.state == EXCITED
+        self.excited_timer[excited] -= 1
+        emitting = np.flatnonzero(excited & (self.excited_timer <= 0))
+        if len(emitting) == 0:
+            return
+        self.lifetime_stats.add(emitting, self.excited_timer[emitting])
+        if self.recorder is not None:
+            self.recorder.record_events(emitting, EMITTED_EVENT, self.excited_timer[emitting])
+        self.state[emitting] = GROUND
+        self.excited_timer[emitting] = 0
+        self.emission_count[emitting] += 1
+
+    def step(self):
+        """ Advances the simulation by one time step. """
+        phase_times = self.phase_times
+        if self.recorder is not None:
+            self.recorder.set_step(self.steps_done)
+        # 1. Excite complexes
+        t0 = perf_counter()
+        self.excite()
+        # 2. Move Oxygen
+        t1 = perf_counter()
+        self.move()
+        # 3. Check for Quenching
+        t2 = perf_counter()
+        self.quench()
+        # 4. Ru complexes evolve (timer/emission)
+        t3 = perf_counter()
+        self.evolve()
+        t4 = perf_counter()
+        phase_times['excite'] += t1 - t0
+        phase_times['move'] += t2 - t1
+        phase_times['quench'] += t3 - t2
+        phase_times['evolve'] += t4 - t3
+        if self.recorder is not None and self.recorder.wants_positions(self.steps_done):
+            self.recorder.record_positions(self.steps_done, self.o2_x, self.o2_y, self.o2_z)
+            phase_times['record'] += perf_counter() - t4
+        self.steps_done += 1
+
+    def run(self, steps):
+        """ Advances the simulation by the given number of time steps. """
+        for _ in range(steps):
+            self.step()
+
+    # --- Checkpointing ---
+    def get_state(self):
+        """ Returns a copy of the full engine state (arrays, aggregates and RNG state). """
+        state = {
+            'ru_x': self.ru_x.copy(), 'ru_y': self.ru_y.copy(), 'ru_type': self.ru_type.copy(),
+            'state': self.state.copy(), 'excited_timer': self.excited_timer.copy(),
+            'emission_count': self.emission_count.copy(), 'quenched_count': self.quenched_count.copy(),
+            'total_excitations': self.total_excitations.copy(),
+            'o2_x': self.o2_x.copy(), 'o2_y': self.o2_y.copy(),
+            'o2_quench_count': self.o2_quench_count.copy(), 'o2_path_length': self.o2_path_length.copy(),
+            'lifetime_stats': self.lifetime_stats.get_state(),
+            'distance_stats': self.quencher_distance_stats.get_state(),
+            'steps_done': np.array(self.steps_done), 'reinjected': np.array(self.reinjected),
+            'rng_state': encode_json(self.rng.bit_generator.state)
+        }
+        if self.o2_z is not None:
+            state.update(ru_z=self.ru_z.copy(), o2_z=self.o2_z.copy())
+        return state
+
+    def set_state(self, state):
+        """ Restores a state returned by get_state (continues bit-identically). """
+        self.state = state['state'].copy()
+        self.excited_timer = state['excited_timer'].copy()
+        self.emission_count = state['emission_count'].copy()
+        self.quenched_count = state['quenched_count'].copy()
+        self.total_excitations = state['total_excitations'].copy()
+        self.o2_x = state['o2_x'].copy()
+        self.o2_y = state['o2_y'].copy()
+        if self.o2_z is not None:
+            self.o2_z = state['o2_z'].copy()
+        self.o2_quench_count = state['o2_quench_count'].copy()
+        self.o2_path_length = state['o2_path_length'].copy()
+        self.o2_cells = CellList(self.grid_size, self.quenching_radius, self.o2_x, self.o2_y, self.o2_z,
+                                 periodic=self.period is not None)
+        self.reinjected = int(state['reinjected']) if 'reinjected' in state else 0
+        self.lifetime_stats = RunningStatsArray.from_state(state['lifetime_stats'])
+        self.quencher_distance_stats = RunningStatsArray.from_state(state['distance_stats'])
+        self.steps_done = int(state['steps_done'])
+        self.rng.bit_generator.state = decode_json(state['rng_state'])
+
+    # --- Results ---
+    def get_type_counts(self, type):
+        """ Returns (emissions, quenched) summed over complexes of one type. """
+        mask = self.ru_type == type
+        return int(self.emission_count[mask].sum()), int(self.quenched_count[mask].sum())
+
+    def get_simulated_qy(self, type):
+        """ Calculates the quantum yield of one complex type. """
+        emissions, quenched = self.get_type_counts(type)
+        total_events = emissions + quenched
+        return emissions / total_events if total_events > 0 else 0
+
+    def write_back(self, complexes, o2_molecules):
+        """ Copies the array state back onto the objects the engine was built from. """
+        for i, c in enumerate(complexes):
+            c.state = 'excited' if self.state[i] == EXCITED else 'ground'
+            c.excited_timer = int(self.excited_timer[i])
+            c.emission_count = int(self.emission_count[i])
+            c.quenched_count = int(self.quenched_count[i])
+            if hasattr(c, 'total_excitations'):
+                c.total_excitations = int(self.total_excitations[i])
+            if hasattr(c, 'lifetime_stats'):
+                c.lifetime_stats = self.lifetime_stats[i]
+                c.quencher_distance_stats = self.quencher_distance_stats[i]
+
+        for i, o2 in enumerate(o2_molecules):
+            o2.x = float(self.o2_x[i])
+            o2.y = float(self.o2_y[i])
+            if self.o2_z is not None:
+                o2.z = float(self.o2_z[i])
+            if hasattr(o2, 'quench_count'):
+                o2.quench_count = int(self.o2_quench_count[i])
+            if hasattr(o2, 'path_length'):
+                o2.path_length = float(self.o2_path_length[i])